@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+文件原子写入与跨进程文件锁
+供多个模块共享的小工具：写配置/缓存文件时先写临时文件再重命名，
+读者永远不会看到半个文件；多进程之间用文件锁互斥
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为进程内锁
+    fcntl = None
+
+_fallback_locks = {}
+_fallback_locks_guard = threading.Lock()
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes):
+    """原子写入字节内容"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: Union[str, Path], data: Any, indent: int = 2):
+    """原子写入JSON文件"""
+    content = json.dumps(data, ensure_ascii=False, indent=indent)
+    atomic_write_bytes(path, content.encode('utf-8'))
+
+
+@contextmanager
+def file_lock(lock_path: Union[str, Path]):
+    """
+    跨进程排他文件锁
+
+    Args:
+        lock_path: 锁文件路径（不存在时自动创建）
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if fcntl is None:
+        with _fallback_locks_guard:
+            lock = _fallback_locks.setdefault(str(lock_path.resolve()), threading.Lock())
+        with lock:
+            yield
+        return
+
+    with open(lock_path, 'a+') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
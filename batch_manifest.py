@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+矩阵批量清单
+把 图片 × 音频 × 参数预设 展开成一批视频生成任务，用于A/B对比不同配音和动作参数，
+不必再反复修改 config.py 重跑
+
+清单为JSON文件，所有字段可选:
+    {
+        "images": ["pics/*.jpg"],           # 图片路径或通配符，默认 PICS_DIR 下所有图片
+        "audio": ["sound/*.wav"],           # 音频路径或通配符，默认 SOUND_DIR 下所有音频
+        "presets": ["default", "calm"],     # config.VIDEO_PARAM_PRESETS 中的预设名，默认全部；
+                                            # 也可以是 {"名称": {参数}}，参数覆盖 VIDEO_GENERATION_PARAMS
+        "output_dir": "videos/matrix"       # 输出目录，默认 MATRIX_OUTPUT_DIR
+    }
+
+输出文件名为 <图片名>__<音频名>__<预设名>.mp4（不含扩展名），所以图片之间、音频之间的文件名（去掉扩展名后）不能重复，
+例如 a.jpg 和 a.png、pics/a.jpg 和 other/a.jpg 会被拒绝，否则它们共用同一个输出文件和任务日志记录
+"""
+
+import glob
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _collect_files(patterns: Iterable[str], default_dir: str, suffixes) -> List[Path]:
+    """展开路径/通配符，没有给出时取默认目录下所有支持的文件（去重并排序）"""
+    if not patterns:
+        patterns = [str(Path(default_dir) / '*')]
+
+    files = set()
+    for pattern in patterns:
+        for name in glob.glob(pattern) or [pattern]:
+            path = Path(name)
+            if path.is_file() and path.suffix.lower() in suffixes:
+                files.add(path)
+            elif not path.exists():
+                logger.warning(f"清单中的文件不存在: {name}")
+    return sorted(files)
+
+
+def _check_unique_stems(files: List[Path], kind: str):
+    """输出文件名只用文件名主干，主干相同的文件会互相覆盖或被当成已完成跳过"""
+    by_stem: Dict[str, List[Path]] = {}
+    for path in files:
+        by_stem.setdefault(path.stem, []).append(path)
+
+    duplicates = [paths for paths in by_stem.values() if len(paths) > 1]
+    if duplicates:
+        names = '; '.join(', '.join(str(path) for path in paths) for paths in duplicates)
+        raise ValueError(f"{kind}文件名（不含扩展名）重复，输出视频会互相覆盖: {names}（请重命名或在清单中只保留一个）")
+
+
+def _resolve_presets(presets) -> Dict[str, Dict]:
+    """解析参数预设，返回 {名称: 完整参数}"""
+    if not presets:
+        return dict(config.VIDEO_PARAM_PRESETS)
+
+    if isinstance(presets, dict):
+        return {name: {**config.VIDEO_GENERATION_PARAMS, **(params or {})} for name, params in presets.items()}
+
+    unknown = [name for name in presets if name not in config.VIDEO_PARAM_PRESETS]
+    if unknown:
+        raise ValueError(f"未知的参数预设: {', '.join(unknown)}（可选: {', '.join(config.VIDEO_PARAM_PRESETS)}）")
+    return {name: config.VIDEO_PARAM_PRESETS[name] for name in presets}
+
+
+def load_manifest(path: str = None) -> Dict:
+    """
+    读取矩阵清单
+
+    Args:
+        path: 清单JSON文件，None 表示全部使用默认值（所有图片 × 所有音频 × 所有预设）
+
+    Returns:
+        {'images': [Path], 'audio': [Path], 'presets': {名称: 参数}, 'output_dir': Path}
+    """
+    data = {}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    images = _collect_files(data.get('images'), config.PICS_DIR, config.SUPPORTED_IMAGE_FORMATS)
+    audio = _collect_files(data.get('audio'), config.SOUND_DIR, config.SUPPORTED_AUDIO_FORMATS)
+    _check_unique_stems(images, '图片')
+    _check_unique_stems(audio, '音频')
+
+    return {
+        'images': images,
+        'audio': audio,
+        'presets': _resolve_presets(data.get('presets')),
+        'output_dir': Path(data.get('output_dir') or config.MATRIX_OUTPUT_DIR)
+    }
+
+
+def output_name(image: Path, audio: Path, preset: str) -> str:
+    """一个组合的输出文件名"""
+    return f"{image.stem}__{audio.stem}__{preset}.mp4"
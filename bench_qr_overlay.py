@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+二维码叠加微基准测试
+对比逐帧重新计算float64 alpha的旧实现与预编译 QROverlay 的每秒帧数
+
+用法:
+    python bench_qr_overlay.py                    # 使用合成的1080p帧
+    python bench_qr_overlay.py videos/xxx.mp4     # 使用真实视频的前N帧（解码时间不计入）
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import config
+from video_qr_composer import QROverlay
+
+
+def legacy_overlay(frame, qr_image, margin):
+    """旧实现：每帧重新计算 alpha / 255.0 并按通道混合"""
+    frame_height, frame_width = frame.shape[:2]
+    qr_height, qr_width = qr_image.shape[:2]
+
+    x_offset = max(0, frame_width - qr_width - margin)
+    y_offset = max(0, frame_height - qr_height - margin)
+
+    roi = frame[y_offset:y_offset + qr_height, x_offset:x_offset + qr_width]
+
+    qr_bgr = qr_image[:, :, :3]
+    qr_alpha = qr_image[:, :, 3] / 255.0
+
+    for c in range(3):
+        roi[:, :, c] = (qr_alpha * qr_bgr[:, :, c] +
+                        (1 - qr_alpha) * roi[:, :, c])
+    return frame
+
+
+def make_qr_image(size, opacity):
+    """生成一张随机的BGRA二维码替身"""
+    rng = np.random.default_rng(0)
+    qr = np.empty((size, size, 4), dtype=np.uint8)
+    qr[:, :, :3] = rng.integers(0, 2, (size, size, 1), dtype=np.uint8) * 255
+    qr[:, :, 3] = int(255 * opacity)
+    return qr
+
+
+def load_frames(video_path, count):
+    """读取视频前count帧，不足时循环使用"""
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    if not frames:
+        raise SystemExit(f"无法读取视频: {video_path}")
+    return frames
+
+
+def run(frames, blend, rounds):
+    """对同一批帧循环执行blend，返回每秒帧数"""
+    work = [frame.copy() for frame in frames]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in work:
+            blend(frame)
+    elapsed = time.perf_counter() - start
+    return rounds * len(work) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二维码叠加微基准测试")
+    parser.add_argument('video', nargs='?', help="可选：用于取帧的视频文件（建议1080p）")
+    parser.add_argument('--frames', type=int, default=60, help="参与测试的帧数")
+    parser.add_argument('--rounds', type=int, default=5, help="重复轮数")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = load_frames(args.video, args.frames)
+    else:
+        rng = np.random.default_rng(1)
+        frames = [rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8) for _ in range(args.frames)]
+
+    height, width = frames[0].shape[:2]
+    qr_image = make_qr_image(config.QR_SIZE, config.QR_OPACITY)
+    overlay = QROverlay(qr_image, config.QR_MARGIN)
+
+    # 结果一致性检查：整数实现四舍五入，旧实现截断，误差不超过1
+    a = legacy_overlay(frames[0].copy(), qr_image, config.QR_MARGIN)
+    b = overlay.apply(frames[0].copy())
+    max_diff = int(np.abs(a.astype(np.int16) - b.astype(np.int16)).max())
+
+    legacy_fps = run(frames, lambda f: legacy_overlay(f, qr_image, config.QR_MARGIN), args.rounds)
+    overlay_fps = run(frames, overlay.apply, args.rounds)
+
+    print(f"帧尺寸: {width}x{height}, 二维码: {config.QR_SIZE}px, 帧数: {len(frames)} x {args.rounds} 轮")
+    print(f"旧实现 (float64逐通道): {legacy_fps:10.1f} fps")
+    print(f"QROverlay (预编译整数): {overlay_fps:10.1f} fps")
+    print(f"加速比: {overlay_fps / legacy_fps:.1f}x, 像素最大差异: {max_diff}")
+
+
+if __name__ == "__main__":
+    main()
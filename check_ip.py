@@ -3,9 +3,10 @@
 检查当前服务器的出口IP地址
 """
 
-import requests
 import json
 
+import http_client
+
 def check_external_ip():
     """检查外部IP地址"""
     services = [
@@ -19,7 +20,7 @@ def check_external_ip():
     
     for service in services:
         try:
-            response = requests.get(service, timeout=5)
+            response = http_client.get(service, timeout=5)
             if response.status_code == 200:
                 if service.endswith('json'):
                     data = response.json()
@@ -50,7 +51,7 @@ def test_wechat_api():
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = http_client.get(url, params=params, timeout=10)
         data = response.json()
         
         print(f"📡 微信API响应: {json.dumps(data, indent=2, ensure_ascii=False)}")
@@ -78,6 +79,10 @@ if __name__ == '__main__':
     
     # 测试微信API
     test_wechat_api()
+
+    http_stats = http_client.get_connection_stats()
+    print(f"\n🔗 HTTP连接复用率: {http_stats['reuseRate']:.1%} "
+          f"({http_stats['requests']} 次请求, {http_stats['connections']} 个新连接)")
     
     print("\n📋 配置建议:")
     print("1. 将上述所有IP地址都添加到微信公众平台的IP白名单中")
@@ -6,6 +6,7 @@
 # 文件路径配置
 PICS_DIR = "pics"                    # 输入图片目录
 SOUND_FILE = "sound/qiezi2.wav"       # 音频文件路径
+SOUND_DIR = "sound"                  # 音频目录（矩阵批量模式默认使用其中所有音频）
 VIDEOS_DIR = "videos"                # 输出视频目录
 TEMPLATES_DIR = "web/templates"      # 模板目录
 
@@ -15,6 +16,9 @@ FILE_SERVER_PORT = 8000              # 本地文件服务器端口
 # 缩略图配置
 THUMBNAIL_SIZE = (200, 200)          # 缩略图尺寸
 THUMBNAIL_QUALITY = 85               # 缩略图质量 (1-100)
+THUMBNAIL_SCALES = (1, 2, 3)         # 缩略图倍率（1x为 THUMBNAIL_SIZE），供高清屏按 srcset 选择
+THUMBNAIL_FORMATS = ("avif", "webp", "jpeg")  # 缩略图格式，Pillow不支持的自动跳过，JPEG总会生成
+TEMPLATE_BUILD_WORKERS = None        # 并行生成模板的进程数，None表示CPU核数
 
 # 视频二维码合成配置
 QR_SIZE = 120                        # 二维码大小（像素）
@@ -22,6 +26,14 @@ QR_MARGIN = 20                       # 距离边缘的边距
 QR_OPACITY = 0.9                     # 二维码透明度 (0-1)
 VIDEOS_WITH_QR_DIR = "videos_with_qr" # 合成视频输出目录
 
+# 合成视频编码配置
+VIDEO_ENCODER = "ffmpeg"             # 编码后端: ffmpeg (H.264 + 音频直通 + faststart) 或 opencv (mp4v，无音频)
+FFMPEG_BIN = "ffmpeg"                # ffmpeg可执行文件（名称或完整路径）
+FFMPEG_PRESET = "veryfast"           # x264编码预设: ultrafast ~ veryslow
+FFMPEG_CRF = 23                      # x264质量 (0-51，越小质量越高、文件越大)
+FFMPEG_AUDIO_CODEC = "copy"          # 音频编码: copy 直接复制原音轨；源音轨不是AAC时可改为 aac
+QR_COMPOSE_MODE = "filter"           # 二维码合成方式: filter (ffmpeg overlay滤镜，不经过Python解码) 或 frames (逐帧合成)
+
 # 视频生成参数
 VIDEO_GENERATION_PARAMS = {
     "template_id": "normal",         # 动作模板: normal, calm, active
@@ -32,9 +44,107 @@ VIDEO_GENERATION_PARAMS = {
     "head_move_strength": 0.5       # 头部动作幅度 (0-1)
 }
 
+# 矩阵批量模式的参数预设（python video_generator.py --matrix），其余参数同 VIDEO_GENERATION_PARAMS
+VIDEO_PARAM_PRESETS = {
+    "default": VIDEO_GENERATION_PARAMS,
+    "calm": {**VIDEO_GENERATION_PARAMS, "template_id": "calm", "mouth_move_strength": 0.5, "head_move_strength": 0.3},
+    "active": {**VIDEO_GENERATION_PARAMS, "template_id": "active", "mouth_move_strength": 1.0, "head_move_strength": 0.8}
+}
+MATRIX_OUTPUT_DIR = "videos/matrix"  # 矩阵批量模式的输出目录
+
 # 任务配置
 MAX_WAIT_TIME = 600                 # 最大等待时间（秒）
-QUERY_INTERVAL = 10                 # 状态查询间隔（秒）
+
+# 任务状态自适应轮询配置（见 task_poller.py）
+POLL_WINDOW_CHECKS = 3              # 历史耗时10~90分位窗口内的查询间隔 = 窗口宽度 / 该值
+POLL_MIN_INTERVAL = 2               # 窗口内查询间隔下限（秒）
+POLL_WINDOW_MAX_INTERVAL = 8        # 窗口内查询间隔上限（秒），决定完成到发现的最大延迟
+POLL_MAX_INTERVAL = 30              # 超出预期后退避的最大查询间隔（秒）
+POLL_BACKOFF_FACTOR = 1.6           # 超出预期后查询间隔的增长倍数
+POLL_JITTER = 0.2                   # 随机抖动幅度（窗口内查询间隔的比例），避免任务同时查询
+TASK_DURATION_FILE = ".cache/task_durations.json"  # 历史渲染耗时记录
+TASK_DURATION_WINDOW = 50           # 每种任务保留的最近耗时样本数（没有样本时直接从最小间隔开始退避）
+
+# 视频生成流水线配置（python video_generator.py --pipeline）
+VIDEO_PIPELINE_CONCURRENCY = 4      # 同时在DashScope上运行的视频生成任务数上限
+VIDEO_PIPELINE_PREPARE_WORKERS = 4  # 并行上传+质量检测的线程数
+VIDEO_PIPELINE_DOWNLOAD_WORKERS = 3 # 并行下载视频的线程数
+
+# 视频生成任务日志配置（中断后重新运行时从断点继续，见 job_journal.py）
+VIDEO_JOB_JOURNAL = ".cache/video_jobs.sqlite3"  # 任务日志数据库
+VIDEO_JOURNAL_URL_MAX_AGE = 20 * 3600   # 复用已上传图片URL的最长时间（秒），签名URL有效期24小时
+VIDEO_JOURNAL_TASK_MAX_AGE = 23 * 3600  # 复用任务ID/视频URL的最长时间（秒），DashScope保留24小时
+
+# 视频下载配置（见 downloader.py）
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024   # 读写缓冲大小（字节）
+DOWNLOAD_SEGMENTS = 4               # 大文件并行下载的最大段数
+DOWNLOAD_SEGMENT_MIN_SIZE = 4 * 1024 * 1024  # 每段最小字节数，小于两段的文件单连接下载
+DOWNLOAD_MAX_RETRIES = 3            # 每段连接中断后的续传重试次数
+DOWNLOAD_READ_TIMEOUT = 60          # 读取超时（秒）
+
+# 图片质量检测配置（见 detect_cache.py）
+DETECT_MODEL = "liveportrait-detect"    # 检测模型，变化时缓存的检测结论全部作废
+DETECT_CACHE_FILE = ".cache/detect_results.json"  # 按图片内容摘要缓存的检测结论
+
+# 人脸融合异步任务配置
+FUSION_JOB_WORKERS = 8              # 融合任务工作线程数
+FUSION_JOB_MAX_PENDING = 100        # 最多排队+执行中的融合任务数
+FUSION_JOB_TTL = 600                # 已完成任务保留时间（秒）
+FUSION_JOB_SSE_TIMEOUT = 5          # SSE单次连接最长保持时间（秒），每个连接占用一个Flask工作线程，到时关闭由客户端重连或轮询
+FUSION_JOB_SSE_RETRY_MS = 1000      # SSE连接关闭后浏览器EventSource自动重连的间隔（毫秒）
+FUSION_BATCH_WORKERS = 6            # "试遍所有造型"批量融合的并发线程数
+
+# 模板注册任务配置（见 template_registry.py）
+TEMPLATE_REGISTER_WORKERS = 4       # 并发注册的模板数
+TEMPLATE_REGISTER_MAX_RETRIES = 3   # 每个模板暂时性失败（网络、超时、限流、熔断）后的重试次数
+TEMPLATE_REGISTER_JOB_TTL = 3600    # 已完成注册任务保留时间（秒）
+
+# 人脸融合上游保护配置
+FACE_FUSION_CONNECT_TIMEOUT = 3     # 连接超时（秒）
+FACE_FUSION_MERGE_TIMEOUT = 15      # 融合接口读超时（秒）
+FACE_FUSION_TEMPLATE_TIMEOUT = 30   # 模板注册接口读超时（秒）
+FACE_FUSION_BREAKER_FAILURE_THRESHOLD = 5   # 连续失败多少次后熔断
+FACE_FUSION_BREAKER_RECOVERY_TIMEOUT = 30   # 熔断后多久放行探测请求（秒）
+FACE_FUSION_LIMIT_INITIAL = 8       # 融合接口初始并发上限
+FACE_FUSION_LIMIT_MIN = 2           # 并发上限下界
+FACE_FUSION_LIMIT_MAX = 32          # 并发上限上界
+FACE_FUSION_LATENCY_THRESHOLD = 6   # 延迟超过该值（秒）即收缩并发上限
+FACE_FUSION_SHED_RETRY_AFTER = 2    # 并发已满时建议客户端重试的间隔（秒）
+
+# 人脸融合结果缓存配置
+FUSION_CACHE_MAX_ENTRIES = 1000     # 内存中最多缓存的融合结果数
+FUSION_CACHE_TTL = 1800             # 缓存有效期（秒），需小于阿里云结果URL有效期
+FUSION_CACHE_DIR = None             # 磁盘缓存目录（融合结果和图片URL映射），例如 ".cache/fusion"；多worker时需共享；None表示不启用
+
+# 用户照片预处理配置
+UPLOAD_NORMALIZE_ENABLED = True     # 上传前是否对用户照片做归一化（旋转/缩放/去元数据）
+UPLOAD_IMAGE_MAX_SIDE = 2048        # 最大边长（像素），更大的照片对融合效果没有帮助
+UPLOAD_IMAGE_QUALITY = 90           # 重新编码的JPEG质量 (1-100)
+
+# OSS上传配置
+OSS_UPLOAD_DEDUPE = True            # 上传图片/音频前比较内容哈希，OSS上已有相同内容时跳过上传
+OSS_MULTIPART_THRESHOLD = 10 * 1024 * 1024  # 文件大于等于该字节数时使用分片上传
+OSS_MULTIPART_PART_SIZE = 4 * 1024 * 1024   # 分片大小（字节），OSS最多10000个分片，超出时自动放大
+OSS_MULTIPART_THREADS = 4           # 并行上传分片的线程数
+OSS_MULTIPART_CHECKPOINT_DIR = ".cache/oss_upload"  # 分片上传断点记录目录，中断后再次上传只传剩余分片
+
+# 共享HTTP连接池配置
+HTTP_POOL_CONNECTIONS = 10          # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = 20              # 每个主机连接池保留的keep-alive连接数
+HTTP_PER_HOST_LIMIT = 16            # 每个主机的最大并发请求数（流式下载在响应关闭前一直计入）
+HTTP_MAX_RETRIES = 3                # 幂等请求的最大重试次数
+HTTP_BACKOFF_FACTOR = 0.5           # 重试退避因子（0.5s, 1s, 2s...）
+HTTP_DEFAULT_TIMEOUT = 30           # 未显式指定时的请求超时（秒）
+
+# 异步DashScope客户端配置（python video_generator.py --async）
+DASHSCOPE_ASYNC_MAX_CONNECTIONS = 100   # aiohttp连接池总连接数
+DASHSCOPE_ASYNC_MAX_IN_FLIGHT = 200     # 同时在DashScope上运行的任务数上限
+DASHSCOPE_ASYNC_UPLOAD_WORKERS = 8      # OSS上传线程数（oss2为同步SDK）
+
+# 微信凭证缓存配置（不要放在web目录下，避免被静态路由暴露）
+WECHAT_TOKEN_STORE_FILE = ".cache/wechat_tokens.json"  # 所有worker进程共享的凭证文件
+WECHAT_TOKEN_REFRESH_MARGIN = 600   # 距离过期多少秒时后台提前续期
+WECHAT_TOKEN_EXPIRY_MARGIN = 300    # 剩余有效期不足多少秒的凭证不再使用（避免在请求途中过期）
 
 # 支持的文件格式
 SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+异步DashScope客户端
+与 video_generator.py 中的同步调用一一对应（图片检测、提交任务、查询任务、下载视频），
+基于 aiohttp 连接池，一个事件循环即可驱动数百个在途任务，不需要一任务一线程
+
+功能特点:
+- 共享 aiohttp 连接池，复用keep-alive连接
+- 返回值与同步版一致：成功返回接口JSON，失败返回 {"error": "..."}
+- generate_videos() 并发执行整批任务：上传 → 检测 → 提交 → 轮询 → 下载
+- base_url 可指向本地桩服务（dashscope_stub_server.py）做联调和压测
+
+用法:
+    python dashscope_stub_server.py --port 8089 &
+    python video_generator.py --async --base-url http://127.0.0.1:8089
+"""
+
+import asyncio
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import config
+import job_journal
+from detect_cache import DetectCache
+from downloader import download_file
+from task_poller import DurationEstimator, PollSchedule, FINISHED_STATUSES, upstream_duration
+
+logger = logging.getLogger(__name__)
+
+
+def endpoints_for(base_url: Optional[str] = None) -> Dict[str, str]:
+    """返回API端点；指定 base_url 时替换 config.API_ENDPOINTS 中的协议和主机"""
+    if not base_url:
+        return dict(config.API_ENDPOINTS)
+
+    base_url = base_url.rstrip('/')
+    return {
+        name: base_url + urlsplit(url).path
+        for name, url in config.API_ENDPOINTS.items()
+    }
+
+
+class AsyncDashScopeClient:
+    """异步DashScope客户端（需在事件循环中使用）"""
+
+    def __init__(self, api_key: str, base_url: str = None, max_connections: int = None,
+                 timeout: float = None):
+        """
+        Args:
+            api_key: DashScope API Key
+            base_url: 可选，替换默认的 https://dashscope.aliyuncs.com（如本地桩服务）
+            max_connections: 连接池总连接数，默认 config.DASHSCOPE_ASYNC_MAX_CONNECTIONS
+            timeout: 单次请求超时（秒），默认 config.HTTP_DEFAULT_TIMEOUT
+        """
+        self.headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        endpoints = endpoints_for(base_url)
+        self.detect_url = endpoints['detect']
+        self.video_synthesis_url = endpoints['video_synthesis']
+        self.task_query_url = endpoints['task_query']
+
+        self.max_connections = max_connections or config.DASHSCOPE_ASYNC_MAX_CONNECTIONS
+        self.timeout = aiohttp.ClientTimeout(total=timeout or config.HTTP_DEFAULT_TIMEOUT)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        # 按历史耗时安排查询时间（与同步版共用 config.TASK_DURATION_FILE）
+        self.estimator = DurationEstimator()
+        self.query_count = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _request_json(self, method: str, url: str, headers: Dict = None, **kwargs) -> Dict:
+        try:
+            async with self.session.request(method, url, headers=headers or self.headers, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"error": str(e) or type(e).__name__}
+
+    async def detect_image_quality(self, image_url: str) -> Dict:
+        """检测图片质量是否符合LivePortrait要求"""
+        payload = {
+            "model": config.DETECT_MODEL,
+            "input": {
+                "image_url": image_url
+            }
+        }
+        result = await self._request_json('POST', self.detect_url, json=payload)
+        if "error" in result:
+            logger.error(f"图片质量检测失败: {result['error']}")
+        return result
+
+    async def submit_video_generation_task(self, image_url: str, audio_url: str,
+                                           parameters: Dict = None) -> Dict:
+        """提交视频生成任务（parameters 默认使用 config.VIDEO_GENERATION_PARAMS）"""
+        headers = self.headers.copy()
+        headers['X-DashScope-Async'] = 'enable'
+
+        payload = {
+            "model": "liveportrait",
+            "input": {
+                "image_url": image_url,
+                "audio_url": audio_url
+            },
+            "parameters": parameters or config.VIDEO_GENERATION_PARAMS
+        }
+        result = await self._request_json('POST', self.video_synthesis_url, headers=headers, json=payload)
+        if "error" in result:
+            logger.error(f"视频生成任务提交失败: {result['error']}")
+        return result
+
+    async def query_task_status(self, task_id: str) -> Dict:
+        """查询任务状态"""
+        self.query_count += 1
+        result = await self._request_json('GET', f"{self.task_query_url}/{task_id}")
+        if "error" in result:
+            logger.error(f"任务状态查询失败: {result['error']}")
+        return result
+
+    async def wait_for_task_completion(self, task_id: str, max_wait_time: int = None,
+                                       task_type: str = 'liveportrait', submitted_at: float = None) -> Dict:
+        """
+        等待任务完成
+
+        查询时间由 PollSchedule 按历史耗时安排（预计完成前不查询，之后按耗时离散程度等间隔查询，超出预期后退避）；
+        查询失败视为暂时性问题，继续轮询直到超时；submitted_at 用于恢复之前提交的任务
+        """
+        if max_wait_time is None:
+            max_wait_time = config.MAX_WAIT_TIME
+
+        p10, p90 = self.estimator.estimate(task_type)
+        schedule = PollSchedule(p10, p90, submitted_at)
+        # 从本地开始（或恢复）轮询时计时，从任务日志恢复的旧任务也有完整的等待时间
+        deadline = time.time() + max_wait_time
+
+        while time.time() < deadline:
+            await asyncio.sleep(schedule.next_delay())
+
+            result = await self.query_task_status(task_id)
+            task_status = result.get("output", {}).get("task_status")
+
+            if task_status in FINISHED_STATUSES:
+                logger.info(f"任务 {task_id} 状态: {task_status}")
+                if task_status == 'SUCCEEDED':
+                    duration = upstream_duration(result) or (time.time() - schedule.submitted_at)
+                    self.estimator.record(task_type, duration)
+                return result
+
+        return {"error": "任务超时"}
+
+    async def download_video(self, video_url: str, output_path: Path) -> bool:
+        """
+        下载生成的视频：在线程中调用 downloader.download_file（与同步版一致，
+        先写 .part 文件，可续传、分段并行、校验大小/MD5后再重命名，中断时不会留下不完整的视频）
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, download_file, video_url, output_path)
+        if not result['success']:
+            logger.error(f"视频下载失败: {result['error']}")
+            return False
+
+        logger.info(f"视频已下载到: {output_path} "
+                    f"({result['size'] / 1024 / 1024:.1f}MB, {result['speed'] / 1024 / 1024:.2f}MB/s)")
+        return True
+
+
+async def _run_job(client: AsyncDashScopeClient, job: Dict, audio_url: str,
+                   upload_fn: Callable[[Path], Optional[str]], upload_executor: ThreadPoolExecutor,
+                   render_slots: asyncio.Semaphore, image_lock: asyncio.Lock,
+                   journal: job_journal.JobJournal = None, detect_cache: DetectCache = None) -> bool:
+    """
+    执行单个生成任务（提供 journal 时跳过已完成的步骤并记录每个阶段，提供 detect_cache 时复用检测结论）
+
+    image_lock 为同一图片的所有任务共享，上传和检测依次进行，后面的任务直接复用结果
+    """
+    name = job['name']
+    audio_url = job.get('audio_url') or audio_url
+    loop = asyncio.get_running_loop()
+
+    def record(stage, **fields):
+        if journal:
+            journal.update(job, stage, **fields)
+
+    def fail(message):
+        logger.error(f"任务执行失败 {name}: {message}")
+        record(job_journal.STAGE_FAILED, error=message)
+        return False
+
+    def reject(message):
+        logger.warning(f"图片质量检测未通过 {name}: {message}")
+        record(job_journal.STAGE_REJECTED, detect_message=message)
+        return False
+
+    stage = journal.resume(job) if journal else None
+    if stage == job_journal.STAGE_DOWNLOADED:
+        logger.info(f"视频已存在，跳过: {job['output']}")
+        return True
+    if stage == job_journal.STAGE_REJECTED:
+        logger.warning(f"图片质量检测未通过（已记录）{name}: {job.get('detect_message')}")
+        return False
+
+    if stage == job_journal.STAGE_SUCCEEDED:
+        video_url = job['video_url']
+    else:
+        if stage != job_journal.STAGE_SUBMITTED:
+            async with image_lock:
+                cached = None
+                if stage != job_journal.STAGE_DETECTED and detect_cache:
+                    # 计算摘要要读文件，放到线程池里
+                    cached = await loop.run_in_executor(upload_executor, detect_cache.get, job['image'])
+                    if cached and not cached['pass']:
+                        return reject(cached['message'])
+
+                image_url = job.get('image_url')
+                if not image_url:
+                    image_url = await loop.run_in_executor(upload_executor, upload_fn, job['image'])
+                    if not image_url:
+                        logger.error(f"无法上传图片到OSS: {job['image']}")
+                        return False
+                    record(job_journal.STAGE_UPLOADED, image_url=image_url, uploaded_at=time.time())
+
+                if stage != job_journal.STAGE_DETECTED and not cached:
+                    detect_result = await client.detect_image_quality(image_url)
+                    if "error" in detect_result:
+                        return False
+                    if detect_cache:
+                        await loop.run_in_executor(upload_executor, detect_cache.put, job['image'], detect_result)
+                    if not detect_result.get("output", {}).get("pass", False):
+                        return reject(detect_result.get("output", {}).get("message", "未知错误"))
+                if stage != job_journal.STAGE_DETECTED:
+                    record(job_journal.STAGE_DETECTED, detect_message=None)
+
+        # 只有提交到轮询结束这段占用渲染名额
+        async with render_slots:
+            if stage == job_journal.STAGE_SUBMITTED:
+                task_id = job['task_id']
+            else:
+                task_result = await client.submit_video_generation_task(image_url, audio_url, job.get('params'))
+                task_id = task_result.get("output", {}).get("task_id")
+                if not task_id:
+                    if "error" not in task_result:
+                        logger.error(f"未获取到任务ID: {name}")
+                    return False
+
+                logger.info(f"任务已提交 {name}，任务ID: {task_id}")
+                job['submitted_at'] = time.time()
+                record(job_journal.STAGE_SUBMITTED, task_id=task_id, submitted_at=job['submitted_at'])
+
+            final_result = await client.wait_for_task_completion(task_id, submitted_at=job.get('submitted_at'))
+
+        if "error" in final_result:
+            # 本地等待超时，任务可能仍在渲染：日志保持在submitted阶段，下次运行继续查询
+            logger.error(f"任务等待超时 {name}: {final_result['error']}（已保留任务ID，下次运行继续查询）")
+            return False
+
+        output = final_result.get("output", {})
+        if output.get("task_status") != "SUCCEEDED":
+            return fail(output.get('message', output.get('task_status')))
+
+        video_url = output.get("results", {}).get("video_url")
+        if not video_url:
+            return fail("未获取到视频URL")
+        record(job_journal.STAGE_SUCCEEDED, video_url=video_url, finished_at=time.time())
+
+    if not await client.download_video(video_url, job['output']):
+        return False
+    record(job_journal.STAGE_DOWNLOADED)
+    return True
+
+
+async def generate_videos(jobs: List[Dict], audio_url: str, api_key: str,
+                          upload_fn: Callable[[Path], Optional[str]], base_url: str = None,
+                          max_in_flight: int = None, journal: job_journal.JobJournal = None,
+                          detect_cache: DetectCache = None) -> int:
+    """
+    在一个事件循环中并发执行整批视频生成任务
+
+    Args:
+        jobs: 任务列表（同 LivePortraitVideoGenerator.build_job()；已有 image_url 时跳过上传）
+        audio_url: 音频URL（任务自带 audio_url 时优先使用，矩阵批量模式中每个任务的音频不同）
+        api_key: DashScope API Key
+        upload_fn: 同步上传函数（在线程池中执行），返回图片URL
+        base_url: 可选，DashScope服务地址（如本地桩服务）
+        max_in_flight: 同时在DashScope上运行的任务数，默认 config.DASHSCOPE_ASYNC_MAX_IN_FLIGHT
+        journal: 可选，任务日志（跳过已完成的步骤，中断后可继续）
+        detect_cache: 可选，质量检测结果缓存（已缓存结论的图片不调用检测接口）
+
+    Returns:
+        成功生成的视频数
+    """
+    render_slots = asyncio.Semaphore(max_in_flight or config.DASHSCOPE_ASYNC_MAX_IN_FLIGHT)
+    image_locks = defaultdict(asyncio.Lock)
+
+    with ThreadPoolExecutor(max_workers=config.DASHSCOPE_ASYNC_UPLOAD_WORKERS,
+                            thread_name_prefix='oss-upload') as upload_executor:
+        async with AsyncDashScopeClient(api_key, base_url=base_url) as client:
+            results = await asyncio.gather(
+                *(_run_job(client, job, audio_url, upload_fn, upload_executor, render_slots,
+                           image_locks[Path(job['image']).resolve()], journal, detect_cache)
+                  for job in jobs),
+                return_exceptions=True
+            )
+            query_count = client.query_count
+
+    success_count = 0
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.error(f"处理 {job['name']} 时发生错误: {result}")
+        elif result:
+            success_count += 1
+
+    logger.info(f"状态查询共 {query_count} 次（平均每个任务 {query_count / max(len(jobs), 1):.2f} 次）")
+    return success_count
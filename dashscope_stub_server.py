@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+DashScope LivePortrait 本地桩服务
+模拟图片检测、异步提交、任务查询和视频下载接口，响应格式与官方文档一致，
+用于在不产生费用的情况下联调和压测 dashscope_async / video_generator
+
+模拟行为:
+- 图片URL中包含 "reject" 时检测不通过
+- 每个任务渲染耗时 = render-seconds ± jitter，期间依次为 PENDING、RUNNING
+- 按 fail-rate 随机让任务失败
+- 统计每类接口的调用次数，可通过 GET /stats 查看
+
+用法:
+    python dashscope_stub_server.py --port 8089 --render-seconds 20 --jitter 5
+    python video_generator.py --async --base-url http://127.0.0.1:8089
+"""
+
+import argparse
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from aiohttp import web
+
+DETECT_PATH = '/api/v1/services/aigc/image2video/face-detect'
+SYNTHESIS_PATH = '/api/v1/services/aigc/image2video/video-synthesis'
+TASK_PATH = '/api/v1/tasks/{task_id}'
+VIDEO_PATH = '/videos/{task_id}.mp4'
+
+
+def _request_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _format_time(timestamp: float) -> str:
+    """与DashScope一致的时间格式，如 2024-01-01 12:00:00.123"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def _unauthorized():
+    return web.json_response({
+        'request_id': _request_id(),
+        'code': 'InvalidApiKey',
+        'message': 'Invalid API-key provided.'
+    }, status=401)
+
+
+def create_app(render_seconds: float = 10.0, jitter: float = 2.0, fail_rate: float = 0.0,
+               video_size: int = 256 * 1024) -> web.Application:
+    """
+    创建桩服务应用
+
+    Args:
+        render_seconds: 平均渲染耗时（秒）
+        jitter: 渲染耗时的随机波动（秒）
+        fail_rate: 任务失败概率 (0-1)
+        video_size: 下载视频的字节数
+    """
+    tasks = {}
+    calls = Counter()
+    video_bytes = b'\0' * video_size
+
+    def authorized(request) -> bool:
+        return request.headers.get('Authorization', '').startswith('Bearer ')
+
+    async def detect(request):
+        calls['detect'] += 1
+        if not authorized(request):
+            return _unauthorized()
+
+        body = await request.json()
+        image_url = body.get('input', {}).get('image_url', '')
+        passed = 'reject' not in image_url
+        return web.json_response({
+            'request_id': _request_id(),
+            'output': {
+                'pass': passed,
+                'message': 'success' if passed else 'No human face detected.'
+            }
+        })
+
+    async def submit(request):
+        calls['submit'] += 1
+        if not authorized(request):
+            return _unauthorized()
+        if request.headers.get('X-DashScope-Async') != 'enable':
+            return web.json_response({
+                'request_id': _request_id(),
+                'code': 'AccessDenied',
+                'message': 'current user api does not support synchronous calls'
+            }, status=403)
+
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        duration = max(0.5, random.uniform(render_seconds - jitter, render_seconds + jitter))
+        tasks[task_id] = {
+            'submitted_at': now,
+            'started_at': now + min(1.0, duration / 4),
+            'finish_at': now + duration,
+            'fail': random.random() < fail_rate
+        }
+        return web.json_response({
+            'request_id': _request_id(),
+            'output': {'task_id': task_id, 'task_status': 'PENDING'}
+        })
+
+    async def query(request):
+        calls['query'] += 1
+        if not authorized(request):
+            return _unauthorized()
+
+        task_id = request.match_info['task_id']
+        task = tasks.get(task_id)
+        output = {'task_id': task_id}
+        now = time.time()
+
+        if task is None:
+            output['task_status'] = 'UNKNOWN'
+            return web.json_response({'request_id': _request_id(), 'output': output})
+
+        output['submit_time'] = _format_time(task['submitted_at'])
+        if now < task['started_at']:
+            output['task_status'] = 'PENDING'
+        elif now < task['finish_at']:
+            output['task_status'] = 'RUNNING'
+        elif task['fail']:
+            output.update({'task_status': 'FAILED', 'code': 'InternalError', 'message': 'stub failure',
+                           'end_time': _format_time(task['finish_at'])})
+        else:
+            output['task_status'] = 'SUCCEEDED'
+            output['end_time'] = _format_time(task['finish_at'])
+            output['results'] = {'video_url': f"{request.url.origin()}/videos/{task_id}.mp4"}
+
+        return web.json_response({'request_id': _request_id(), 'output': output})
+
+    async def video(request):
+        calls['download'] += 1
+        return web.Response(body=video_bytes, content_type='video/mp4')
+
+    async def stats(request):
+        return web.json_response({'calls': dict(calls), 'tasks': len(tasks)})
+
+    app = web.Application()
+    app.router.add_post(DETECT_PATH, detect)
+    app.router.add_post(SYNTHESIS_PATH, submit)
+    app.router.add_post(SYNTHESIS_PATH + '/', submit)
+    app.router.add_get(TASK_PATH, query)
+    app.router.add_get(VIDEO_PATH, video)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DashScope LivePortrait 本地桩服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--render-seconds', type=float, default=10.0, help="平均渲染耗时（秒）")
+    parser.add_argument('--jitter', type=float, default=2.0, help="渲染耗时随机波动（秒）")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="任务失败概率 (0-1)")
+    parser.add_argument('--video-size', type=int, default=256 * 1024, help="下载视频的字节数")
+    args = parser.parse_args()
+
+    app = create_app(args.render_seconds, args.jitter, args.fail_rate, args.video_size)
+    print(f"DashScope桩服务: http://{args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
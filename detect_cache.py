@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+图片质量检测结果缓存
+同一张图片的检测结论不会变化，按图片内容的SHA-256缓存 pass/message，
+重复运行时不再调用DashScope检测接口（不耗时也不耗额度）
+
+功能特点:
+- 按文件内容计算摘要，与文件名、OSS URL无关
+- 持久化到JSON（config.DETECT_CACHE_FILE），写盘时在文件锁内与文件中其他进程保存的结论合并
+- 记录检测模型名，config.DETECT_MODEL 变化时整个缓存作废
+- 只缓存接口给出的结论，请求失败不缓存
+"""
+
+import hashlib
+import json
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+from atomic_io import atomic_write_json, file_lock
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# 两次写盘的最小间隔（秒），大目录首次运行时不必每张图片都重写整个文件
+SAVE_INTERVAL = 5.0
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectCache:
+    """图片质量检测结果缓存（线程安全）"""
+
+    def __init__(self, path: str = None, model: str = None):
+        """
+        Args:
+            path: 缓存文件，默认 config.DETECT_CACHE_FILE
+            model: 检测模型名，默认 config.DETECT_MODEL；与缓存文件中记录的不一致时丢弃旧结果
+        """
+        self.path = Path(path or config.DETECT_CACHE_FILE)
+        self.model = model or config.DETECT_MODEL
+
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = self._load()
+        self.dirty = False
+        self.last_save = 0.0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, quiet: bool = False) -> Dict[str, Dict]:
+        """读取缓存文件中当前模型的结论（quiet=True 时模型不一致不再提示）"""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取检测结果缓存失败 {self.path}: {e}")
+            return {}
+
+        if data.get('model') != self.model:
+            if not quiet:
+                logger.info(f"检测模型已变化（{data.get('model')} -> {self.model}），忽略之前的检测结果")
+            return {}
+        return data.get('entries', {})
+
+    def get(self, image_path: Path) -> Optional[Dict]:
+        """
+        查询图片的检测结论
+
+        Returns:
+            {'pass': bool, 'message': str}，未缓存时返回None
+        """
+        digest = file_sha256(image_path)
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        record_cache_lookup('detect', bool(entry))
+        if not entry:
+            return None
+        return {'pass': entry['pass'], 'message': entry.get('message')}
+
+    def put(self, image_path: Path, detect_result: Dict):
+        """记录检测接口的返回结果（含"error"的失败请求不缓存）"""
+        if "error" in detect_result or "output" not in detect_result:
+            return
+
+        output = detect_result['output']
+        entry = {
+            'pass': bool(output.get('pass', False)),
+            'message': output.get('message'),
+            'checkedAt': time.time()
+        }
+        digest = file_sha256(image_path)
+
+        with self.lock:
+            self.entries[digest] = entry
+            self.dirty = True
+            due = time.time() - self.last_save >= SAVE_INTERVAL
+
+        if due:
+            self.save()
+
+    def save(self):
+        """
+        把缓存写入磁盘（没有新结果时不写）
+
+        在文件锁内重新读取文件，合并其他进程在本进程加载之后保存的结论（同一图片取较新的），
+        再整体原子写回，多个进程同时运行时不会互相覆盖
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+            self.last_save = time.time()
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.path.with_name(self.path.name + '.lock')):
+                for digest, entry in self._load(quiet=True).items():
+                    current = entries.get(digest)
+                    if current is None or entry.get('checkedAt', 0) > current.get('checkedAt', 0):
+                        entries[digest] = entry
+                atomic_write_json(self.path, {'model': self.model, 'entries': entries}, indent=None)
+        except Exception as e:
+            logger.warning(f"保存检测结果缓存失败 {self.path}: {e}")
+            return
+
+        # 其他进程的结论本进程也可以直接使用
+        with self.lock:
+            for digest, entry in entries.items():
+                self.entries.setdefault(digest, entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+可续传的分段下载
+下载生成的视频等大文件：先写入 .part 文件，连接中断后从已下载的位置继续（HTTP Range），
+大文件拆成多段并行下载，完成后校验大小/MD5再重命名为目标文件
+
+功能特点:
+- 1MB读写缓冲（原来是8KB）
+- 进度记录在 .part.json 中，进程重启后也能续传；只记录已fsync到 .part 的字节，崩溃后不会跳过没落盘的数据；
+  服务端文件变化（大小或ETag不同）时从头下载
+- 文件超过 DOWNLOAD_SEGMENT_MIN_SIZE 的两倍时分段并行下载，每段独立重试
+- 服务端不支持Range时退化为单连接完整下载
+- 校验：大小必须与 Content-Range 一致；给出 expected_md5 或服务端为OSS普通对象（ETag即MD5）时校验MD5
+- 返回实际吞吐量，便于对比单连接/多段下载的效果
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+import config
+import http_client
+from atomic_io import atomic_write_json
+from metrics import record_bytes, track_stage
+
+logger = logging.getLogger(__name__)
+
+# 进度文件的最小保存间隔（秒）
+STATE_SAVE_INTERVAL = 1.0
+
+_CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+_MD5_ETAG_PATTERN = re.compile(r'^[0-9a-fA-F]{32}$')
+
+
+def _part_paths(output_path: Path):
+    return (output_path.with_name(output_path.name + '.part'),
+            output_path.with_name(output_path.name + '.part.json'))
+
+
+def _file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _expected_md5(headers, expected_md5: Optional[str]) -> Optional[str]:
+    """确定用于校验的MD5：调用方给出的优先，其次是OSS普通对象的ETag"""
+    if expected_md5:
+        return expected_md5.lower()
+
+    etag = headers.get('ETag', '').strip('"')
+    # 分片上传/追加的OSS对象ETag不是MD5，只有Normal对象可以直接比较
+    if headers.get('x-oss-object-type') == 'Normal' and _MD5_ETAG_PATTERN.match(etag):
+        return etag.lower()
+    return None
+
+
+def _plan_segments(size: int, max_segments: int) -> List[List[int]]:
+    """把文件切成若干段，每段为 [起始, 结束(含), 已下载到的位置]"""
+    count = max(1, min(max_segments, size // config.DOWNLOAD_SEGMENT_MIN_SIZE))
+    segment_size = math.ceil(size / count)
+    return [[start, min(start + segment_size, size) - 1, start]
+            for start in range(0, size, segment_size)]
+
+
+class _Download:
+    """单个文件的下载过程"""
+
+    def __init__(self, url: str, output_path: Path, max_segments: int):
+        self.url = url
+        self.output_path = output_path
+        self.part_path, self.state_path = _part_paths(output_path)
+        self.max_segments = max_segments
+
+        self.lock = threading.Lock()
+        self.state: Dict = {}
+        self.last_save = 0.0
+        self.downloaded = 0
+
+    def _load_state(self, size: int, etag: str) -> bool:
+        """读取之前的进度，与服务端文件一致时返回True"""
+        if not self.part_path.exists() or not self.state_path.exists():
+            return False
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception:
+            return False
+
+        if state.get('size') != size or state.get('etag') != etag or self.part_path.stat().st_size != size:
+            logger.info(f"服务端文件已变化，重新下载: {self.output_path.name}")
+            return False
+
+        self.state = state
+        return True
+
+    def _save_state(self, force: bool = False):
+        with self.lock:
+            now = time.time()
+            if not force and now - self.last_save < STATE_SAVE_INTERVAL:
+                return
+            self.last_save = now
+            snapshot = json.loads(json.dumps(self.state))
+        atomic_write_json(self.state_path, snapshot, indent=None)
+
+    def _commit(self, f, segment: List[int], position: int, force: bool = False):
+        """
+        把分段已写入的数据刷到磁盘后再记录进度
+
+        进度文件只能记录已经fsync的字节，否则崩溃后续传会跳过没落盘的数据，
+        大小校验照样通过（没有MD5可校验时损坏的文件会被当成下载完成）
+        """
+        if not force and time.time() - self.last_save < STATE_SAVE_INTERVAL:
+            return
+        f.flush()
+        os.fsync(f.fileno())
+        with self.lock:
+            segment[2] = position
+        self._save_state(force=True)
+
+    def _fetch_segment(self, segment: List[int]) -> bool:
+        """下载一段，连接中断时从已下载的位置重试"""
+        start, end, _ = segment
+        attempts = 0
+
+        while segment[2] <= end:
+            # 从已落盘的位置继续，写入失败（如磁盘满）时没刷到磁盘的数据会重新下载
+            position = segment[2]
+            headers = {'Range': f'bytes={position}-{end}'}
+            try:
+                with http_client.get(self.url, headers=headers, stream=True,
+                                     timeout=(10, config.DOWNLOAD_READ_TIMEOUT)) as response:
+                    if response.status_code != 206:
+                        raise requests.exceptions.HTTPError(f"Range请求返回 {response.status_code}")
+
+                    with open(self.part_path, 'r+b') as f:
+                        f.seek(position)
+                        try:
+                            for chunk in response.iter_content(chunk_size=config.DOWNLOAD_CHUNK_SIZE):
+                                f.write(chunk)
+                                position += len(chunk)
+                                with self.lock:
+                                    self.downloaded += len(chunk)
+                                self._commit(f, segment, position)
+                        finally:
+                            # 连接中断时也记录已写入的部分
+                            self._commit(f, segment, position, force=True)
+            except (requests.exceptions.RequestException, OSError) as e:
+                attempts += 1
+                if attempts > config.DOWNLOAD_MAX_RETRIES:
+                    logger.error(f"分段 {start}-{end} 下载失败: {e}")
+                    return False
+                logger.warning(f"分段 {start}-{end} 下载中断，从 {segment[2]} 继续（第 {attempts} 次重试）: {e}")
+                time.sleep(config.HTTP_BACKOFF_FACTOR * 2 ** (attempts - 1))
+
+        return True
+
+    def _fetch_whole(self, response: requests.Response) -> bool:
+        """服务端不支持Range：用探测请求的响应直接完整下载"""
+        with open(self.part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=config.DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                self.downloaded += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def run(self, expected_md5: Optional[str]) -> Dict:
+        # 探测：只请求第一个字节，从 Content-Range 得到总大小并确认支持Range
+        with http_client.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True,
+                             timeout=(10, config.DOWNLOAD_READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            md5 = _expected_md5(response.headers, expected_md5)
+
+            match = _CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range', ''))
+            if response.status_code != 206 or not match:
+                logger.info(f"服务端不支持Range，单连接下载: {self.output_path.name}")
+                size = int(response.headers.get('Content-Length', 0)) or None
+                self._fetch_whole(response)
+                return self._finish(size, md5, segments=1, resumed=0)
+
+            size = int(match.group(1))
+            etag = response.headers.get('ETag', '')
+
+        resumed = 0
+        if self._load_state(size, etag):
+            resumed = sum(segment[2] - segment[0] for segment in self.state['segments'])
+            logger.info(f"从断点继续下载 {self.output_path.name}: 已有 {resumed / 1024 / 1024:.1f}MB")
+        else:
+            with open(self.part_path, 'wb') as f:
+                f.truncate(size)
+            self.state = {'size': size, 'etag': etag, 'segments': _plan_segments(size, self.max_segments)}
+            self._save_state(force=True)
+
+        pending = [segment for segment in self.state['segments'] if segment[2] <= segment[1]]
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='download-segment') as pool:
+                results = list(pool.map(self._fetch_segment, pending))
+        else:
+            results = [self._fetch_segment(segment) for segment in pending]
+
+        self._save_state(force=True)
+        if not all(results):
+            return {'success': False, 'error': '分段下载失败，已保留进度，下次可继续'}
+
+        return self._finish(size, md5, segments=len(self.state['segments']), resumed=resumed)
+
+    def _finish(self, size: Optional[int], md5: Optional[str], segments: int, resumed: int) -> Dict:
+        """校验并把 .part 重命名为目标文件"""
+        actual_size = self.part_path.stat().st_size
+        error = None
+        if size is not None and actual_size != size:
+            error = f"文件大小不一致: {actual_size} != {size}"
+        elif md5 and _file_md5(self.part_path) != md5:
+            error = "MD5校验失败"
+
+        if error:
+            # 数据已不可信，删除进度从头下载
+            self.part_path.unlink(missing_ok=True)
+            self.state_path.unlink(missing_ok=True)
+            return {'success': False, 'error': error}
+
+        os.replace(self.part_path, self.output_path)
+        self.state_path.unlink(missing_ok=True)
+        return {'success': True, 'size': actual_size, 'segments': segments,
+                'resumed': resumed, 'verified': bool(md5)}
+
+
+def download_file(url: str, output_path, expected_md5: str = None, max_segments: int = None) -> Dict:
+    """
+    下载文件（可续传、大文件分段并行）
+
+    Args:
+        url: 下载地址
+        output_path: 目标文件路径，下载过程中使用 <output_path>.part
+        expected_md5: 可选，期望的MD5（十六进制）
+        max_segments: 最多并行段数，默认 config.DOWNLOAD_SEGMENTS；1 表示单连接
+
+    Returns:
+        {'success': True, 'size': 文件字节数, 'seconds': 耗时, 'speed': 本次下载速度(字节/秒),
+         'segments': 段数, 'resumed': 续传复用的字节数, 'verified': 是否校验了MD5}
+        失败时 {'success': False, 'error': 原因}
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    download = _Download(url, output_path, max_segments or config.DOWNLOAD_SEGMENTS)
+
+    start_time = time.perf_counter()
+    with track_stage('video_download') as stage:
+        try:
+            result = download.run(expected_md5)
+        except (requests.exceptions.RequestException, OSError) as e:
+            result = {'success': False, 'error': str(e)}
+        if not result['success']:
+            stage.fail('download_failed')
+
+    elapsed = time.perf_counter() - start_time
+    record_bytes('video_download', 'in', download.downloaded)
+    result['seconds'] = round(elapsed, 3)
+    result['speed'] = download.downloaded / elapsed if elapsed > 0 else 0.0
+    return result
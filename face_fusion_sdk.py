@@ -4,12 +4,17 @@
 """
 
 import os
+import time
 import logging
 from alibabacloud_facebody20191230.client import Client as FacebodyClient
 from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_facebody20191230.models import MergeImageFaceRequest, AddFaceImageTemplateRequest
 from alibabacloud_tea_util import models as util_models
 
+import config
+from metrics import STAGE_ERRORS, track_stage
+from resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, UpstreamUnavailable
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,6 +25,24 @@ class FaceFusionSDKClient:
     def __init__(self):
         """初始化客户端"""
         self.client = None
+
+        # 每个上游操作独立熔断，融合接口额外做自适应并发限制
+        self.breakers = {
+            operation: CircuitBreaker(
+                operation,
+                failure_threshold=config.FACE_FUSION_BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=config.FACE_FUSION_BREAKER_RECOVERY_TIMEOUT
+            )
+            for operation in ('merge_face', 'add_face_template')
+        }
+        self.merge_limiter = AdaptiveConcurrencyLimiter(
+            'merge_face',
+            initial_limit=config.FACE_FUSION_LIMIT_INITIAL,
+            min_limit=config.FACE_FUSION_LIMIT_MIN,
+            max_limit=config.FACE_FUSION_LIMIT_MAX,
+            latency_threshold=config.FACE_FUSION_LATENCY_THRESHOLD
+        )
+
         self.init_client()
     
     def init_client(self):
@@ -51,6 +74,74 @@ class FaceFusionSDKClient:
             logger.error(f"阿里云SDK客户端初始化失败: {e}")
             return False
     
+    def _runtime_options(self, timeout):
+        """创建带超时的运行时选项（SDK单位为毫秒），关闭SDK自带重试以免放大超时"""
+        return util_models.RuntimeOptions(
+            connect_timeout=int(config.FACE_FUSION_CONNECT_TIMEOUT * 1000),
+            read_timeout=int(timeout * 1000),
+            autoretry=False
+        )
+
+    @staticmethod
+    def _is_upstream_failure(error):
+        """判断异常是否属于上游故障（网络错误、超时、5xx），业务错误（如未检测到人脸）不计入熔断"""
+        data = getattr(error, 'data', None)
+        status_code = data.get('statusCode') if isinstance(data, dict) else None
+        return status_code is None or status_code >= 500
+
+    @classmethod
+    def _is_retryable(cls, error):
+        """判断失败是否值得重试：上游故障（网络错误、超时、5xx）或限流；业务错误重试也不会成功"""
+        code = getattr(error, 'code', None) or ''
+        return cls._is_upstream_failure(error) or 'Throttling' in code
+
+    def _call_upstream(self, operation, call, limiter=None):
+        """
+        在熔断器和并发限制保护下调用上游
+
+        Raises:
+            UpstreamUnavailable: 熔断打开或并发已满
+        """
+        breaker = self.breakers[operation]
+
+        if limiter and not limiter.try_acquire():
+            STAGE_ERRORS.labels(operation, 'load_shed').inc()
+            raise UpstreamUnavailable('服务繁忙，请稍后重试', config.FACE_FUSION_SHED_RETRY_AFTER)
+
+        if not breaker.allow():
+            if limiter:
+                limiter.cancel()
+            STAGE_ERRORS.labels(operation, 'circuit_open').inc()
+            raise UpstreamUnavailable('人脸融合服务暂时不可用，请稍后重试', breaker.retry_after())
+
+        start_time = time.perf_counter()
+        upstream_ok = True
+        try:
+            with track_stage(operation) as stage:
+                try:
+                    return call()
+                except Exception as e:
+                    # 优先使用阿里云错误码作为错误原因
+                    stage.fail(getattr(e, 'code', None) or type(e).__name__)
+                    raise
+        except Exception as e:
+            upstream_ok = not self._is_upstream_failure(e)
+            raise
+        finally:
+            if upstream_ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            if limiter:
+                limiter.release(time.perf_counter() - start_time, upstream_ok)
+
+    def get_resilience_state(self):
+        """熔断器和并发限制的状态（用于监控）"""
+        return {
+            'breakers': {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            'limiters': {'merge_face': self.merge_limiter.snapshot()}
+        }
+
     def add_face_template(self, template_image_url):
         """
         添加人脸模板
@@ -76,10 +167,13 @@ class FaceFusionSDKClient:
             )
 
             # 创建运行时选项
-            runtime = util_models.RuntimeOptions()
+            runtime = self._runtime_options(config.FACE_FUSION_TEMPLATE_TIMEOUT)
 
             # 调用API
-            response = self.client.add_face_image_template_with_options(request, runtime)
+            response = self._call_upstream(
+                'add_face_template',
+                lambda: self.client.add_face_image_template_with_options(request, runtime)
+            )
 
             # 检查响应
             if response and response.body:
@@ -109,11 +203,19 @@ class FaceFusionSDKClient:
                     'message': '模板添加API响应为空'
                 }
 
+        except UpstreamUnavailable as e:
+            logger.warning(f"模板添加被拒绝: {e.message}")
+            return {
+                'success': False,
+                'message': e.message,
+                'retryAfter': e.retry_after
+            }
         except Exception as e:
             logger.error(f"模板添加调用失败: {e}")
             return {
                 'success': False,
-                'message': f'模板添加API调用失败: {str(e)}'
+                'message': f'模板添加API调用失败: {str(e)}',
+                'retryable': self._is_retryable(e)
             }
 
     def merge_face(self, user_image_url, template_id):
@@ -143,10 +245,14 @@ class FaceFusionSDKClient:
             )
             
             # 创建运行时选项
-            runtime = util_models.RuntimeOptions()
+            runtime = self._runtime_options(config.FACE_FUSION_MERGE_TIMEOUT)
             
             # 调用API
-            response = self.client.merge_image_face_with_options(request, runtime)
+            response = self._call_upstream(
+                'merge_face',
+                lambda: self.client.merge_image_face_with_options(request, runtime),
+                limiter=self.merge_limiter
+            )
             
             # 检查响应
             if response and response.body:
@@ -175,6 +281,13 @@ class FaceFusionSDKClient:
                     'message': 'API响应为空'
                 }
                 
+        except UpstreamUnavailable as e:
+            logger.warning(f"人脸融合被拒绝: {e.message}")
+            return {
+                'success': False,
+                'message': e.message,
+                'retryAfter': e.retry_after
+            }
         except Exception as e:
             logger.error(f"人脸融合调用失败: {e}")
             return {
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+ffmpeg 编码工具
+把逐帧处理后的原始BGR帧通过管道写入 ffmpeg 子进程，输出适合手机播放的 H.264 MP4
+
+功能特点:
+- H.264 (libx264) 编码，预设和CRF可配置
+- 从源视频直接复制音轨（LivePortrait生成的视频带有配音）
+- +faststart 把moov放到文件开头，微信H5边下边播
+- 接口与 cv2.VideoWriter 一致（isOpened / write / release），可直接替换
+- 静态二维码叠加可直接用 overlay 滤镜完成（build_qr_overlay_command），完全不经过Python解码
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import logging
+from typing import Callable, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def find_ffmpeg(ffmpeg_bin: str = None) -> Optional[str]:
+    """查找ffmpeg可执行文件，找不到返回None"""
+    ffmpeg_bin = ffmpeg_bin or config.FFMPEG_BIN
+    if os.path.isfile(ffmpeg_bin) and os.access(ffmpeg_bin, os.X_OK):
+        return ffmpeg_bin
+    return shutil.which(ffmpeg_bin)
+
+
+def h264_output_args(preset: str = None, crf: int = None, audio_codec: str = None,
+                     with_audio: bool = True, audio_input: int = 1) -> List[str]:
+    """H.264 + 音频 + faststart 的输出参数（音轨取自第 audio_input 号输入）"""
+    args = [
+        '-c:v', 'libx264',
+        '-preset', preset or config.FFMPEG_PRESET,
+        '-crf', str(config.FFMPEG_CRF if crf is None else crf),
+        '-pix_fmt', 'yuv420p'
+    ]
+    if with_audio:
+        # "?" 表示源视频没有音轨时忽略，不报错
+        args += ['-map', f'{audio_input}:a:0?', '-c:a', audio_codec or config.FFMPEG_AUDIO_CODEC]
+    args += ['-movflags', '+faststart']
+    return args
+
+
+class FFmpegPipeWriter:
+    """通过stdin管道向ffmpeg写入原始帧"""
+
+    def __init__(self, output_path, fps: float, frame_size, audio_source=None,
+                 preset: str = None, crf: int = None, ffmpeg_bin: str = None):
+        """
+        Args:
+            output_path: 输出视频路径
+            fps: 帧率（保留小数，如29.97）
+            frame_size: (宽, 高)
+            audio_source: 提供音轨的源视频路径，None表示不要音频
+            preset: x264预设，默认 config.FFMPEG_PRESET
+            crf: x264质量，默认 config.FFMPEG_CRF
+            ffmpeg_bin: ffmpeg路径，默认 config.FFMPEG_BIN
+        """
+        self.output_path = str(output_path)
+        self.width, self.height = frame_size
+        self.frame_bytes = self.width * self.height * 3
+        self.failed = False
+        self.process = None
+
+        executable = find_ffmpeg(ffmpeg_bin)
+        if executable is None:
+            logger.error(f"未找到ffmpeg: {ffmpeg_bin or config.FFMPEG_BIN}")
+            return
+
+        command = [
+            executable, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{self.width}x{self.height}', '-r', f'{fps:.6g}',
+            '-i', 'pipe:0'
+        ]
+        if audio_source:
+            command += ['-i', str(audio_source)]
+
+        # yuv420p 要求宽高为偶数
+        command += ['-map', '0:v:0', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        command += h264_output_args(preset, crf, with_audio=bool(audio_source))
+        command.append(self.output_path)
+
+        # stderr写入临时文件，避免管道写满导致ffmpeg阻塞
+        self.stderr_file = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.stderr_file
+            )
+        except OSError as e:
+            logger.error(f"启动ffmpeg失败: {e}")
+            self.stderr_file.close()
+            self.process = None
+
+    def isOpened(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame):
+        """写入一帧BGR图像（尺寸必须与构造时一致）"""
+        if self.failed or self.process is None:
+            return
+
+        if frame.nbytes != self.frame_bytes:
+            logger.error(f"帧尺寸不一致: {frame.shape}, 期望 {self.height}x{self.width}x3")
+            self.failed = True
+            return
+
+        try:
+            # 连续内存直接写入，不额外复制
+            self.process.stdin.write(frame.data if frame.flags['C_CONTIGUOUS'] else frame.tobytes())
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"写入ffmpeg失败: {e}")
+            self.failed = True
+
+    def release(self) -> bool:
+        """结束编码并等待ffmpeg退出，返回是否成功"""
+        if self.process is None:
+            return False
+
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            self.failed = True
+
+        return_code = self.process.wait()
+        self.process = None
+
+        self.stderr_file.seek(0)
+        error_output = self.stderr_file.read().decode('utf-8', errors='replace').strip()
+        self.stderr_file.close()
+
+        if return_code != 0 or self.failed:
+            logger.error(f"ffmpeg编码失败 (返回码 {return_code}): {error_output[-1000:]}")
+            return False
+
+        return True
+
+
+def build_qr_overlay_command(video_path, qr_path, output_path, qr_size: int, margin: int,
+                             opacity: float, ffmpeg_bin: str = None) -> Optional[List[str]]:
+    """
+    构建用 overlay 滤镜叠加二维码的ffmpeg命令
+
+    效果与逐帧合成一致：二维码缩放到 qr_size 见方（lanczos），alpha 乘以 opacity，
+    放在右下角距边缘 margin 像素处（视频太小时贴边）
+
+    Returns:
+        命令参数列表，找不到ffmpeg时返回None
+    """
+    executable = find_ffmpeg(ffmpeg_bin)
+    if executable is None:
+        return None
+
+    qr_filter = f'[1:v]scale={qr_size}:{qr_size}:flags=lanczos,format=rgba'
+    if opacity < 1.0:
+        qr_filter += f',colorchannelmixer=aa={opacity:.4f}'
+    filter_graph = (
+        f'{qr_filter}[qr];'
+        f'[0:v][qr]overlay=x=max(0\\,W-w-{margin}):y=max(0\\,H-h-{margin}),'
+        f'pad=ceil(iw/2)*2:ceil(ih/2)*2[v]'
+    )
+
+    return [
+        executable, '-hide_banner', '-loglevel', 'error', '-nostats', '-y',
+        '-i', str(video_path),
+        '-i', str(qr_path),
+        '-filter_complex', filter_graph,
+        '-map', '[v]'
+    ] + h264_output_args(audio_input=0) + [
+        '-progress', 'pipe:1',
+        str(output_path)
+    ]
+
+
+def run_ffmpeg(command: List[str], progress_callback: Callable[[int], None] = None) -> bool:
+    """
+    运行ffmpeg命令并等待结束
+
+    Args:
+        command: 完整命令；带 -progress pipe:1 时会解析已处理帧数
+        progress_callback: 可选，每次ffmpeg上报进度时调用 progress_callback(已处理帧数)
+
+    Returns:
+        是否成功
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        try:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=stderr_file, stdin=subprocess.DEVNULL
+            )
+        except OSError as e:
+            logger.error(f"启动ffmpeg失败: {e}")
+            return False
+
+        for line in process.stdout:
+            if progress_callback and line.startswith(b'frame='):
+                try:
+                    progress_callback(int(line[6:].strip()))
+                except ValueError:
+                    pass
+
+        return_code = process.wait()
+        if return_code != 0:
+            stderr_file.seek(0)
+            error_output = stderr_file.read().decode('utf-8', errors='replace').strip()
+            logger.error(f"ffmpeg执行失败 (返回码 {return_code}): {error_output[-1000:]}")
+            return False
+
+    return True
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+人脸融合结果缓存
+以 (用户图片内容摘要, 阿里云模板ID) 为键缓存 merge_face 的成功结果，
+重复提交同一张照片和同一模板时直接返回，不再调用阿里云
+
+功能特点:
+- 按图片字节内容计算SHA-256摘要，与OSS签名URL无关
+- 内存层：LRU + TTL
+- 可选磁盘层：每个结果一个JSON文件；图片URL -> 摘要 的映射也写入磁盘（images/ 子目录），
+  进程重启后或在其他worker上，用之前上传得到的URL仍可命中
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(data: bytes) -> str:
+    """计算图片内容摘要"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class FusionResultCache:
+    """人脸融合结果缓存（内存LRU + 可选磁盘层）"""
+
+    def __init__(self, max_entries: int = 1000, ttl: int = 1800,
+                 disk_dir: Optional[str] = None, max_tracked_images: int = 10000):
+        """
+        Args:
+            max_entries: 内存层最多缓存的结果数
+            ttl: 结果有效期（秒），不应超过阿里云结果URL的有效期
+            disk_dir: 磁盘层目录，为None时不启用磁盘层
+            max_tracked_images: 最多记录的 图片URL -> 摘要 映射数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_tracked_images = max_tracked_images
+
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            (self.disk_dir / 'images').mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.image_digests: "OrderedDict[str, str]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def register_image(self, image_url: str, digest: str):
+        """记录上传图片URL对应的内容摘要（在上传接口中调用；启用磁盘层时同时写入磁盘）"""
+        self._track_image(image_url, digest)
+        if self.disk_dir:
+            self._write_disk(self._image_path(image_url), {'createdAt': time.time(), 'digest': digest})
+
+    def _track_image(self, image_url: str, digest: str):
+        with self.lock:
+            self.image_digests[image_url] = digest
+            self.image_digests.move_to_end(image_url)
+            while len(self.image_digests) > self.max_tracked_images:
+                self.image_digests.popitem(last=False)
+
+    def _cache_key(self, image_url: str, template_id: str) -> Optional[str]:
+        """根据图片URL查出摘要并生成缓存键（内存中没有时查磁盘），未知图片返回None"""
+        with self.lock:
+            digest = self.image_digests.get(image_url)
+
+        if not digest and self.disk_dir:
+            entry = self._read_disk(self._image_path(image_url), time.time())
+            if entry:
+                digest = entry['digest']
+                self._track_image(image_url, digest)
+
+        if not digest:
+            return None
+        return f"{digest}:{template_id}"
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def _image_path(self, image_url: str) -> Path:
+        return self.disk_dir / 'images' / f"{hashlib.sha256(image_url.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, image_url: str, template_id: str) -> Optional[Dict]:
+        """
+        查询缓存
+
+        Returns:
+            缓存的融合结果，未命中返回None
+        """
+        key = self._cache_key(image_url, template_id)
+        if not key:
+            return None
+
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry['createdAt'] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry['result']
+            if entry:
+                del self.entries[key]
+
+        entry = self._read_disk(self._disk_path(key), now) if self.disk_dir else None
+
+        with self.lock:
+            if entry:
+                self._store_memory(key, entry)
+                self.hits += 1
+                return entry['result']
+            self.misses += 1
+            return None
+
+    def put(self, image_url: str, template_id: str, result: Dict):
+        """写入缓存，只缓存成功的结果"""
+        if not result or not result.get('success'):
+            return
+
+        key = self._cache_key(image_url, template_id)
+        if not key:
+            return
+
+        entry = {'createdAt': time.time(), 'result': result}
+
+        with self.lock:
+            self._store_memory(key, entry)
+
+        if self.disk_dir:
+            self._write_disk(self._disk_path(key), entry)
+
+    def _store_memory(self, key: str, entry: Dict):
+        """写入内存层并按LRU淘汰（调用方需持有锁）"""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _read_disk(self, path: Path, now: float) -> Optional[Dict]:
+        """读取磁盘层文件，过期条目顺便删除"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取融合缓存文件失败 {path}: {e}")
+            return None
+
+        if now - entry.get('createdAt', 0) > self.ttl:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+        return entry
+
+    def _write_disk(self, path: Path, entry: Dict):
+        """写入磁盘层文件（先写临时文件再重命名，避免读到半个文件）"""
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.warning(f"写入融合缓存文件失败 {path}: {e}")
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'trackedImages': len(self.image_digests),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0.0,
+                'diskEnabled': self.disk_dir is not None
+            }
+
+
+class DigestReader:
+    """边读边计算摘要的流包装器，用于流式上传时同时得到图片摘要"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hasher = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        if chunk:
+            self.hasher.update(chunk)
+            self.bytes_read += len(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+人脸融合异步任务队列
+将 merge_face 调用放到有界线程池中执行，请求线程只负责提交任务并立即返回任务ID
+
+功能特点:
+- 有界工作线程池，限制同时访问阿里云的并发数
+- 有界等待队列，队列满时直接拒绝，避免积压
+- 支持轮询查询和SSE推送两种获取结果的方式
+- 已完成任务按TTL自动过期清理
+"""
+
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+FINISHED_STATES = {JOB_SUCCEEDED, JOB_FAILED}
+
+
+class FusionJobQueue:
+    """人脸融合任务队列"""
+
+    def __init__(self, merge_fn: Callable[..., Dict], max_workers: int = 8,
+                 max_pending: int = 100, job_ttl: int = 600):
+        """
+        Args:
+            merge_fn: 实际执行融合的函数，签名为 merge_fn(user_image_url, template_id) -> dict
+            max_workers: 工作线程数
+            max_pending: 最多允许的未完成任务数（排队+执行中）
+            job_ttl: 已完成任务的保留时间（秒）
+        """
+        self.merge_fn = merge_fn
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fusion-job')
+        self.jobs: Dict[str, Dict] = {}
+        self.condition = threading.Condition()
+        self.pending_count = 0
+
+    def submit(self, user_image_url: str, template_id: str, **extra) -> Optional[str]:
+        """
+        提交融合任务
+
+        Returns:
+            任务ID，队列已满时返回None
+        """
+        with self.condition:
+            self._purge_expired()
+
+            if self.pending_count >= self.max_pending:
+                logger.warning(f"融合任务队列已满: {self.pending_count}/{self.max_pending}")
+                return None
+
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'jobId': job_id,
+                'status': JOB_PENDING,
+                'templateId': extra.get('templateId', template_id),
+                'createdAt': time.time(),
+                'startedAt': None,
+                'finishedAt': None,
+                'result': None,
+                'version': 0
+            }
+            self.pending_count += 1
+
+        self.executor.submit(self._run_job, job_id, user_image_url, template_id)
+        logger.info(f"融合任务已提交: {job_id}")
+        return job_id
+
+    def _run_job(self, job_id: str, user_image_url: str, template_id: str):
+        """在工作线程中执行融合任务"""
+        self._update(job_id, status=JOB_RUNNING, startedAt=time.time())
+
+        try:
+            result = self.merge_fn(user_image_url, template_id)
+        except Exception as e:
+            logger.error(f"融合任务执行异常 {job_id}: {e}")
+            result = {
+                'success': False,
+                'message': f'人脸融合失败: {str(e)}'
+            }
+
+        if not result:
+            result = {'success': False, 'message': '人脸融合失败'}
+
+        status = JOB_SUCCEEDED if result.get('success') else JOB_FAILED
+        self._update(job_id, status=status, result=result, finishedAt=time.time())
+
+        with self.condition:
+            self.pending_count -= 1
+
+        logger.info(f"融合任务完成: {job_id}, 状态: {status}")
+
+    def _update(self, job_id: str, **fields):
+        """更新任务字段并唤醒等待者"""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['version'] += 1
+            self.condition.notify_all()
+
+    def _purge_expired(self):
+        """清理过期的已完成任务（调用方需持有锁）"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job['status'] in FINISHED_STATES and now - job['finishedAt'] > self.job_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """获取任务快照"""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for_change(self, job_id: str, last_version: int, timeout: float = 15) -> Optional[Dict]:
+        """
+        等待任务状态变化
+
+        Args:
+            job_id: 任务ID
+            last_version: 调用方已见过的版本号
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            最新任务快照（超时未变化时返回当前快照），任务不存在返回None
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id]['version'] != last_version,
+                timeout=timeout
+            )
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict:
+        """队列统计信息"""
+        with self.condition:
+            return {
+                'pending': self.pending_count,
+                'maxPending': self.max_pending,
+                'tracked': len(self.jobs)
+            }
+
+
+def serialize_job(job: Dict) -> Dict:
+    """将任务转换为API响应格式"""
+    data = {
+        'jobId': job['jobId'],
+        'status': job['status'],
+        'templateId': job['templateId'],
+        'createdAt': job['createdAt'],
+        'finishedAt': job['finishedAt']
+    }
+
+    result = job.get('result')
+    if result:
+        if result.get('success'):
+            data['data'] = result.get('data', {})
+        else:
+            data['message'] = result.get('message', '人脸融合失败')
+            if result.get('retryAfter'):
+                data['retryAfter'] = result['retryAfter']
+
+    return data
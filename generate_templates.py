@@ -4,15 +4,34 @@
 功能：
 1. 从pics目录拷贝图片到web/templates目录
 2. 重命名为template1.jpg, template2.jpg等格式
-3. 生成对应的缩略图template1_thumb.jpg等
+3. 生成对应的缩略图：1x/2x/3x 多种尺寸，JPEG（大尺寸为渐进式）+ WebP（Pillow支持时还有AVIF），
+   如 template1_thumb.jpg、template1_thumb@2x.webp，并以srcset结构写入 web/templates_config.json
+4. 增量生成：web/templates/.manifest.json 记录每个模板的源图摘要和输出文件，
+   源图内容未变化且输出齐全的模板直接跳过
+5. 编号稳定：已有模板（按源图摘要或文件名对应）保持清单里的编号，新图片追加新编号，
+   删除的图片留下空号不再复用；已生成的文件不会改名，运行中的服务器加载的缩略图地址始终指向同一个模板
+6. 需要重新生成的图片在进程池中并行处理，JPEG用draft模式按缩略图尺寸解码
+7. 所有输出先写临时文件再重命名，运行中的服务器不会读到写了一半的图片
+
+用法:
+    python generate_templates.py            # 增量生成
+    python generate_templates.py --force    # 全部重新生成
 """
 
+import io
 import os
-import shutil
+import re
+import math
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from PIL import Image
+from typing import Dict, List, Optional
+from PIL import Image, features
 import logging
 import config
+from atomic_io import atomic_write_bytes, atomic_write_json, file_lock
 
 # 配置日志
 logging.basicConfig(
@@ -21,13 +40,221 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+MANIFEST_NAME = '.manifest.json'
+
+# 输出格式或处理方式变化时递增，强制重新生成所有模板
+BUILD_VERSION = 2
+
+# 旧版本（没有清单时）生成的模板文件
+TEMPLATE_FILE_PATTERN = re.compile(r'^template\d+(_thumb(@\dx)?)?\.(jpe?g|webp|avif)$')
+
+TEMPLATES_CONFIG_FILE = Path('web/templates_config.json')
+
+# 缩略图格式 -> (Pillow格式名, 扩展名, MIME类型)
+THUMBNAIL_FORMATS = {
+    'avif': ('AVIF', '.avif', 'image/avif'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg')
+}
+
+
+def file_sha256(path: Path) -> str:
+    """计算源图内容摘要"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def to_rgb(img: Image.Image) -> Image.Image:
+    """转换为RGB模式（透明背景填充白色）"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return rgb_img
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def thumbnail_formats() -> List[str]:
+    """config.THUMBNAIL_FORMATS 中当前Pillow支持的格式（JPEG总是生成，作为兜底）"""
+    formats = []
+    for fmt in config.THUMBNAIL_FORMATS:
+        if fmt not in THUMBNAIL_FORMATS:
+            logger.warning(f"未知的缩略图格式: {fmt}")
+        elif fmt == 'jpeg' or features.check(fmt):
+            formats.append(fmt)
+        else:
+            logger.warning(f"当前Pillow不支持 {fmt}，跳过该格式的缩略图")
+    if 'jpeg' not in formats:
+        formats.append('jpeg')
+    return formats
+
+
+def thumbnail_name(template_number: int, scale: int, fmt: str) -> str:
+    """缩略图文件名，1x不带后缀，如 template1_thumb.jpg、template1_thumb@2x.webp"""
+    suffix = '' if scale == 1 else f'@{scale}x'
+    return f"template{template_number}_thumb{suffix}{THUMBNAIL_FORMATS[fmt][1]}"
+
+
+def encode_thumbnail(img: Image.Image, fmt: str, quality: int, scale: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        # 渐进式对2x/3x这样较大的图片更小、首屏更早出轮廓；1x只有几KB，基线式反而更小
+        img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=scale > 1)
+    else:
+        img.save(buffer, THUMBNAIL_FORMATS[fmt][0], quality=quality)
+    return buffer.getvalue()
+
+
+def srcset_entry(variants: List[Dict], thumbnail_size) -> Dict:
+    """
+    把缩略图列表整理成前端 <picture> 使用的结构:
+        {'width', 'height', 'src': 1x JPEG,
+         'sources': [{'type': 'image/avif', 'srcset': '... 1x, ... 2x'}, ..., JPEG放在最后]}
+    """
+    sources = []
+    for fmt in THUMBNAIL_FORMATS:
+        items = sorted((v for v in variants if v['format'] == fmt), key=lambda v: v['scale'])
+        if items:
+            sources.append({
+                'type': THUMBNAIL_FORMATS[fmt][2],
+                'srcset': ', '.join(f"/templates/{v['name']} {v['scale']}x" for v in items)
+            })
+
+    src = next(v['name'] for v in variants if v['format'] == 'jpeg' and v['scale'] == 1)
+    return {
+        'width': thumbnail_size[0],
+        'height': thumbnail_size[1],
+        'src': f"/templates/{src}",
+        'sources': sources
+    }
+
+
+def build_template(source_path: Path, template_number: int, templates_dir: Path,
+                   thumbnail_size, thumbnail_quality: int, scales, formats) -> Dict:
+    """
+    生成一个模板的原图和各尺寸、各格式的缩略图（可在子进程中执行）
+
+    Returns:
+        {'number': 模板编号, 'outputs': [输出文件名],
+         'thumbnails': [{'name', 'format', 'scale'}], 'error': 失败原因或None}
+    """
+    target_path = templates_dir / f"template{template_number}.jpg"
+    result = {'number': template_number, 'outputs': [], 'thumbnails': [], 'error': None}
+
+    try:
+        # 原图：JPG直接拷贝，其他格式转换为JPG
+        if source_path.suffix.lower() == '.jpg':
+            atomic_write_bytes(target_path, source_path.read_bytes())
+            logger.info(f"拷贝: {source_path} -> {target_path}")
+        else:
+            with Image.open(source_path) as img:
+                atomic_write_bytes(target_path, encode_jpeg(to_rgb(img), 95))
+            logger.info(f"转换并保存: {source_path} -> {target_path}")
+        result['outputs'].append(target_path.name)
+
+        # 缩略图：直接从源图生成，不再解码刚写出的原图
+        with Image.open(source_path) as img:
+            source_size = img.size
+            largest = (thumbnail_size[0] * max(scales), thumbnail_size[1] * max(scales))
+
+            # 按最大尺寸draft解码：会选择宽高都不小于目标尺寸的最大DCT缩放比例，目标尺寸按原图宽高比换算
+            if img.format == 'JPEG':
+                ratio = min(largest[0] / img.width, largest[1] / img.height)
+                if ratio < 1:
+                    img.draft('RGB', (math.ceil(img.width * ratio), math.ceil(img.height * ratio)))
+
+            img = to_rgb(img)
+
+            for scale in sorted(scales):
+                box = (thumbnail_size[0] * scale, thumbnail_size[1] * scale)
+                # 源图不够大时不生成更高倍率（只会放大留白，浏览器回退到较小的倍率）
+                if scale > 1 and min(box[0] / source_size[0], box[1] / source_size[1]) > 1:
+                    continue
+
+                # 创建缩略图（保持宽高比），居中贴到正方形白色背景上
+                resized = img.copy()
+                resized.thumbnail(box, Image.Resampling.LANCZOS)
+                thumb = Image.new('RGB', box, (255, 255, 255))
+                thumb.paste(resized, ((box[0] - resized.width) // 2, (box[1] - resized.height) // 2))
+
+                for fmt in formats:
+                    name = thumbnail_name(template_number, scale, fmt)
+                    atomic_write_bytes(templates_dir / name, encode_thumbnail(thumb, fmt, thumbnail_quality, scale))
+                    result['outputs'].append(name)
+                    result['thumbnails'].append({'name': name, 'format': fmt, 'scale': scale})
+
+        logger.info(f"生成缩略图: template{template_number}_thumb ({len(result['thumbnails'])} 个)")
+
+    except Exception as e:
+        logger.error(f"生成模板失败 {source_path}: {e}")
+        result['error'] = str(e)
+
+    return result
+
+
+def load_thumbnail_sets(templates_dir: Path = None) -> Dict[str, Dict]:
+    """从模板清单读取每张源图的缩略图srcset结构，返回 {源图文件名: srcset_entry()}"""
+    manifest_path = Path(templates_dir or config.TEMPLATES_DIR) / MANIFEST_NAME
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    thumbnail_size = manifest.get('settings', {}).get('thumbnailSize', config.THUMBNAIL_SIZE)
+    return {
+        entry['source']: srcset_entry(entry['thumbnails'], thumbnail_size)
+        for entry in manifest.get('templates', {}).values()
+        if entry.get('thumbnails')
+    }
+
+
+def apply_thumbnails(templates: List[Dict], thumbnail_sets: Dict[str, Dict]):
+    """
+    把缩略图写入模板配置项（按 originalFile 对应源图）
+
+    localThumbnail 和 thumbnailUrl 都指向1x JPEG，只读 thumbnailUrl 的页面也不会下载原图；
+    没有缩略图的模板 thumbnailUrl 退回原图
+    """
+    for template in templates:
+        thumbnails = thumbnail_sets.get(template.get('originalFile'))
+        if thumbnails:
+            template['thumbnails'] = thumbnails
+            template['localThumbnail'] = thumbnails['src']
+            template['thumbnailUrl'] = thumbnails['src']
+        else:
+            template.pop('thumbnails', None)
+            if template.get('thumbnailUrl') == template.get('localThumbnail') and template.get('templateUrl'):
+                template['thumbnailUrl'] = template['templateUrl']
+
+
 class TemplateGenerator:
-    def __init__(self):
+    def __init__(self, workers: int = None):
+        """
+        Args:
+            workers: 并行生成的进程数，默认 config.TEMPLATE_BUILD_WORKERS（None为CPU核数）
+        """
+        self.workers = workers or config.TEMPLATE_BUILD_WORKERS or os.cpu_count() or 1
         self.pics_dir = Path(config.PICS_DIR)
         self.templates_dir = Path(config.TEMPLATES_DIR)
         self.thumbnail_size = config.THUMBNAIL_SIZE
         self.thumbnail_quality = config.THUMBNAIL_QUALITY
+        self.thumbnail_scales = tuple(config.THUMBNAIL_SCALES)
+        self.thumbnail_formats = thumbnail_formats()
         self.supported_formats = config.SUPPORTED_IMAGE_FORMATS
+        self.manifest_path = self.templates_dir / MANIFEST_NAME
         
         # 确保模板目录存在
         self.templates_dir.mkdir(parents=True, exist_ok=True)
@@ -40,95 +267,115 @@ class TemplateGenerator:
                 image_files.append(file_path)
         return sorted(image_files)
     
-    def copy_and_rename_image(self, source_path, template_number):
-        """拷贝并重命名图片"""
-        target_filename = f"template{template_number}.jpg"
-        target_path = self.templates_dir / target_filename
-        
-        try:
-            # 如果源文件不是jpg格式，需要转换
-            if source_path.suffix.lower() != '.jpg':
-                # 使用PIL转换格式
-                with Image.open(source_path) as img:
-                    # 转换为RGB模式（去除透明通道）
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = rgb_img
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # 保存为JPG格式
-                    img.save(target_path, 'JPEG', quality=95)
-                    logger.info(f"转换并保存: {source_path} -> {target_path}")
-            else:
-                # 直接拷贝JPG文件
-                shutil.copy2(source_path, target_path)
-                logger.info(f"拷贝: {source_path} -> {target_path}")
-            
-            return target_path
-            
-        except Exception as e:
-            logger.error(f"拷贝文件失败 {source_path} -> {target_path}: {e}")
-            return None
-    
-    def generate_thumbnail(self, image_path, template_number):
-        """生成缩略图"""
-        thumbnail_filename = f"template{template_number}_thumb.jpg"
-        thumbnail_path = self.templates_dir / thumbnail_filename
-        
-        try:
-            with Image.open(image_path) as img:
-                # 转换为RGB模式
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = rgb_img
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 创建缩略图（保持宽高比）
-                img.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
-                
-                # 创建正方形背景
-                thumb = Image.new('RGB', self.thumbnail_size, (255, 255, 255))
-                
-                # 计算居中位置
-                x = (self.thumbnail_size[0] - img.width) // 2
-                y = (self.thumbnail_size[1] - img.height) // 2
-                
-                # 粘贴缩略图到中心
-                thumb.paste(img, (x, y))
-                
-                # 保存缩略图
-                thumb.save(thumbnail_path, 'JPEG', quality=self.thumbnail_quality)
-                logger.info(f"生成缩略图: {thumbnail_path}")
-                
-            return thumbnail_path
-            
-        except Exception as e:
-            logger.error(f"生成缩略图失败 {image_path} -> {thumbnail_path}: {e}")
-            return None
-    
-    def clean_templates_directory(self):
-        """清理模板目录中的旧文件"""
+    def build_settings(self) -> Dict:
+        """影响输出的设置，变化时所有模板重新生成"""
+        return {
+            'version': BUILD_VERSION,
+            'thumbnailSize': list(self.thumbnail_size),
+            'thumbnailQuality': self.thumbnail_quality,
+            'thumbnailScales': list(self.thumbnail_scales),
+            'thumbnailFormats': self.thumbnail_formats
+        }
+
+    def load_manifest(self) -> Dict:
+        """读取上次生成的清单 {'settings': ..., 'nextNumber': 下一个新编号, 'templates': {模板编号: {'source', 'sha256', 'outputs'}}}"""
+        if not self.manifest_path.exists():
+            return {}
         try:
-            for file_path in self.templates_dir.iterdir():
-                if file_path.is_file() and (
-                    file_path.name.startswith('template') and 
-                    (file_path.name.endswith('.jpg') or file_path.name.endswith('.jpeg'))
-                ):
-                    file_path.unlink()
-                    logger.info(f"删除旧文件: {file_path}")
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
         except Exception as e:
-            logger.error(f"清理目录失败: {e}")
-    
-    def run(self, clean_first=True):
-        """运行模板生成"""
+            logger.warning(f"读取模板清单失败，全部重新生成: {e}")
+            return {}
+
+    def is_up_to_date(self, entry: Optional[Dict], digest: str) -> bool:
+        """清单记录的源图摘要一致且输出文件都在"""
+        return bool(entry) and entry.get('sha256') == digest and all(
+            (self.templates_dir / name).exists() for name in entry.get('outputs', [])
+        )
+
+    def assign_numbers(self, image_files: List[Path], digests: List[str], manifest: Dict) -> List[int]:
+        """
+        为每张源图分配模板编号
+
+        已有模板保持清单里的编号：先按源图摘要对应（图片改名也算同一模板），再按文件名对应（图片内容更新）；
+        其余图片从 nextNumber 开始追加。删除的图片留下的编号不再分配，
+        否则运行中的服务器还在引用的旧缩略图地址会显示成另一张图片
+        """
+        old_templates = manifest.get('templates', {})
+        by_digest: Dict[str, List[int]] = {}
+        by_source: Dict[str, int] = {}
+        for number, entry in sorted(old_templates.items(), key=lambda item: int(item[0])):
+            by_digest.setdefault(entry.get('sha256'), []).append(int(number))
+            by_source[entry.get('source')] = int(number)
+
+        next_number = max([manifest.get('nextNumber', 1)] + [int(number) + 1 for number in old_templates])
+        numbers: List[Optional[int]] = [None] * len(image_files)
+        taken = set()
+
+        for i, (image_path, digest) in enumerate(zip(image_files, digests)):
+            candidates = [number for number in by_digest.get(digest, []) if number not in taken]
+            if candidates:
+                # 同一内容有多个旧模板时优先文件名也相同的
+                number = by_source.get(image_path.name)
+                numbers[i] = number if number in candidates else candidates[0]
+                taken.add(numbers[i])
+
+        for i, image_path in enumerate(image_files):
+            number = by_source.get(image_path.name)
+            if numbers[i] is None and number is not None and number not in taken:
+                numbers[i] = number
+                taken.add(number)
+
+        for i in range(len(image_files)):
+            if numbers[i] is None:
+                numbers[i] = next_number
+                next_number += 1
+
+        return numbers
+
+    def build_all(self, tasks: List) -> List[Dict]:
+        """生成需要更新的模板，多于一个时使用进程池"""
+        args = [(path, number, self.templates_dir, self.thumbnail_size, self.thumbnail_quality,
+                 self.thumbnail_scales, self.thumbnail_formats)
+                for number, path, _ in tasks]
+
+        if len(tasks) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                return list(executor.map(build_template, *zip(*args)))
+        return [build_template(*arg) for arg in args]
+
+    def update_templates_config(self):
+        """把缩略图srcset写入 web/templates_config.json（文件不存在时跳过）"""
+        if not TEMPLATES_CONFIG_FILE.exists():
+            return
+
+        with file_lock(TEMPLATES_CONFIG_FILE.with_name(TEMPLATES_CONFIG_FILE.name + '.lock')):
+            with open(TEMPLATES_CONFIG_FILE, 'r', encoding='utf-8') as f:
+                templates_config = json.load(f)
+            apply_thumbnails(templates_config.get('templates', []), load_thumbnail_sets(self.templates_dir))
+            atomic_write_json(TEMPLATES_CONFIG_FILE, templates_config)
+        logger.info(f"缩略图已写入模板配置: {TEMPLATES_CONFIG_FILE}")
+
+    def remove_stale_files(self, old_templates: Dict[str, Dict], keep: set):
+        """删除不再使用的输出文件（清单中记录的旧输出，以及没有清单时旧版本生成的模板文件）"""
+        candidates = {name for entry in old_templates.values() for name in entry.get('outputs', [])}
+        candidates.update(path.name for path in self.templates_dir.iterdir()
+                          if path.is_file() and TEMPLATE_FILE_PATTERN.match(path.name))
+
+        for name in sorted(candidates - keep):
+            path = self.templates_dir / name
+            if path.exists():
+                path.unlink()
+                logger.info(f"删除旧文件: {path}")
+
+    def run(self, force=False):
+        """
+        运行模板生成
+
+        Args:
+            force: 忽略清单，全部重新生成
+        """
         logger.info("开始生成模板和缩略图")
         
         # 检查pics目录
@@ -143,34 +390,49 @@ class TemplateGenerator:
             return False
         
         logger.info(f"找到 {len(image_files)} 个图片文件")
-        
-        # 清理旧文件
-        if clean_first:
-            logger.info("清理模板目录中的旧文件...")
-            self.clean_templates_directory()
-        
-        # 处理每个图片
-        success_count = 0
-        for i, image_path in enumerate(image_files, 1):
-            logger.info(f"处理第 {i} 个图片: {image_path.name}")
-            
-            try:
-                # 拷贝并重命名图片
-                template_path = self.copy_and_rename_image(image_path, i)
-                if not template_path:
-                    continue
-                
-                # 生成缩略图
-                thumbnail_path = self.generate_thumbnail(template_path, i)
-                if not thumbnail_path:
-                    continue
-                
-                success_count += 1
-                logger.info(f"✓ 模板 {i} 处理完成")
-                
-            except Exception as e:
-                logger.error(f"处理图片 {image_path} 时发生错误: {e}")
-        
+
+        manifest = self.load_manifest()
+        old_templates = manifest.get('templates', {})
+        reusable = {}
+        if force:
+            logger.info("全部重新生成")
+        elif manifest and manifest.get('settings') != self.build_settings():
+            logger.info("缩略图设置已变化，全部重新生成")
+        else:
+            reusable = old_templates
+
+        # 对比清单，找出需要重新生成的模板（设置变化或 --force 时也保持原编号）
+        digests = [file_sha256(image_path) for image_path in image_files]
+        numbers = self.assign_numbers(image_files, digests, manifest)
+        templates = {}
+        tasks = []
+        for number, image_path, digest in zip(numbers, image_files, digests):
+            entry = reusable.get(str(number))
+            if self.is_up_to_date(entry, digest):
+                templates[str(number)] = dict(entry, source=image_path.name)
+            else:
+                tasks.append((number, image_path, digest))
+
+        logger.info(f"{len(templates)} 个模板未变化，{len(tasks)} 个需要生成（{self.workers} 个进程）")
+
+        # 处理需要更新的图片
+        for (number, image_path, digest), result in zip(tasks, self.build_all(tasks)):
+            if result['error']:
+                continue
+            templates[str(number)] = {'source': image_path.name, 'sha256': digest,
+                                      'outputs': result['outputs'], 'thumbnails': result['thumbnails']}
+            logger.info(f"✓ 模板 {number} 处理完成")
+
+        atomic_write_json(self.manifest_path, {
+            'settings': self.build_settings(),
+            'nextNumber': max([manifest.get('nextNumber', 1)] + [int(number) + 1 for number in old_templates]
+                              + [number + 1 for number in numbers]),
+            'templates': dict(sorted(templates.items(), key=lambda item: int(item[0])))
+        })
+        self.update_templates_config()
+        self.remove_stale_files(old_templates, {name for entry in templates.values() for name in entry['outputs']})
+
+        success_count = len(templates)
         logger.info(f"任务完成！成功处理 {success_count}/{len(image_files)} 个模板")
         
         # 显示结果
@@ -182,14 +444,26 @@ class TemplateGenerator:
         """显示生成结果"""
         logger.info("生成的文件列表:")
         
-        template_files = sorted(self.templates_dir.glob("template*.jpg"))
+        template_files = sorted(path for path in self.templates_dir.glob("template*")
+                                if TEMPLATE_FILE_PATTERN.match(path.name))
         for file_path in template_files:
             file_size = file_path.stat().st_size / 1024  # KB
             logger.info(f"  {file_path.name} ({file_size:.1f} KB)")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="模板和缩略图生成器")
+    parser.add_argument('--force', action='store_true', help="忽略清单，全部重新生成")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help=f"并行生成的进程数（默认本机CPU核数 {os.cpu_count()}）")
+    parser.add_argument('-y', '--yes', action='store_true', help="跳过确认直接开始")
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
+    args = parse_args()
+
     print("=" * 60)
     print("模板和缩略图生成器")
     print("=" * 60)
@@ -197,7 +471,7 @@ def main():
     print()
     
     try:
-        generator = TemplateGenerator()
+        generator = TemplateGenerator(workers=args.workers)
         
         # 显示当前状态
         image_files = generator.get_image_files()
@@ -209,14 +483,15 @@ def main():
             print("没有找到图片文件，请检查pics目录")
             return
         
-        print()
-        response = input("是否开始生成模板和缩略图？(y/n): ")
-        if response.lower() != 'y':
-            print("操作已取消")
-            return
+        if not args.yes:
+            print()
+            response = input("是否开始生成模板和缩略图？(y/n): ")
+            if response.lower() != 'y':
+                print("操作已取消")
+                return
         
         print()
-        success = generator.run()
+        success = generator.run(force=args.force)
         
         if success:
             print("=" * 60)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+共享HTTP会话
+所有模块通过同一个 requests.Session 发请求，复用keep-alive连接，避免每次调用都重新握手TCP+TLS
+
+功能特点:
+- 线程安全的全局会话，按需惰性创建
+- 可配置的连接池大小和每主机并发上限（流式响应在关闭之前一直占用名额）
+- 幂等请求（GET/HEAD等）失败时按指数退避自动重试
+- 统计连接复用率，便于在压测中确认握手开销
+"""
+
+import threading
+import weakref
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_lock = threading.Lock()
+
+
+def _create_session() -> requests.Session:
+    """创建带连接池和重试策略的会话"""
+    retry = Retry(
+        total=config.HTTP_MAX_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # 只重试幂等请求，避免重复提交付费任务
+        allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+        raise_on_status=False
+    )
+
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """获取全局共享会话"""
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+                logger.info("共享HTTP会话已创建")
+    return _session
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """获取目标主机的并发信号量"""
+    host = urlsplit(url).netloc
+    with _host_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(config.HTTP_PER_HOST_LIMIT)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+
+def _release_on_close(response: requests.Response, semaphore: threading.BoundedSemaphore):
+    """流式响应关闭时（或被回收时）才释放主机并发名额，只释放一次"""
+    release = weakref.finalize(response, semaphore.release)
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    response.close = close_and_release
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    通过共享会话发送请求，同一主机的并发请求数受 HTTP_PER_HOST_LIMIT 限制
+
+    stream=True 时响应体还在连接上，名额保持到响应关闭为止，调用方应使用 with 语句或显式 close()
+
+    参数与 requests.request 相同
+    """
+    kwargs.setdefault('timeout', config.HTTP_DEFAULT_TIMEOUT)
+    semaphore = _host_semaphore(url)
+    semaphore.acquire()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except BaseException:
+        semaphore.release()
+        raise
+
+    if kwargs.get('stream'):
+        _release_on_close(response, semaphore)
+    else:
+        semaphore.release()
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET请求"""
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST请求"""
+    return request('POST', url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    """HEAD请求"""
+    return request('HEAD', url, **kwargs)
+
+
+def get_connection_stats() -> Dict:
+    """
+    统计各主机连接池的连接复用情况
+
+    Returns:
+        {'hosts': {host: {...}}, 'requests': 总请求数, 'connections': 新建连接数, 'reuseRate': 复用率}
+    """
+    session = _session
+    hosts = {}
+    total_requests = 0
+    total_connections = 0
+
+    if session is not None:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+
+                num_requests = pool.num_requests
+                num_connections = pool.num_connections
+                total_requests += num_requests
+                total_connections += num_connections
+
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'requests': num_requests,
+                    'connections': num_connections,
+                    'reuseRate': _reuse_rate(num_requests, num_connections)
+                }
+
+    return {
+        'hosts': hosts,
+        'requests': total_requests,
+        'connections': total_connections,
+        'reuseRate': _reuse_rate(total_requests, total_connections)
+    }
+
+
+def _reuse_rate(num_requests: int, num_connections: int) -> float:
+    """连接复用率 = 1 - 新建连接数 / 请求数"""
+    if num_requests <= 0:
+        return 0.0
+    return round(max(0.0, 1 - num_connections / num_requests), 4)
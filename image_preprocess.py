@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+用户照片预处理
+在上传OSS之前对手机照片做归一化，减少上传和阿里云下载的数据量
+
+处理步骤:
+1. JPEG使用draft模式按目标尺寸解码（DCT域缩放，速度远快于全尺寸解码）
+2. 按EXIF方向旋转
+3. 缩放到融合接口实际使用的最大边长
+4. 去除EXIF等元数据，按配置质量重新编码为JPEG
+"""
+
+import io
+import math
+import mimetypes
+import threading
+import time
+import logging
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# 常见图片格式的文件头 -> MIME类型（HEIC/AVIF 为 ISO BMFF 容器，按 ftyp 品牌区分）
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+_FTYP_BRANDS = {
+    b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heif', b'msf1': 'image/heif',
+    b'avif': 'image/avif', b'avis': 'image/avif'
+}
+
+
+def image_content_type(data: bytes, filename: str = '') -> str:
+    """
+    按文件头判断图片的MIME类型（预处理失败原样上传时使用），无法识别时按扩展名猜测
+
+    Returns:
+        MIME类型，都无法判断时为 application/octet-stream
+    """
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp' and data[8:12] in _FTYP_BRANDS:
+        return _FTYP_BRANDS[data[8:12]]
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def normalize_image(data: bytes, max_side: int = None, quality: int = None) -> Tuple[bytes, Dict]:
+    """
+    归一化用户照片
+
+    Args:
+        data: 原始图片字节
+        max_side: 最大边长，默认使用 config.UPLOAD_IMAGE_MAX_SIDE
+        quality: JPEG质量，默认使用 config.UPLOAD_IMAGE_QUALITY
+
+    Returns:
+        (处理后的字节, 处理信息)；无法解码时原样返回原始字节
+    """
+    if max_side is None:
+        max_side = config.UPLOAD_IMAGE_MAX_SIDE
+    if quality is None:
+        quality = config.UPLOAD_IMAGE_QUALITY
+
+    start_time = time.perf_counter()
+    info = {
+        'normalized': False,
+        'originalBytes': len(data),
+        'bytes': len(data)
+    }
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            original_size = img.size
+
+            # draft只对JPEG有效，会选择解码后宽高都不小于目标尺寸的最大DCT缩放比例，
+            # 因此目标尺寸要按原图宽高比换算，不能直接传 (max_side, max_side)
+            if img.format == 'JPEG':
+                scale = max_side / max(original_size)
+                if scale < 1:
+                    img.draft('RGB', (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)))
+
+            img = ImageOps.exif_transpose(img)
+
+            # 转换为RGB模式（透明背景填充白色）
+            if img.mode in ('RGBA', 'LA', 'P'):
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+                rgb_img.paste(img, mask=img.split()[-1])
+                img = rgb_img
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+            # 不传exif参数即去除全部元数据
+            output = io.BytesIO()
+            img.save(output, 'JPEG', quality=quality, optimize=True)
+            normalized = output.getvalue()
+
+            info.update({
+                'normalized': True,
+                'bytes': len(normalized),
+                'originalSize': list(original_size),
+                'size': list(img.size)
+            })
+    except Exception as e:
+        logger.warning(f"图片预处理失败，使用原图上传: {e}")
+        normalized = data
+
+    info['savedBytes'] = info['originalBytes'] - info['bytes']
+    info['elapsedMs'] = round((time.perf_counter() - start_time) * 1000, 1)
+
+    if info['normalized']:
+        logger.info(
+            f"图片预处理完成: {info['originalSize']} -> {info['size']}, "
+            f"{info['originalBytes'] / 1024:.0f}KB -> {info['bytes'] / 1024:.0f}KB, "
+            f"耗时 {info['elapsedMs']}ms"
+        )
+
+    return normalized, info
+
+
+class PreprocessStats:
+    """累计预处理效果：节省的字节数、预处理耗时和上传耗时"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.original_bytes = 0
+        self.output_bytes = 0
+        self.preprocess_ms = 0.0
+        self.upload_ms = 0.0
+
+    def record(self, info: Dict, upload_ms: float):
+        with self.lock:
+            self.count += 1
+            self.original_bytes += info['originalBytes']
+            self.output_bytes += info['bytes']
+            self.preprocess_ms += info['elapsedMs']
+            self.upload_ms += upload_ms
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            count = self.count or 1
+            return {
+                'count': self.count,
+                'originalBytes': self.original_bytes,
+                'uploadedBytes': self.output_bytes,
+                'savedBytes': self.original_bytes - self.output_bytes,
+                'savedRatio': round(1 - self.output_bytes / self.original_bytes, 4) if self.original_bytes else 0.0,
+                'avgPreprocessMs': round(self.preprocess_ms / count, 1),
+                'avgUploadMs': round(self.upload_ms / count, 1)
+            }
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+视频生成任务日志（SQLite）
+按输出文件路径记录每个生成任务走到了哪一步，程序中断后重新运行时从断点继续，
+已上传、已检测、已提交、已完成的步骤都不会重复执行（避免重复付费渲染）
+
+记录的阶段:
+    uploaded   图片已上传，记录图片URL
+    detected   质量检测通过
+    rejected   质量检测未通过（不再重复检测）
+    submitted  任务已提交，记录task_id（重启后继续轮询，不重新提交）
+    succeeded  任务成功，记录视频URL（重启后直接下载）
+    downloaded 视频已下载到输出路径（重启后跳过）
+    failed     DashScope返回任务失败/取消（重启后从头重试）；本地等待超时不算失败，保持submitted继续轮询
+
+图片文件、音频文件或生成参数变化时（指纹不同）记录作废，从头执行
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+STAGE_UPLOADED = 'uploaded'
+STAGE_DETECTED = 'detected'
+STAGE_REJECTED = 'rejected'
+STAGE_SUBMITTED = 'submitted'
+STAGE_SUCCEEDED = 'succeeded'
+STAGE_DOWNLOADED = 'downloaded'
+STAGE_FAILED = 'failed'
+
+_COLUMNS = (
+    'output', 'name', 'image', 'fingerprint', 'stage',
+    'image_url', 'uploaded_at', 'detect_message',
+    'task_id', 'submitted_at', 'video_url', 'finished_at',
+    'error', 'updated_at'
+)
+
+
+def _file_identity(path) -> str:
+    """文件的路径+大小+修改时间"""
+    path = Path(path)
+    try:
+        stat = path.stat()
+        return f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return str(path)
+
+
+def job_fingerprint(job: Dict) -> str:
+    """图片内容、任务使用的音频与生成参数的指纹"""
+    parts = [_file_identity(job['image'])]
+    if job.get('audio'):
+        parts.append(_file_identity(job['audio']))
+    parts.append(json.dumps(job.get('params') or config.VIDEO_GENERATION_PARAMS, sort_keys=True))
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class JobJournal:
+    """基于SQLite的任务日志（线程安全）"""
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: 数据库文件，默认 config.VIDEO_JOB_JOURNAL
+        """
+        self.path = Path(path or config.VIDEO_JOB_JOURNAL)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                output TEXT PRIMARY KEY,
+                name TEXT,
+                image TEXT,
+                fingerprint TEXT,
+                stage TEXT,
+                image_url TEXT,
+                uploaded_at REAL,
+                detect_message TEXT,
+                task_id TEXT,
+                submitted_at REAL,
+                video_url TEXT,
+                finished_at REAL,
+                error TEXT,
+                updated_at REAL
+            )
+        ''')
+
+    def load(self, job: Dict) -> Optional[Dict]:
+        """
+        读取任务的有效记录
+
+        Returns:
+            记录字典；没有记录、指纹不一致或已失败时返回None（需要从头执行）
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE output = ?', (str(job['output']),)).fetchone()
+
+        if row is None:
+            return None
+
+        entry = dict(row)
+        if entry['fingerprint'] != job_fingerprint(job):
+            logger.info(f"{job['name']} 的图片或参数已变化，忽略之前的记录")
+            return None
+        if entry['stage'] == STAGE_FAILED:
+            return None
+        return entry
+
+    def resume(self, job: Dict) -> Optional[str]:
+        """
+        根据记录恢复任务状态，把可复用的字段（image_url、task_id、submitted_at、video_url）写入job
+
+        过期的记录会降级：图片签名URL超过 VIDEO_JOURNAL_URL_MAX_AGE 需重新上传，
+        任务和视频URL超过 VIDEO_JOURNAL_TASK_MAX_AGE 后DashScope已不再保留，需重新提交
+
+        Returns:
+            可以继续的阶段（STAGE_*），None 表示从头执行
+        """
+        entry = self.load(job)
+        if entry is None:
+            return None
+
+        now = time.time()
+        stage = entry['stage']
+        url_fresh = bool(entry['image_url']) and now - (entry['uploaded_at'] or 0) < config.VIDEO_JOURNAL_URL_MAX_AGE
+        task_fresh = bool(entry['task_id']) and now - (entry['submitted_at'] or 0) < config.VIDEO_JOURNAL_TASK_MAX_AGE
+        video_fresh = bool(entry['video_url']) and now - (entry['finished_at'] or 0) < config.VIDEO_JOURNAL_TASK_MAX_AGE
+
+        if stage == STAGE_REJECTED:
+            job['detect_message'] = entry['detect_message']
+            return STAGE_REJECTED
+
+        if stage == STAGE_DOWNLOADED and Path(job['output']).exists():
+            return STAGE_DOWNLOADED
+
+        if stage in (STAGE_DOWNLOADED, STAGE_SUCCEEDED) and video_fresh:
+            job['task_id'] = entry['task_id']
+            job['video_url'] = entry['video_url']
+            return STAGE_SUCCEEDED
+
+        if stage == STAGE_SUBMITTED and task_fresh:
+            job['task_id'] = entry['task_id']
+            job['submitted_at'] = entry['submitted_at']
+            return STAGE_SUBMITTED
+
+        if url_fresh and stage in (STAGE_UPLOADED, STAGE_DETECTED, STAGE_SUBMITTED):
+            job['image_url'] = entry['image_url']
+            # 提交过但任务已过期：图片检测过，只需重新提交
+            return STAGE_DETECTED if stage == STAGE_SUBMITTED else stage
+
+        return None
+
+    def update(self, job: Dict, stage: str, **fields):
+        """写入任务的新阶段（未给出的字段保留原值）"""
+        fields = {key: value for key, value in fields.items() if key in _COLUMNS}
+        fields.update({
+            'output': str(job['output']),
+            'name': job['name'],
+            'image': str(job['image']),
+            'fingerprint': job_fingerprint(job),
+            'stage': stage,
+            'updated_at': time.time()
+        })
+        if stage != STAGE_FAILED:
+            fields.setdefault('error', None)
+
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f'{key} = excluded.{key}' for key in fields if key != 'output')
+
+        with self.lock:
+            self.conn.execute(
+                f'INSERT INTO jobs ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT(output) DO UPDATE SET {updates}',
+                tuple(fields.values())
+            )
+
+    def reset(self, job: Dict):
+        """删除任务记录"""
+        with self.lock:
+            self.conn.execute('DELETE FROM jobs WHERE output = ?', (str(job['output']),))
+
+    def stats(self) -> Dict[str, int]:
+        """各阶段的任务数"""
+        with self.lock:
+            rows = self.conn.execute('SELECT stage, COUNT(*) FROM jobs GROUP BY stage').fetchall()
+        return {stage: count for stage, count in rows}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
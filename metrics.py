@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+轻量级指标采集
+提供Prometheus风格的计数器、仪表盘和直方图，由 /metrics 接口以文本格式导出
+
+设计要点:
+- 不依赖 prometheus_client，每个带标签的子指标只有一把锁和几个数字，热路径开销很小
+- 各模块通过 track_stage() 记录每个处理阶段的耗时、并发数和错误原因
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶（秒），覆盖从毫秒级的签名URL到十几秒的人脸融合
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """获取指定标签值的子指标"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self.children[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._collect_child(values, child))
+        return lines
+
+    def _collect_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _ValueChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self.lock:
+            self.value = value
+
+    def get(self) -> float:
+        return self.value
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _ValueChild()
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘"""
+
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _ValueChild()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _collect_child(self, values, child) -> List[str]:
+        with child.lock:
+            counts = list(child.counts)
+            total_sum = child.sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def exposition(self) -> str:
+        """导出Prometheus文本格式"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_LATENCY = REGISTRY.histogram(
+    'fanyi_stage_latency_seconds', '各处理阶段耗时（秒）', ['stage']
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    'fanyi_stage_in_flight', '各处理阶段正在进行的请求数', ['stage']
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'fanyi_stage_errors_total', '各处理阶段的错误数（按原因）', ['stage', 'cause']
+)
+BYTES_TRANSFERRED = REGISTRY.counter(
+    'fanyi_bytes_transferred_total', '各处理阶段传输的字节数', ['stage', 'direction']
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    'fanyi_cache_lookups_total', '缓存/去重检查次数（按结果）', ['cache', 'result']
+)
+
+
+class track_stage:
+    """
+    记录一个处理阶段的耗时、并发数和错误
+
+    用法:
+        with track_stage('oss_put') as stage:
+            ...
+            if 失败:
+                stage.fail('status_500')
+
+    代码块抛出异常且未调用 fail() 时，自动以异常类型作为错误原因
+    """
+
+    __slots__ = ('stage', 'start_time', 'cause')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start_time = 0.0
+        self.cause: Optional[str] = None
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.labels(self.stage).inc()
+        self.start_time = time.perf_counter()
+        return self
+
+    def fail(self, cause: str):
+        """标记本阶段失败"""
+        self.cause = cause
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        STAGE_LATENCY.labels(self.stage).observe(time.perf_counter() - self.start_time)
+        STAGE_IN_FLIGHT.labels(self.stage).dec()
+
+        cause = self.cause or (exc_type.__name__ if exc_type else None)
+        if cause:
+            STAGE_ERRORS.labels(self.stage, cause).inc()
+        return False
+
+
+def record_bytes(stage: str, direction: str, amount: int):
+    """记录传输字节数，direction 为 'in' 或 'out'"""
+    if amount:
+        BYTES_TRANSFERRED.labels(stage, direction).inc(amount)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """记录一次缓存/去重检查是否命中"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
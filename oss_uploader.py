@@ -8,21 +8,42 @@
 - 生成带签名的URL（支持私有Bucket）
 - 自动文件分类（图片/音频）
 - 支持自定义有效期
+- 按内容哈希去重：OSS上已有相同内容的对象时跳过上传，只重新签名URL
+- 大文件（视频、音频）分片并行上传，断点记录在本地，中断后重新上传只传剩余分片
 """
 
 import oss2
 import os
 import time
+import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 import logging
 from dotenv import load_dotenv
 
+import config
+from metrics import record_bytes, record_cache_lookup, track_stage
+
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# 保存内容哈希的自定义元数据
+SHA256_META_HEADER = 'x-oss-meta-sha256'
+
+
+def file_digests(file_path: Path, chunk_size: int = 1024 * 1024):
+    """一次读取同时计算文件的 sha256 和 md5（十六进制）"""
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
 class OSSUploader:
     def __init__(self):
         # OSS认证信息 - 从环境变量或直接配置
@@ -69,7 +90,8 @@ class OSSUploader:
         try:
             # 生成签名URL
             expire_seconds = expire_hours * 3600
-            signed_url = self.bucket.sign_url('GET', oss_object_key, expire_seconds)
+            with track_stage('oss_sign_url'):
+                signed_url = self.bucket.sign_url('GET', oss_object_key, expire_seconds)
 
             logger.info(f"生成签名URL成功: {oss_object_key}, 有效期: {expire_hours}小时")
             return signed_url
@@ -105,13 +127,72 @@ class OSSUploader:
             True如果可以访问，False如果不能访问
         """
         try:
-            import requests
-            response = requests.head(url, timeout=5)
+            import http_client
+            response = http_client.head(url, timeout=5)
             return response.status_code == 200
         except Exception:
             return False
     
-    def upload_file(self, local_file_path: Path, custom_path: Optional[str] = None, use_public_url: bool = False) -> Optional[str]:
+    def _build_object_key(self, custom_path: Optional[str], file_name: str) -> str:
+        """构建OSS对象键"""
+        if custom_path:
+            oss_object_key = f"{self.base_oss_path}/{custom_path}"
+        else:
+            # 使用时间戳避免文件名冲突
+            timestamp = int(time.time())
+            oss_object_key = f"{self.base_oss_path}/{timestamp}_{file_name}"
+
+        # 确保路径使用正斜杠
+        return oss_object_key.replace('\\', '/')
+
+    def _build_result_url(self, result, oss_object_key: str, use_public_url: bool) -> Optional[str]:
+        """根据上传结果生成访问URL"""
+        if result.status != 200:
+            logger.error(f"文件上传失败，状态码: {result.status}")
+            return None
+
+        url = self._build_url(oss_object_key, use_public_url)
+        if url:
+            logger.info(f"文件上传成功: {oss_object_key}")
+        else:
+            logger.error(f"文件上传成功但生成签名URL失败: {oss_object_key}")
+        return url
+
+    def _build_url(self, oss_object_key: str, use_public_url: bool) -> Optional[str]:
+        """生成对象的访问URL"""
+        if use_public_url:
+            # 生成公开URL（用于模板等需要API访问的文件）
+            return self.generate_public_url(oss_object_key)
+
+        # 生成签名URL（用于用户上传的文件）
+        return self.generate_signed_url(oss_object_key, expire_hours=24)
+
+    def _object_matches(self, oss_object_key: str, sha256: str, md5: str) -> bool:
+        """
+        判断OSS上的对象内容是否与本地一致
+
+        优先比较上传时写入的 sha256 元数据；旧对象没有元数据时，
+        普通上传（非分片）的ETag就是内容MD5，可以直接比较
+        """
+        try:
+            with track_stage('oss_head'):
+                try:
+                    result = self.bucket.head_object(oss_object_key)
+                except oss2.exceptions.NotFound:
+                    # 对象不存在不算错误
+                    return False
+        except Exception as e:
+            logger.warning(f"检查OSS对象失败，按未上传处理: {oss_object_key}, {e}")
+            return False
+
+        stored_sha256 = result.headers.get(SHA256_META_HEADER)
+        if stored_sha256:
+            return stored_sha256.lower() == sha256
+
+        return result.object_type == 'Normal' and (result.etag or '').lower() == md5
+
+    def upload_file(self, local_file_path: Path, custom_path: Optional[str] = None, use_public_url: bool = False,
+                    dedupe: bool = False) -> Optional[str]:
         """
         上传文件到OSS并返回公网URL
 
@@ -119,6 +200,8 @@ class OSSUploader:
             local_file_path: 本地文件路径
             custom_path: 自定义OSS路径，如果不提供则使用文件名
             use_public_url: 是否使用公开URL（不带签名），默认False使用签名URL
+            dedupe: 是否按内容去重。OSS上同一路径已有相同内容时跳过上传，只返回新的URL；
+                    需要配合固定的 custom_path 使用（不提供时路径带时间戳，永远不会命中）
 
         Returns:
             文件的公网URL，失败返回None
@@ -128,42 +211,33 @@ class OSSUploader:
                 logger.error(f"本地文件不存在: {local_file_path}")
                 return None
 
-            # 构建OSS对象键
-            if custom_path:
-                oss_object_key = f"{self.base_oss_path}/{custom_path}"
-            else:
-                # 使用时间戳避免文件名冲突
-                timestamp = int(time.time())
-                file_extension = local_file_path.suffix
-                oss_object_key = f"{self.base_oss_path}/{timestamp}_{local_file_path.name}"
+            oss_object_key = self._build_object_key(custom_path, local_file_path.name)
 
-            # 确保路径使用正斜杠
-            oss_object_key = oss_object_key.replace('\\', '/')
+            headers = None
+            if dedupe:
+                sha256, md5 = file_digests(local_file_path)
+                matched = self._object_matches(oss_object_key, sha256, md5)
+                record_cache_lookup('oss_dedupe', matched)
+                if matched:
+                    logger.info(f"OSS上已有相同内容，跳过上传: {oss_object_key}")
+                    return self._build_url(oss_object_key, use_public_url)
+                headers = {SHA256_META_HEADER: sha256}
 
+            file_size = local_file_path.stat().st_size
             logger.info(f"开始上传文件: {local_file_path} -> {oss_object_key}")
 
-            # 执行上传
-            result = self.bucket.put_object_from_file(oss_object_key, str(local_file_path))
-
-            if result.status == 200:
-                if use_public_url:
-                    # 生成公开URL（用于模板等需要API访问的文件）
-                    public_url = self.generate_public_url(oss_object_key)
-                    logger.info(f"文件上传成功，生成公开URL: {oss_object_key}")
-                    return public_url
-                else:
-                    # 生成签名URL（用于用户上传的文件）
-                    signed_url = self.generate_signed_url(oss_object_key, expire_hours=24)
-                    if signed_url:
-                        logger.info(f"文件上传成功，生成签名URL: {oss_object_key}")
-                        return signed_url
-                    else:
-                        logger.error(f"文件上传成功但生成签名URL失败: {oss_object_key}")
-                        return None
+            # 执行上传：大文件分片并行上传，其余一次PUT
+            if file_size >= config.OSS_MULTIPART_THRESHOLD:
+                result = self._upload_multipart(oss_object_key, local_file_path, file_size, headers)
             else:
-                logger.error(f"文件上传失败，状态码: {result.status}")
-                return None
-                
+                with track_stage('oss_put') as stage:
+                    result = self.bucket.put_object_from_file(oss_object_key, str(local_file_path), headers=headers)
+                    if result.status != 200:
+                        stage.fail(f"status_{result.status}")
+                record_bytes('oss_put', 'out', file_size)
+
+            return self._build_result_url(result, oss_object_key, use_public_url)
+
         except oss2.exceptions.NoSuchBucket:
             logger.error(f"Bucket不存在: {self.bucket_name}")
             return None
@@ -176,16 +250,119 @@ class OSSUploader:
         except Exception as e:
             logger.error(f"上传文件时发生错误: {e}")
             return None
-    
-    def upload_image(self, image_path: Path) -> Optional[str]:
-        """上传图片文件"""
+
+    def _upload_multipart(self, oss_object_key: str, local_file_path: Path, file_size: int, headers=None):
+        """
+        分片上传大文件
+
+        分片由 OSS_MULTIPART_THREADS 个线程并行上传；已完成的分片记录在 OSS_MULTIPART_CHECKPOINT_DIR，
+        上传中断后对同一文件、同一路径再次上传时只传剩余分片（本地文件变化时自动从头上传）
+        """
+        checkpoint_dir = Path(config.OSS_MULTIPART_CHECKPOINT_DIR).resolve()
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        store = oss2.ResumableStore(root=str(checkpoint_dir.parent), dir=checkpoint_dir.name)
+
+        # 每完成约1/4输出一次进度
+        next_report = [0.25]
+
+        def progress(consumed_bytes, total_bytes):
+            ratio = consumed_bytes / total_bytes if total_bytes else 0
+            if ratio >= next_report[0] and ratio < 1:
+                logger.info(f"分片上传进度 {oss_object_key}: {ratio:.0%}")
+                next_report[0] = (int(ratio * 4) + 1) / 4
+
+        start_time = time.perf_counter()
+        with track_stage('oss_multipart_put') as stage:
+            result = oss2.resumable_upload(
+                self.bucket, oss_object_key, str(local_file_path),
+                store=store,
+                headers=headers,
+                multipart_threshold=config.OSS_MULTIPART_THRESHOLD,
+                part_size=config.OSS_MULTIPART_PART_SIZE,
+                num_threads=config.OSS_MULTIPART_THREADS,
+                progress_callback=progress
+            )
+            if result.status != 200:
+                stage.fail(f"status_{result.status}")
+        record_bytes('oss_multipart_put', 'out', file_size)
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"分片上传完成 {oss_object_key}: {file_size / 1024 / 1024:.1f}MB, {elapsed:.1f}s, "
+                    f"{file_size / 1024 / 1024 / max(elapsed, 1e-6):.2f}MB/s")
+        return result
+
+    def upload_stream(self, stream: Union[bytes, BinaryIO], custom_path: str, use_public_url: bool = False,
+                      content_type: Optional[str] = None) -> Optional[str]:
+        """
+        将可读流直接上传到OSS，不落本地磁盘
+
+        Args:
+            stream: 可读的二进制流（如 Flask request.files 的 stream）或字节串
+            custom_path: OSS路径（相对于base_oss_path）
+            use_public_url: 是否使用公开URL（不带签名），默认False使用签名URL
+            content_type: 对象的Content-Type
+
+        Returns:
+            文件的公网URL，失败返回None
+        """
+        try:
+            oss_object_key = self._build_object_key(custom_path, '')
+            headers = {'Content-Type': content_type} if content_type else None
+
+            logger.info(f"开始流式上传: {oss_object_key}")
+
+            with track_stage('oss_put') as stage:
+                result = self.bucket.put_object(oss_object_key, stream, headers=headers)
+                if result.status != 200:
+                    stage.fail(f"status_{result.status}")
+
+            if isinstance(stream, (bytes, bytearray)):
+                record_bytes('oss_put', 'out', len(stream))
+            else:
+                record_bytes('oss_put', 'out', getattr(stream, 'bytes_read', 0))
+
+            return self._build_result_url(result, oss_object_key, use_public_url)
+
+        except oss2.exceptions.NoSuchBucket:
+            logger.error(f"Bucket不存在: {self.bucket_name}")
+            return None
+        except oss2.exceptions.AccessDenied:
+            logger.error("OSS访问权限不足，请检查AccessKey权限")
+            return None
+        except Exception as e:
+            logger.error(f"流式上传时发生错误: {e}")
+            return None
+
+    def upload_bytes(self, data: bytes, custom_path: str, use_public_url: bool = False,
+                     content_type: Optional[str] = None) -> Optional[str]:
+        """
+        将内存中的字节直接上传到OSS，不落本地磁盘
+
+        Args:
+            data: 文件内容
+            custom_path: OSS路径（相对于base_oss_path）
+            use_public_url: 是否使用公开URL（不带签名），默认False使用签名URL
+            content_type: 对象的Content-Type
+
+        Returns:
+            文件的公网URL，失败返回None
+        """
+        return self.upload_stream(data, custom_path, use_public_url=use_public_url,
+                                  content_type=content_type)
+
+    def upload_image(self, image_path: Path, dedupe: bool = None) -> Optional[str]:
+        """上传图片文件（dedupe 默认使用 config.OSS_UPLOAD_DEDUPE）"""
         custom_path = f"images/{image_path.name}"
-        return self.upload_file(image_path, custom_path)
+        if dedupe is None:
+            dedupe = config.OSS_UPLOAD_DEDUPE
+        return self.upload_file(image_path, custom_path, dedupe=dedupe)
     
-    def upload_audio(self, audio_path: Path) -> Optional[str]:
-        """上传音频文件"""
+    def upload_audio(self, audio_path: Path, dedupe: bool = None) -> Optional[str]:
+        """上传音频文件（dedupe 默认使用 config.OSS_UPLOAD_DEDUPE）"""
         custom_path = f"audio/{audio_path.name}"
-        return self.upload_file(audio_path, custom_path)
+        if dedupe is None:
+            dedupe = config.OSS_UPLOAD_DEDUPE
+        return self.upload_file(audio_path, custom_path, dedupe=dedupe)
     
     def delete_file(self, oss_object_key: str) -> bool:
         """删除OSS上的文件"""
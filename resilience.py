@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+上游调用保护：熔断器 + 自适应并发限制
+上游（阿里云facebody）变慢或故障时快速失败，避免请求线程全部堵在超时上
+
+功能特点:
+- 熔断器：连续失败达到阈值后打开，冷却后放行少量探测请求（半开），成功则恢复
+- AIMD并发限制：延迟正常时缓慢加大并发上限，超过延迟阈值或失败时按比例收缩
+- 两者都提供状态快照，便于监控
+"""
+
+import math
+import threading
+import time
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class UpstreamUnavailable(Exception):
+    """上游被熔断或并发已满，调用方应返回503并带上Retry-After"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """熔断器"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30,
+                 half_open_max_calls: int = 1):
+        """
+        Args:
+            name: 名称（用于日志和监控）
+            failure_threshold: 连续失败多少次后打开
+            recovery_timeout: 打开后多久进入半开状态（秒）
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+        self.total_successes = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow(self) -> bool:
+        """判断是否放行本次调用"""
+        with self.lock:
+            if self.state == STATE_OPEN:
+                if time.time() - self.opened_at < self.recovery_timeout:
+                    self.total_rejected += 1
+                    return False
+                self.state = STATE_HALF_OPEN
+                self.half_open_calls = 0
+                logger.info(f"熔断器 {self.name} 进入半开状态")
+
+            if self.state == STATE_HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    self.total_rejected += 1
+                    return False
+                self.half_open_calls += 1
+
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            if self.state != STATE_CLOSED:
+                logger.info(f"熔断器 {self.name} 恢复关闭状态")
+            self.state = STATE_CLOSED
+
+    def record_failure(self):
+        with self.lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    logger.warning(f"熔断器 {self.name} 打开，连续失败 {self.consecutive_failures} 次")
+                self.state = STATE_OPEN
+                self.opened_at = time.time()
+
+    def retry_after(self) -> int:
+        """建议客户端多少秒后重试"""
+        with self.lock:
+            if self.state == STATE_OPEN:
+                remaining = self.recovery_timeout - (time.time() - self.opened_at)
+                return max(1, math.ceil(remaining))
+            return 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutiveFailures': self.consecutive_failures,
+                'failureThreshold': self.failure_threshold,
+                'openedAt': self.opened_at if self.state != STATE_CLOSED else None,
+                'totalSuccesses': self.total_successes,
+                'totalFailures': self.total_failures,
+                'totalRejected': self.total_rejected
+            }
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD自适应并发限制"""
+
+    def __init__(self, name: str, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 32,
+                 latency_threshold: float = 6.0, backoff_ratio: float = 0.7):
+        """
+        Args:
+            name: 名称（用于日志和监控）
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下界
+            max_limit: 并发上限的上界
+            latency_threshold: 延迟阈值（秒），超过即视为上游变慢
+            backoff_ratio: 变慢或失败时并发上限的收缩比例
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+
+        self.lock = threading.Lock()
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.total_rejected = 0
+        self.last_latency = 0.0
+
+    def try_acquire(self) -> bool:
+        """尝试占用一个并发名额，已满时立即返回False（不排队）"""
+        with self.lock:
+            if self.in_flight >= int(self.limit):
+                self.total_rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """归还名额但不调整上限（占用后未实际调用上游时使用）"""
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def release(self, latency: float, success: bool):
+        """
+        归还名额并根据本次结果调整上限
+
+        Args:
+            latency: 本次调用耗时（秒）
+            success: 上游是否正常响应
+        """
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.last_latency = latency
+
+            if success and latency <= self.latency_threshold:
+                # 加性增：大约每一"轮"并发成功后上限+1
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                # 乘性减
+                new_limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                if int(new_limit) < int(self.limit):
+                    logger.warning(f"并发限制 {self.name} 收缩: {int(self.limit)} -> {int(new_limit)}, "
+                                   f"耗时 {latency:.2f}s")
+                self.limit = new_limit
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'limit': int(self.limit),
+                'inFlight': self.in_flight,
+                'minLimit': self.min_limit,
+                'maxLimit': self.max_limit,
+                'latencyThreshold': self.latency_threshold,
+                'lastLatency': round(self.last_latency, 3),
+                'totalRejected': self.total_rejected
+            }
@@ -5,7 +5,8 @@
 
 from pathlib import Path
 from oss_uploader import OSSUploader
-import json
+from generate_templates import apply_thumbnails, load_thumbnail_sets
+from atomic_io import atomic_write_json, file_lock
 
 def simple_upload():
     """简单上传模板"""
@@ -23,11 +24,12 @@ def simple_upload():
             if file_path.exists():
                 print(f"上传 fanyi-{i}.jpg...")
                 
-                # 上传原图 - 使用公开URL用于API调用
+                # 上传原图 - 使用公开URL用于API调用；内容未变化时跳过上传
                 url = uploader.upload_file(
                     file_path,
                     f"face_fusion/templates/fanyi_{i}.jpg",
-                    use_public_url=True  # 模板使用公开URL
+                    use_public_url=True,  # 模板使用公开URL
+                    dedupe=True
                 )
                 
                 if url:
@@ -36,7 +38,7 @@ def simple_upload():
                         'name': f'周繁漪定妆照{i}',
                         'description': f'造型{i}',
                         'templateUrl': url,
-                        'thumbnailUrl': url,  # 暂时使用原图作为缩略图
+                        'thumbnailUrl': url,  # 下面 apply_thumbnails 会换成1x缩略图，没有缩略图时才使用原图
                         'originalFile': f'fanyi-{i}.jpg'
                     }
                     templates.append(template)
@@ -46,15 +48,19 @@ def simple_upload():
             else:
                 print(f"✗ 文件不存在: {file_path}")
         
+        # 附上 generate_templates.py 生成的多尺寸缩略图
+        apply_thumbnails(templates, load_thumbnail_sets())
+
         # 保存配置
         config = {
             'templates': templates,
             'total': len(templates)
         }
         
+        # 与 web_server 的模板注册、generate_templates.py 共用同一把锁，原子替换，服务器不会读到半个文件
         config_file = Path('web/templates_config.json')
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        with file_lock(config_file.with_name(config_file.name + '.lock')):
+            atomic_write_json(config_file, config)
         
         print(f"✓ 配置已保存: {config_file}")
         print(f"✓ 成功上传 {len(templates)} 个模板")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+DashScope异步任务自适应轮询
+取代固定 QUERY_INTERVAL 的轮询：根据历史渲染耗时估计完成时间，临近完成时密集查询，
+超出预期后指数退避（带随机抖动），减少无效查询的同时缩短完成到下载的延迟
+
+功能特点:
+- DurationEstimator：按任务类型记录最近的渲染耗时（优先使用接口返回的 submit_time/end_time），持久化到JSON
+- PollSchedule：单个任务的查询时间表（在历史耗时的10~90分位之间按耗时离散程度均匀查询，之后指数退避+抖动）
+- TaskPoller：一个轮询器管理所有在途任务，每轮只查询已到期的任务
+  （DashScope没有按ID批量查询的接口，因此"批量"是指统一调度，而不是一次请求查多个ID）
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from atomic_io import atomic_write_json, file_lock
+
+logger = logging.getLogger(__name__)
+
+# UNKNOWN 可能是刚提交还查不到，继续查询直到超时
+FINISHED_STATUSES = {'SUCCEEDED', 'FAILED', 'CANCELED'}
+
+DASHSCOPE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def upstream_duration(result: Dict) -> Optional[float]:
+    """从任务查询结果中取出服务端记录的耗时（end_time - submit_time），没有时返回None"""
+    output = result.get('output', {})
+    try:
+        submit_time = datetime.strptime(output['submit_time'], DASHSCOPE_TIME_FORMAT)
+        end_time = datetime.strptime(output['end_time'], DASHSCOPE_TIME_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    duration = (end_time - submit_time).total_seconds()
+    return duration if duration > 0 else None
+
+
+class DurationEstimator:
+    """历史任务耗时估计"""
+
+    def __init__(self, path: str = None, window: int = None):
+        """
+        Args:
+            path: 持久化文件，默认 config.TASK_DURATION_FILE；None或空字符串表示只保存在内存
+            window: 每种任务保留的最近样本数，默认 config.TASK_DURATION_WINDOW
+        """
+        path = config.TASK_DURATION_FILE if path is None else path
+        self.path = Path(path) if path else None
+        self.window = window or config.TASK_DURATION_WINDOW
+
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = self._load()
+
+    def _load(self) -> Dict[str, List[float]]:
+        if not self.path or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {key: [float(v) for v in values][-self.window:] for key, values in data.items()}
+        except Exception as e:
+            logger.warning(f"读取任务耗时记录失败 {self.path}: {e}")
+            return {}
+
+    def estimate(self, key: str) -> Tuple[float, float]:
+        """
+        Returns:
+            (10分位耗时, 90分位耗时)，没有样本时返回 (0, 0)，即从最小间隔开始指数退避
+        """
+        with self.lock:
+            samples = sorted(self.samples.get(key, []))
+
+        if not samples:
+            return 0.0, 0.0
+
+        p10 = samples[int(len(samples) * 0.1)]
+        p90 = samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+        return p10, p90
+
+    def record(self, key: str, duration: float):
+        """记录一个已完成任务的耗时并持久化"""
+        if duration <= 0:
+            return
+
+        with self.lock:
+            samples = self.samples.setdefault(key, [])
+            samples.append(round(duration, 2))
+            del samples[:-self.window]
+            snapshot = {k: list(v) for k, v in self.samples.items()}
+
+        if not self.path:
+            return
+
+        try:
+            with file_lock(self.path.with_name(self.path.name + '.lock')):
+                atomic_write_json(self.path, snapshot)
+        except Exception as e:
+            logger.warning(f"保存任务耗时记录失败 {self.path}: {e}")
+
+
+class PollSchedule:
+    """单个任务的查询时间表"""
+
+    def __init__(self, p10: float, p90: float, submitted_at: float = None):
+        """
+        查询窗口为历史耗时的 [p10, p90]：窗口内等间隔查询，间隔为窗口宽度的 1/POLL_WINDOW_CHECKS
+        （限制在 POLL_MIN_INTERVAL ~ POLL_WINDOW_MAX_INTERVAL 之间），最后一次查询对齐 p90；
+        耗时集中时只查询一两次，耗时分散时查询次数也有上限，不会在长任务上密集查询
+
+        Args:
+            p10: 10分位耗时（秒）
+            p90: 90分位耗时（秒），超过后查询间隔指数放宽
+            submitted_at: 提交时间（time.time()），默认当前时间
+        """
+        self.submitted_at = submitted_at or time.time()
+        self.p90 = max(p90, p10)
+        self.interval = min(config.POLL_WINDOW_MAX_INTERVAL,
+                            max(config.POLL_MIN_INTERVAL, (self.p90 - p10) / config.POLL_WINDOW_CHECKS))
+        self.first_check = self.p90 - math.floor((self.p90 - p10) / self.interval) * self.interval
+        self.polls = 0
+        self.overdue_polls = 0
+
+    def next_delay(self) -> float:
+        """距离下一次查询的秒数（每次调用视为安排了一次查询）"""
+        elapsed = time.time() - self.submitted_at
+
+        if self.polls == 0:
+            # 窗口开始之前不查询；从任务日志恢复的任务已过窗口开始时间，立即查询
+            delay = max(0.0, self.first_check - elapsed)
+        elif elapsed < self.p90:
+            # 查询窗口内：等间隔查询
+            delay = self.interval
+        else:
+            # 超出预期：指数退避
+            delay = min(config.POLL_MAX_INTERVAL,
+                        self.interval * config.POLL_BACKOFF_FACTOR ** self.overdue_polls)
+            self.overdue_polls += 1
+
+        self.polls += 1
+        # 抖动按查询间隔计算：长任务的首次等待很长，按比例抖动会把首次查询推迟几十秒
+        jitter = config.POLL_JITTER
+        return max(0.2, delay + self.interval * random.uniform(-jitter, jitter))
+
+
+class TaskPoller:
+    """统一调度所有在途任务的状态查询"""
+
+    def __init__(self, query_fn: Callable[[str], Dict], estimator: DurationEstimator = None,
+                 task_type: str = 'liveportrait'):
+        """
+        Args:
+            query_fn: 查询函数，签名为 query_fn(task_id) -> 接口返回的dict（失败时含"error"）
+            estimator: 耗时估计器，默认新建一个
+            task_type: 任务类型（耗时按类型分别统计）
+        """
+        self.query_fn = query_fn
+        self.estimator = estimator or DurationEstimator()
+        self.task_type = task_type
+
+        # task_id -> {'schedule', 'next_poll_at', 'deadline', 'context'}
+        self.tasks: Dict[str, Dict] = {}
+        self.query_count = 0
+        self.completed_count = 0
+        self.detect_delay_total = 0.0
+
+    def add(self, task_id: str, context=None, max_wait_time: float = None, submitted_at: float = None):
+        """登记一个已提交的任务，context 会在任务结束时原样返回"""
+        p10, p90 = self.estimator.estimate(self.task_type)
+        schedule = PollSchedule(p10, p90, submitted_at)
+        now = time.time()
+        self.tasks[task_id] = {
+            'schedule': schedule,
+            'next_poll_at': now + schedule.next_delay(),
+            # 从本地开始（或恢复）轮询时计时：从任务日志恢复的旧任务也有完整的等待时间
+            'deadline': now + (max_wait_time or config.MAX_WAIT_TIME),
+            'context': context
+        }
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def seconds_until_due(self) -> float:
+        """距离最早一个任务需要查询的秒数"""
+        if not self.tasks:
+            return 0.0
+        return max(0.0, min(task['next_poll_at'] for task in self.tasks.values()) - time.time())
+
+    def poll_due(self) -> List[Tuple[str, Dict, object]]:
+        """
+        查询所有已到期的任务
+
+        Returns:
+            本轮结束的任务列表 [(task_id, 最终结果, context)]；超时的任务结果为 {"error": "任务超时"}
+        """
+        finished = []
+        now = time.time()
+
+        for task_id, task in list(self.tasks.items()):
+            if task['next_poll_at'] > now:
+                continue
+
+            result = self.query_fn(task_id)
+            self.query_count += 1
+            task_status = result.get('output', {}).get('task_status')
+
+            if task_status in FINISHED_STATUSES:
+                del self.tasks[task_id]
+                self._record_finish(task, result, task_status)
+                finished.append((task_id, result, task['context']))
+            elif time.time() >= task['deadline']:
+                del self.tasks[task_id]
+                finished.append((task_id, {"error": "任务超时"}, task['context']))
+            else:
+                # 查询失败（含"error"）也按时间表稍后重试
+                task['next_poll_at'] = time.time() + task['schedule'].next_delay()
+
+        return finished
+
+    def _record_finish(self, task: Dict, result: Dict, task_status: str):
+        observed = time.time() - task['schedule'].submitted_at
+        duration = upstream_duration(result)
+
+        if task_status == 'SUCCEEDED':
+            self.estimator.record(self.task_type, duration or observed)
+
+        if duration:
+            # 服务端完成到本地发现之间的延迟
+            self.detect_delay_total += max(0.0, observed - duration)
+        self.completed_count += 1
+
+    def wait(self, task_id: str, max_wait_time: float = None) -> Dict:
+        """阻塞等待单个任务结束（逐张处理模式使用；此时轮询器中不应有其他任务，否则其结果会被丢弃）"""
+        if task_id not in self.tasks:
+            self.add(task_id, max_wait_time=max_wait_time)
+
+        while True:
+            time.sleep(self.seconds_until_due())
+            for finished_id, result, _ in self.poll_due():
+                if finished_id == task_id:
+                    return result
+
+    def stats(self) -> Dict:
+        completed = self.completed_count or 1
+        return {
+            'queries': self.query_count,
+            'completed': self.completed_count,
+            'queriesPerTask': round(self.query_count / completed, 2),
+            'avgDetectDelay': round(self.detect_delay_total / completed, 2)
+        }
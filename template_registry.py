@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+模板批量注册
+把 templates_config.json 中的模板并发注册到阿里云人脸融合服务，请求线程只负责启动后台任务并返回任务ID
+
+功能特点:
+- 有界线程池并发注册，限制同时访问阿里云的请求数
+- 每个模板独立重试，只重试暂时性错误（网络错误、超时、5xx、限流，以及熔断/并发已满时带 retryAfter 的拒绝），
+  指数退避，有 retryAfter 时按其等待；添加模板不是幂等操作，业务错误（如图片不合格）不重试，避免重复创建模板
+- 同一时间只运行一个注册任务，重复提交返回正在进行的任务
+- 每注册完一个模板就写回配置：文件锁内重新读取磁盘上的配置，只合并注册字段，
+  原子写入（临时文件+重命名），不会覆盖其它进程（如 generate_templates.py）的修改
+- 任务进度（已完成数/成功数/失败数/每个模板的结果）可轮询查询
+"""
+
+import copy
+import json
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import config
+from atomic_io import atomic_write_json, file_lock
+from fusion_jobs import JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, FINISHED_STATES
+
+logger = logging.getLogger(__name__)
+
+# 写回配置的注册字段
+REGISTRATION_FIELDS = ('aliyunTemplateId', 'registrationRequestId', 'registrationStatus', 'registrationError')
+
+
+def is_registered(template: Dict) -> bool:
+    """模板是否已经注册成功"""
+    return bool(template.get('aliyunTemplateId')) and template.get('registrationStatus') == 'success'
+
+
+class TemplateRegistry:
+    """模板注册任务管理（线程安全）"""
+
+    def __init__(self, register_fn: Callable[[str], Dict], config_path,
+                 on_config_saved: Callable[[Dict], None] = None, max_workers: int = None,
+                 max_retries: int = None, job_ttl: int = None):
+        """
+        Args:
+            register_fn: 注册单个模板的函数，签名为 register_fn(template_url) -> dict
+            config_path: 模板配置文件路径
+            on_config_saved: 配置写回后的回调，参数为最新的完整配置
+            max_workers: 并发注册数，默认 config.TEMPLATE_REGISTER_WORKERS
+            max_retries: 每个模板暂时性失败后的重试次数，默认 config.TEMPLATE_REGISTER_MAX_RETRIES
+            job_ttl: 已完成任务的保留时间（秒），默认 config.TEMPLATE_REGISTER_JOB_TTL
+        """
+        self.register_fn = register_fn
+        self.config_path = Path(config_path)
+        self.lock_path = self.config_path.with_name(self.config_path.name + '.lock')
+        self.on_config_saved = on_config_saved
+        self.max_workers = max_workers or config.TEMPLATE_REGISTER_WORKERS
+        self.max_retries = config.TEMPLATE_REGISTER_MAX_RETRIES if max_retries is None else max_retries
+        self.job_ttl = job_ttl or config.TEMPLATE_REGISTER_JOB_TTL
+
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, Dict] = {}
+        self.active_job_id: Optional[str] = None
+
+    def start(self, base_config: Dict) -> Tuple[str, bool]:
+        """
+        启动注册任务
+
+        Args:
+            base_config: 配置文件不存在时使用的模板配置（通常是内存中已加载的配置）
+
+        Returns:
+            (任务ID, 是否新建)；已有任务在进行中时返回该任务ID和False
+        """
+        with self.lock:
+            self._purge_expired()
+
+            if self.active_job_id:
+                return self.active_job_id, False
+
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'jobId': job_id,
+                'status': JOB_PENDING,
+                'total': 0,
+                'completed': 0,
+                'successCount': 0,
+                'failedCount': 0,
+                'results': [],
+                'createdAt': time.time(),
+                'finishedAt': None,
+                'message': None
+            }
+            self.active_job_id = job_id
+
+        thread = threading.Thread(target=self._run_job, args=(job_id, copy.deepcopy(base_config)),
+                                  name='template-register', daemon=True)
+        thread.start()
+        logger.info(f"模板注册任务已启动: {job_id}")
+        return job_id, True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """获取任务快照"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def _run_job(self, job_id: str, base_config: Dict):
+        """在后台线程中执行注册任务"""
+        try:
+            templates = self._read_config(base_config).get('templates', [])
+            self._update(job_id, status=JOB_RUNNING, total=len(templates))
+
+            pending = []
+            for template in templates:
+                if is_registered(template):
+                    logger.info(f"模板 {template.get('id')} 已经注册，跳过")
+                    self._record(job_id, {
+                        'id': template.get('id'),
+                        'name': template.get('name'),
+                        'aliyunTemplateId': template.get('aliyunTemplateId'),
+                        'status': 'already_registered'
+                    })
+                elif not template.get('templateUrl'):
+                    logger.warning(f"模板 {template.get('id')} 缺少templateUrl，跳过")
+                    self._record(job_id, {
+                        'id': template.get('id'),
+                        'name': template.get('name'),
+                        'status': 'failed',
+                        'error': '缺少templateUrl'
+                    })
+                else:
+                    pending.append(template)
+
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                        thread_name_prefix='template-register') as executor:
+                    futures = [executor.submit(self._register_template, template) for template in pending]
+                    for future in as_completed(futures):
+                        result, fields = future.result()
+                        self._save(base_config, {result['id']: fields})
+                        self._record(job_id, result)
+
+            job = self.get(job_id)
+            self._save(base_config, {}, last_registration={
+                'timestamp': str(int(time.time())),
+                'totalTemplates': job['total'],
+                'successCount': job['successCount'],
+                'failedCount': job['failedCount']
+            })
+
+            message = f"模板注册完成: 成功 {job['successCount']}, 失败 {job['failedCount']}"
+            logger.info(message)
+            status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.error(f"模板注册任务执行异常 {job_id}: {e}")
+            message = f'模板注册失败: {str(e)}'
+            status = JOB_FAILED
+
+        with self.lock:
+            self.jobs[job_id].update(status=status, message=message, finishedAt=time.time())
+            self.active_job_id = None
+
+    def _register_template(self, template: Dict) -> Tuple[Dict, Dict]:
+        """
+        注册单个模板，暂时性失败时重试（结果带 retryAfter 或 retryable 才重试）
+
+        Returns:
+            (任务结果条目, 需要写回配置的注册字段)
+        """
+        template_id = template.get('id')
+        attempts = 0
+
+        while True:
+            try:
+                result = self.register_fn(template['templateUrl'])
+            except Exception as e:
+                result = {'success': False, 'message': str(e)}
+
+            if result.get('success'):
+                data = result.get('data', {})
+                logger.info(f"✓ 模板 {template_id} 注册成功: {data.get('templateId')}")
+                return ({
+                    'id': template_id,
+                    'name': template.get('name'),
+                    'aliyunTemplateId': data.get('templateId'),
+                    'status': 'success',
+                    'attempts': attempts + 1
+                }, {
+                    'aliyunTemplateId': data.get('templateId'),
+                    'registrationRequestId': data.get('requestId'),
+                    'registrationStatus': 'success',
+                    'registrationError': None
+                })
+
+            error = result.get('message', '未知错误')
+            attempts += 1
+            retryable = bool(result.get('retryAfter') or result.get('retryable'))
+            if not retryable or attempts > self.max_retries:
+                logger.error(f"✗ 模板 {template_id} 注册失败（共 {attempts} 次）: {error}")
+                return ({
+                    'id': template_id,
+                    'name': template.get('name'),
+                    'status': 'failed',
+                    'error': error,
+                    'attempts': attempts
+                }, {
+                    'registrationStatus': 'failed',
+                    'registrationError': error
+                })
+
+            delay = result.get('retryAfter') or config.HTTP_BACKOFF_FACTOR * 2 ** (attempts - 1)
+            logger.warning(f"模板 {template_id} 注册失败，{delay}s 后重试（第 {attempts} 次）: {error}")
+            time.sleep(delay)
+
+    def _read_config(self, base_config: Dict) -> Dict:
+        """读取磁盘上的模板配置，文件不存在时使用 base_config"""
+        if not self.config_path.exists():
+            return base_config
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, base_config: Dict, updates: Dict[str, Dict], last_registration: Dict = None):
+        """在文件锁内重新读取配置，合并注册字段后原子写回"""
+        with file_lock(self.lock_path):
+            templates_config = self._read_config(base_config)
+            templates = templates_config.get('templates', [])
+
+            for template in templates:
+                fields = updates.get(template.get('id'))
+                if not fields:
+                    continue
+                for key in REGISTRATION_FIELDS:
+                    if fields.get(key) is not None:
+                        template[key] = fields[key]
+                    elif key in fields:
+                        template.pop(key, None)
+
+            templates_config['total'] = len(templates)
+            if last_registration:
+                templates_config['lastRegistration'] = last_registration
+            atomic_write_json(self.config_path, templates_config)
+
+        if self.on_config_saved:
+            self.on_config_saved(templates_config)
+
+    def _record(self, job_id: str, result: Dict):
+        """记录一个模板的结果并更新进度"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job['results'].append(result)
+            job['completed'] += 1
+            if result['status'] == 'failed':
+                job['failedCount'] += 1
+            else:
+                job['successCount'] += 1
+
+    def _update(self, job_id: str, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _purge_expired(self):
+        """清理过期的已完成任务（调用方需持有锁）"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job['status'] in FINISHED_STATES and now - job['finishedAt'] > self.job_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+def serialize_registration_job(job: Dict) -> Dict:
+    """将注册任务转换为API响应格式"""
+    return {
+        'jobId': job['jobId'],
+        'status': job['status'],
+        'totalTemplates': job['total'],
+        'completed': job['completed'],
+        'successCount': job['successCount'],
+        'failedCount': job['failedCount'],
+        'registeredTemplates': job['results'],
+        'createdAt': job['createdAt'],
+        'finishedAt': job['finishedAt'],
+        'message': job['message']
+    }
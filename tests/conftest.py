@@ -0,0 +1,6 @@
+"""测试公共设置：模块都在仓库根目录，直接导入"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
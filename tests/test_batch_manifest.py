@@ -0,0 +1,76 @@
+"""batch_manifest 的清单展开和输出文件命名"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+import batch_manifest
+import config
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    pics = tmp_path / 'pics'
+    sound = tmp_path / 'sound'
+    pics.mkdir()
+    sound.mkdir()
+    for name in ('a.jpg', 'b.png', 'notes.txt'):
+        (pics / name).write_bytes(b'x')
+    for name in ('x.wav', 'y.mp3'):
+        (sound / name).write_bytes(b'x')
+    monkeypatch.setattr(config, 'PICS_DIR', str(pics))
+    monkeypatch.setattr(config, 'SOUND_DIR', str(sound))
+    return tmp_path
+
+
+def test_defaults_expand_all_files_and_presets(media):
+    manifest = batch_manifest.load_manifest()
+
+    assert [path.name for path in manifest['images']] == ['a.jpg', 'b.png']
+    assert [path.name for path in manifest['audio']] == ['x.wav', 'y.mp3']
+    assert list(manifest['presets']) == list(config.VIDEO_PARAM_PRESETS)
+    assert manifest['output_dir'] == Path(config.MATRIX_OUTPUT_DIR)
+
+
+def test_output_names_are_unique(media):
+    manifest = batch_manifest.load_manifest()
+    names = [batch_manifest.output_name(image, audio, preset)
+             for image in manifest['images'] for audio in manifest['audio'] for preset in manifest['presets']]
+
+    assert len(names) == len(set(names))
+    assert batch_manifest.output_name(Path('pics/a.jpg'), Path('sound/x.wav'), 'calm') == 'a__x__calm.mp4'
+
+
+def test_duplicate_image_stems_rejected(media):
+    (media / 'pics' / 'a.png').write_bytes(b'x')
+
+    with pytest.raises(ValueError, match='a.jpg'):
+        batch_manifest.load_manifest()
+
+
+def test_duplicate_stems_across_directories_rejected(media, tmp_path):
+    other = tmp_path / 'other'
+    other.mkdir()
+    (other / 'x.wav').write_bytes(b'x')
+    manifest_path = tmp_path / 'matrix.json'
+    manifest_path.write_text(json.dumps({'audio': [str(media / 'sound' / 'x.wav'), str(other / 'x.wav')]}))
+
+    with pytest.raises(ValueError, match='音频'):
+        batch_manifest.load_manifest(str(manifest_path))
+
+
+def test_custom_presets_override_defaults(media, tmp_path):
+    manifest_path = tmp_path / 'matrix.json'
+    manifest_path.write_text(json.dumps({'presets': {'fast': {'eye_move_freq': 0.9}}}))
+
+    presets = batch_manifest.load_manifest(str(manifest_path))['presets']
+    assert presets['fast'] == {**config.VIDEO_GENERATION_PARAMS, 'eye_move_freq': 0.9}
+
+
+def test_unknown_preset_rejected(media, tmp_path):
+    manifest_path = tmp_path / 'matrix.json'
+    manifest_path.write_text(json.dumps({'presets': ['no-such-preset']}))
+
+    with pytest.raises(ValueError, match='no-such-preset'):
+        batch_manifest.load_manifest(str(manifest_path))
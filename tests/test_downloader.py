@@ -0,0 +1,168 @@
+"""downloader 的分段下载、断点续传和落盘顺序"""
+
+import hashlib
+import json
+import os
+import re
+
+import pytest
+import requests
+
+import config
+import downloader
+
+DATA = bytes(range(256)) * 64  # 16KB
+
+
+class FakeResponse:
+    def __init__(self, data, start, end, total, status=206, fail_after=None):
+        self.data = data[start:end + 1]
+        self.status_code = status
+        self.fail_after = fail_after
+        self.headers = {'Content-Range': f'bytes {start}-{end}/{total}', 'ETag': '"v1"',
+                        'Content-Length': str(len(self.data))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        sent = 0
+        for offset in range(0, len(self.data), chunk_size):
+            if self.fail_after is not None and sent >= self.fail_after:
+                raise requests.exceptions.ConnectionError('连接中断')
+            chunk = self.data[offset:offset + chunk_size]
+            sent += len(chunk)
+            yield chunk
+
+
+class FakeServer:
+    """支持Range的假服务端，记录每次请求的范围"""
+
+    def __init__(self, data, fail_after=None):
+        self.data = data
+        self.fail_after = fail_after
+        self.ranges = []
+
+    def get(self, url, headers=None, **kwargs):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', headers['Range']).groups())
+        self.ranges.append((start, end))
+        fail_after = self.fail_after if (start, end) != (0, 0) else None
+        return FakeResponse(self.data, start, min(end, len(self.data) - 1), len(self.data),
+                            fail_after=fail_after)
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(config, 'DOWNLOAD_SEGMENT_MIN_SIZE', 4096)
+    monkeypatch.setattr(config, 'DOWNLOAD_CHUNK_SIZE', 1024)
+    monkeypatch.setattr(config, 'HTTP_BACKOFF_FACTOR', 0)
+    monkeypatch.setattr(downloader, 'STATE_SAVE_INTERVAL', 0)
+
+
+def test_segmented_download(monkeypatch, tmp_path):
+    server = FakeServer(DATA)
+    monkeypatch.setattr(downloader.http_client, 'get', server.get)
+    output = tmp_path / 'video.mp4'
+
+    result = downloader.download_file('http://x/video.mp4', output, expected_md5=hashlib.md5(DATA).hexdigest())
+
+    assert result['success'] and result['verified']
+    assert result['segments'] == 4
+    assert output.read_bytes() == DATA
+    assert not (tmp_path / 'video.mp4.part').exists()
+    assert not (tmp_path / 'video.mp4.part.json').exists()
+
+
+def test_resume_from_part_state(monkeypatch, tmp_path):
+    output = tmp_path / 'video.mp4'
+    part = tmp_path / 'video.mp4.part'
+    # 第一段已经下载了2KB，其余各段还没开始
+    part.write_bytes(DATA[:2048] + b'\0' * (len(DATA) - 2048))
+    segments = downloader._plan_segments(len(DATA), 4)
+    segments[0][2] = 2048
+    (tmp_path / 'video.mp4.part.json').write_text(
+        json.dumps({'size': len(DATA), 'etag': '"v1"', 'segments': segments}))
+
+    server = FakeServer(DATA)
+    monkeypatch.setattr(downloader.http_client, 'get', server.get)
+    result = downloader.download_file('http://x/video.mp4', output)
+
+    assert result['success']
+    assert result['resumed'] == 2048
+    assert output.read_bytes() == DATA
+    # 已下载的部分不再请求
+    assert (2048, 4095) in server.ranges
+    assert all(start >= 2048 for start, _ in server.ranges if (start, _) != (0, 0))
+
+
+def test_changed_etag_restarts(monkeypatch, tmp_path):
+    output = tmp_path / 'video.mp4'
+    (tmp_path / 'video.mp4.part').write_bytes(b'x' * len(DATA))
+    segments = [[start, end, end + 1] for start, end, _ in downloader._plan_segments(len(DATA), 4)]
+    (tmp_path / 'video.mp4.part.json').write_text(
+        json.dumps({'size': len(DATA), 'etag': '"old"', 'segments': segments}))
+
+    monkeypatch.setattr(downloader.http_client, 'get', FakeServer(DATA).get)
+    result = downloader.download_file('http://x/video.mp4', output)
+
+    assert result['success'] and result['resumed'] == 0
+    assert output.read_bytes() == DATA
+
+
+def test_progress_recorded_only_after_fsync(monkeypatch, tmp_path):
+    events = []
+    real_fsync = os.fsync
+    real_save = downloader.atomic_write_json
+
+    part = tmp_path / 'video.mp4.part'
+
+    def fsync(fd):
+        # 只关心 .part 数据文件的fsync（atomic_write_json 写进度文件时也会fsync）
+        if part.exists() and os.path.samestat(os.fstat(fd), os.stat(part)):
+            events.append('fsync')
+        real_fsync(fd)
+
+    def save(path, data, **kwargs):
+        events.append(('save', sum(segment[2] - segment[0] for segment in data['segments'])))
+        real_save(path, data, **kwargs)
+
+    monkeypatch.setattr(downloader.os, 'fsync', fsync)
+    monkeypatch.setattr(downloader, 'atomic_write_json', save)
+    monkeypatch.setattr(downloader.http_client, 'get', FakeServer(DATA).get)
+
+    assert downloader.download_file('http://x/video.mp4', tmp_path / 'video.mp4', max_segments=1)['success']
+
+    # 第一次保存是初始进度（0字节），之后每次记录新进度前都要先fsync
+    progress = 0
+    for index, event in enumerate(events):
+        if event != 'fsync' and event[1] > progress:
+            assert events[index - 1] == 'fsync'
+            progress = event[1]
+    assert progress == len(DATA)
+
+
+def test_interrupted_segment_keeps_progress(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'DOWNLOAD_MAX_RETRIES', 0)
+    monkeypatch.setattr(downloader.http_client, 'get', FakeServer(DATA, fail_after=2048).get)
+    output = tmp_path / 'video.mp4'
+
+    result = downloader.download_file('http://x/video.mp4', output, max_segments=1)
+
+    assert not result['success']
+    state = json.loads((tmp_path / 'video.mp4.part.json').read_text())
+    position = state['segments'][0][2]
+    assert position == 2048
+    assert (tmp_path / 'video.mp4.part').read_bytes()[:position] == DATA[:position]
+
+    # 下次从记录的位置继续
+    server = FakeServer(DATA)
+    monkeypatch.setattr(downloader.http_client, 'get', server.get)
+    result = downloader.download_file('http://x/video.mp4', output, max_segments=1)
+    assert result['success'] and result['resumed'] == 2048
+    assert output.read_bytes() == DATA
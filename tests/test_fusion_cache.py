@@ -0,0 +1,135 @@
+"""fusion_cache 的LRU淘汰、TTL过期和磁盘层"""
+
+import pytest
+
+import fusion_cache
+from fusion_cache import DigestReader, FusionResultCache, image_digest
+
+OK = {'success': True, 'data': {'imageUrl': 'https://result/1.jpg'}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fusion_cache, 'time', clock)
+    return clock
+
+
+def test_unknown_image_is_not_cached(clock):
+    cache = FusionResultCache()
+    cache.put('https://oss/u.jpg', 't1', OK)
+    assert cache.get('https://oss/u.jpg', 't1') is None
+
+
+def test_hit_by_content_not_url(clock):
+    cache = FusionResultCache()
+    digest = image_digest(b'photo')
+    cache.register_image('https://oss/u.jpg?sig=1', digest)
+    cache.put('https://oss/u.jpg?sig=1', 't1', OK)
+
+    # 同一张照片重新上传得到新的签名URL
+    cache.register_image('https://oss/u.jpg?sig=2', digest)
+    assert cache.get('https://oss/u.jpg?sig=2', 't1') == OK
+    assert cache.get('https://oss/u.jpg?sig=2', 't2') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_failed_results_not_cached(clock):
+    cache = FusionResultCache()
+    cache.register_image('u', 'd')
+    cache.put('u', 't1', {'success': False, 'message': 'no face'})
+    assert cache.get('u', 't1') is None
+
+
+def test_lru_eviction(clock):
+    cache = FusionResultCache(max_entries=2)
+    cache.register_image('u', 'd')
+    for template_id in ('t1', 't2'):
+        cache.put('u', template_id, OK)
+
+    assert cache.get('u', 't1') == OK  # t1 变成最近使用
+    cache.put('u', 't3', OK)
+
+    assert cache.get('u', 't2') is None
+    assert cache.get('u', 't1') == OK
+    assert cache.get('u', 't3') == OK
+
+
+def test_ttl_expiry(clock):
+    cache = FusionResultCache(ttl=60)
+    cache.register_image('u', 'd')
+    cache.put('u', 't1', OK)
+
+    clock.now += 60
+    assert cache.get('u', 't1') == OK
+    clock.now += 1
+    assert cache.get('u', 't1') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_tracked_images_bounded(clock):
+    cache = FusionResultCache(max_tracked_images=2)
+    for index in range(3):
+        cache.register_image(f'u{index}', f'd{index}')
+        cache.put(f'u{index}', 't1', OK)
+
+    assert cache.get('u0', 't1') is None
+    assert cache.get('u2', 't1') == OK
+
+
+def test_disk_tier_survives_restart(clock, tmp_path):
+    cache = FusionResultCache(disk_dir=str(tmp_path))
+    cache.register_image('https://oss/u.jpg', 'd')
+    cache.put('https://oss/u.jpg', 't1', OK)
+
+    # 新进程（或其他worker）：内存为空，URL映射和结果都从磁盘读取
+    restarted = FusionResultCache(disk_dir=str(tmp_path))
+    assert restarted.get('https://oss/u.jpg', 't1') == OK
+    assert restarted.stats()['trackedImages'] == 1
+
+
+def test_disk_tier_expires_and_removes_files(clock, tmp_path):
+    cache = FusionResultCache(ttl=60, disk_dir=str(tmp_path))
+    cache.register_image('u', 'd')
+    cache.put('u', 't1', OK)
+
+    clock.now += 61
+    restarted = FusionResultCache(ttl=60, disk_dir=str(tmp_path))
+    assert restarted.get('u', 't1') is None
+    assert list((tmp_path / 'images').glob('*.json')) == []
+
+    # URL映射还在有效期内、结果已过期时，读取结果文件时删除
+    cache = FusionResultCache(ttl=60, disk_dir=str(tmp_path))
+    cache.register_image('u', 'd')
+    cache.put('u', 't1', OK)
+    clock.now += 61
+    cache.register_image('u', 'd')
+    assert FusionResultCache(ttl=60, disk_dir=str(tmp_path)).get('u', 't1') is None
+    assert list(tmp_path.glob('*.json')) == []
+
+
+def test_corrupt_disk_entry_is_a_miss(clock, tmp_path):
+    cache = FusionResultCache(disk_dir=str(tmp_path))
+    cache.register_image('u', 'd')
+    cache.put('u', 't1', OK)
+    for path in tmp_path.glob('*.json'):
+        path.write_text('{not json')
+
+    assert FusionResultCache(disk_dir=str(tmp_path)).get('u', 't1') is None
+
+
+def test_digest_reader_matches_image_digest():
+    import io
+    reader = DigestReader(io.BytesIO(b'x' * 10000))
+    while reader.read(4096):
+        pass
+    assert reader.hexdigest() == image_digest(b'x' * 10000)
+    assert reader.bytes_read == 10000
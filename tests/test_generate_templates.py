@@ -0,0 +1,66 @@
+"""generate_templates 的模板编号分配：已有模板编号不变，新图片只追加"""
+
+from pathlib import Path
+
+import pytest
+
+import config
+from generate_templates import TemplateGenerator
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'TEMPLATES_DIR', str(tmp_path / 'templates'))
+    return TemplateGenerator(workers=1)
+
+
+def manifest(*entries, next_number=None):
+    data = {'templates': {str(number): {'source': source, 'sha256': digest}
+                          for number, source, digest in entries}}
+    if next_number:
+        data['nextNumber'] = next_number
+    return data
+
+
+def assign(generator, files, data):
+    return generator.assign_numbers([Path(name) for name, _ in files], [digest for _, digest in files], data)
+
+
+def test_first_run_numbers_in_order(generator):
+    assert assign(generator, [('a.jpg', 'A'), ('b.jpg', 'B')], {}) == [1, 2]
+
+
+def test_new_image_sorted_first_is_appended(generator):
+    data = manifest((1, 'b.jpg', 'B'), (2, 'c.jpg', 'C'))
+    assert assign(generator, [('a.jpg', 'A'), ('b.jpg', 'B'), ('c.jpg', 'C')], data) == [3, 1, 2]
+
+
+def test_deleted_numbers_are_not_reused(generator):
+    data = manifest((1, 'a.jpg', 'A'), (2, 'b.jpg', 'B'), (3, 'c.jpg', 'C'), next_number=4)
+    # 删除 c.jpg（编号3）之后再加一张新图片
+    assert assign(generator, [('a.jpg', 'A'), ('b.jpg', 'B'), ('d.jpg', 'D')], data) == [1, 2, 4]
+
+    # 旧清单没有 nextNumber 时从已有最大编号之后开始
+    data = manifest((1, 'a.jpg', 'A'), (5, 'b.jpg', 'B'))
+    assert assign(generator, [('a.jpg', 'A'), ('x.jpg', 'X')], data) == [1, 6]
+
+
+def test_renamed_image_keeps_number_by_digest(generator):
+    data = manifest((1, 'a.jpg', 'A'), (2, 'b.jpg', 'B'))
+    assert assign(generator, [('a.jpg', 'A'), ('z-renamed.jpg', 'B')], data) == [1, 2]
+
+
+def test_edited_image_keeps_number_by_name(generator):
+    data = manifest((1, 'a.jpg', 'A'), (2, 'b.jpg', 'B'))
+    assert assign(generator, [('a.jpg', 'A'), ('b.jpg', 'B2')], data) == [1, 2]
+
+
+def test_duplicate_content_prefers_same_file_name(generator):
+    data = manifest((1, 'a.jpg', 'SAME'), (2, 'b.jpg', 'SAME'))
+    assert assign(generator, [('b.jpg', 'SAME'), ('a.jpg', 'SAME')], data) == [2, 1]
+
+
+def test_swapped_names_follow_content(generator):
+    data = manifest((1, 'a.jpg', 'A'), (2, 'b.jpg', 'B'))
+    # 两张图片互换了文件名：编号跟着内容走，已生成的文件都能复用
+    assert assign(generator, [('a.jpg', 'B'), ('b.jpg', 'A')], data) == [2, 1]
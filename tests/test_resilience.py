@@ -0,0 +1,118 @@
+"""resilience 熔断器和AIMD并发限制的状态变化"""
+
+import pytest
+
+import resilience
+from resilience import (STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN,
+                        AdaptiveConcurrencyLimiter, CircuitBreaker)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'time', clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    breaker.record_success()  # 成功清零连续失败数
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+    assert breaker.snapshot()['totalRejected'] == 1
+
+
+def test_breaker_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30, half_open_max_calls=1)
+    breaker.record_failure()
+
+    clock.now += 10
+    assert not breaker.allow()
+    assert breaker.retry_after() == 20
+
+    clock.now += 20
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow()  # 半开时只放行一个探测请求
+
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=5, recovery_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()  # 半开时一次失败就重新打开
+    assert breaker.state == STATE_OPEN
+    assert breaker.retry_after() == 30
+    assert not breaker.allow()
+
+
+def test_limiter_rejects_when_full():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.cancel()
+    assert limiter.try_acquire()
+    assert limiter.snapshot()['totalRejected'] == 1
+    assert limiter.snapshot()['limit'] == 2
+
+
+def test_limiter_additive_increase():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=4, max_limit=5, latency_threshold=1.0)
+    for _ in range(4):
+        limiter.try_acquire()
+        limiter.release(0.2, True)
+    assert limiter.snapshot()['limit'] == 4  # 大约一轮(4次)成功才+1，4次 1/4 的累加略小于1
+
+    for _ in range(20):
+        limiter.try_acquire()
+        limiter.release(0.2, True)
+    assert limiter.snapshot()['limit'] == 5  # 不超过上界
+
+
+def test_limiter_multiplicative_decrease_on_slow_or_failed_calls():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=10, min_limit=2,
+                                         latency_threshold=1.0, backoff_ratio=0.5)
+    limiter.try_acquire()
+    limiter.release(2.0, True)  # 慢
+    assert limiter.snapshot()['limit'] == 5
+
+    limiter.try_acquire()
+    limiter.release(0.1, False)  # 失败
+    assert limiter.snapshot()['limit'] == 2
+
+    limiter.try_acquire()
+    limiter.release(0.1, False)
+    assert limiter.snapshot()['limit'] == 2  # 不低于下界
+    assert limiter.snapshot()['inFlight'] == 0
+
+
+def test_limiter_release_never_goes_negative():
+    limiter = AdaptiveConcurrencyLimiter('test')
+    limiter.release(0.1, True)
+    limiter.cancel()
+    assert limiter.snapshot()['inFlight'] == 0
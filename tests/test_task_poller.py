@@ -0,0 +1,111 @@
+"""task_poller 的查询间隔边界和耗时估计"""
+
+import pytest
+
+import config
+import task_poller
+from task_poller import DurationEstimator, PollSchedule, upstream_duration
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(task_poller, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(task_poller.random, 'uniform', lambda a, b: 0.0)
+
+
+def run_schedule(schedule, clock, count):
+    """按时间表依次“查询”，返回每次查询距提交的秒数"""
+    times = []
+    for _ in range(count):
+        clock.now += schedule.next_delay()
+        times.append(round(clock.now - schedule.submitted_at, 3))
+    return times
+
+
+@pytest.mark.parametrize('p10, p90', [(8, 8), (6, 10), (50, 70), (100, 500), (0, 0)])
+def test_window_interval_within_bounds(clock, p10, p90):
+    schedule = PollSchedule(p10, p90)
+    assert config.POLL_MIN_INTERVAL <= schedule.interval <= config.POLL_WINDOW_MAX_INTERVAL
+
+
+def test_checks_end_at_p90(clock, no_jitter):
+    schedule = PollSchedule(50, 70)
+    times = run_schedule(schedule, clock, 4)
+
+    assert schedule.first_check >= 50
+    assert 70 in times
+    gaps = [b - a for a, b in zip(times, times[1:]) if b <= 70]
+    assert all(gap == pytest.approx(schedule.interval, abs=0.01) for gap in gaps)
+
+
+def test_wide_window_polls_are_capped(clock, no_jitter):
+    schedule = PollSchedule(100, 500)
+    times = run_schedule(schedule, clock, 3)
+    assert schedule.interval == config.POLL_WINDOW_MAX_INTERVAL
+    assert times[1] - times[0] == pytest.approx(config.POLL_WINDOW_MAX_INTERVAL)
+    # 窗口前不查询
+    assert times[0] >= 100
+
+
+def test_overdue_backoff_capped(clock, no_jitter):
+    schedule = PollSchedule(8, 8)
+    times = run_schedule(schedule, clock, 12)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+
+    assert times[0] == pytest.approx(8)
+    assert all(b >= a - 1e-6 for a, b in zip(gaps, gaps[1:]))  # 超出预期后间隔只增不减
+    assert max(gaps) == pytest.approx(config.POLL_MAX_INTERVAL)
+
+
+def test_no_history_starts_immediately(clock, no_jitter):
+    schedule = PollSchedule(0, 0)
+    assert schedule.next_delay() == pytest.approx(0.2)  # 最小延迟
+    assert schedule.next_delay() == pytest.approx(config.POLL_MIN_INTERVAL)
+
+
+def test_resumed_task_queried_immediately(clock, no_jitter):
+    schedule = PollSchedule(50, 70, submitted_at=clock.now - 60)
+    assert schedule.next_delay() == pytest.approx(0.2)
+
+
+def test_jitter_scaled_to_interval(clock, monkeypatch):
+    monkeypatch.setattr(task_poller.random, 'uniform', lambda a, b: b)
+    schedule = PollSchedule(300, 300)
+    delay = schedule.next_delay()
+    # 长任务的首次等待是300秒，抖动只按查询间隔计算
+    assert delay == pytest.approx(300 + schedule.interval * config.POLL_JITTER)
+
+
+def test_estimator_percentiles_and_window(tmp_path):
+    path = tmp_path / 'durations.json'
+    estimator = DurationEstimator(str(path), window=10)
+    assert estimator.estimate('liveportrait') == (0.0, 0.0)
+
+    for duration in range(1, 21):
+        estimator.record('liveportrait', duration)
+    estimator.record('liveportrait', 0)  # 无效耗时忽略
+
+    # 只保留最近10个样本: 11..20
+    assert estimator.estimate('liveportrait') == (12, 20)
+    assert DurationEstimator(str(path), window=10).estimate('liveportrait') == (12, 20)
+
+
+def test_upstream_duration():
+    result = {'output': {'submit_time': '2025-01-01 10:00:00.000', 'end_time': '2025-01-01 10:00:42.500'}}
+    assert upstream_duration(result) == 42.5
+    assert upstream_duration({'output': {}}) is None
+    assert upstream_duration({'output': {'submit_time': 'bad', 'end_time': 'bad'}}) is None
@@ -0,0 +1,79 @@
+"""token_store 的单飞刷新、过期余量和锁文件名"""
+
+import threading
+import time
+
+from token_store import TokenStore
+
+
+class Fetcher:
+    def __init__(self, expires_in=7200, delay=0.0, fail=False):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        return None if self.fail else (f'token-{calls}', self.expires_in)
+
+
+def test_single_flight_refresh(tmp_path):
+    store = TokenStore(tmp_path / 'tokens.json')
+    fetch = Fetcher(delay=0.05)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(store.get('app:access_token', fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == 1
+    assert results == ['token-1'] * 8
+
+
+def test_shared_between_instances(tmp_path):
+    fetch = Fetcher()
+    assert TokenStore(tmp_path / 'tokens.json').get('app:access_token', fetch) == 'token-1'
+
+    # 另一个进程（这里用另一个实例模拟）直接读文件，不再请求上游
+    other = TokenStore(tmp_path / 'tokens.json')
+    assert other.get('app:access_token', fetch) == 'token-1'
+    assert fetch.calls == 1
+
+
+def test_token_inside_expiry_margin_is_refreshed(tmp_path):
+    store = TokenStore(tmp_path / 'tokens.json', expiry_margin=300)
+    # 只剩200秒有效期，请求途中可能过期
+    store.get('app:access_token', Fetcher(expires_in=200))
+
+    fetch = Fetcher()
+    assert store.peek('app:access_token') is None
+    assert store.get('app:access_token', fetch) == 'token-1'
+    assert fetch.calls == 1
+
+
+def test_failed_refresh_keeps_usable_token_only(tmp_path):
+    store = TokenStore(tmp_path / 'tokens.json', refresh_margin=600, expiry_margin=300)
+    store.get('app:access_token', Fetcher(expires_in=500))
+
+    # 进入续期窗口但还有足够有效期：刷新失败时继续用旧值
+    assert store.refresh('app:access_token', Fetcher(fail=True)) == 'token-1'
+
+    store.get('app:jsapi_ticket', Fetcher(expires_in=100))
+    assert store.get('app:jsapi_ticket', Fetcher(fail=True)) is None
+
+
+def test_lock_file_name_is_portable(tmp_path):
+    store = TokenStore(tmp_path / 'tokens.json')
+    store.get('wx123:access_token', Fetcher())
+
+    lock_names = [path.name for path in tmp_path.iterdir() if path.name.endswith('.lock')]
+    assert 'tokens.json.wx123_access_token.lock' in lock_names
+    assert not any(':' in name for name in lock_names)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+跨进程共享的凭证缓存
+用于微信 access_token / jsapi_ticket 这类"全局唯一、重复获取会使旧值失效"的凭证
+
+功能特点:
+- 所有worker进程共享同一个JSON文件，避免各自获取导致互相失效
+- 单飞刷新：进程内线程锁 + 跨进程文件锁，同一时刻只有一个调用方请求上游
+- 后台线程在过期前主动续期，请求路径上只读缓存
+- 返回给调用方的凭证至少还有 expiry_margin 秒有效期，不会在请求途中过期
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from atomic_io import atomic_write_json, file_lock
+
+logger = logging.getLogger(__name__)
+
+# 获取函数返回 (凭证值, 有效期秒数)，失败返回None
+FetchFn = Callable[[], Optional[Tuple[str, int]]]
+
+# 凭证名中不能出现在文件名里的字符（如 appid:access_token 中的冒号在Windows上不合法）
+_UNSAFE_NAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class TokenStore:
+    """文件后端的凭证缓存"""
+
+    def __init__(self, path: str, refresh_margin: int = 600, expiry_margin: int = 300, check_interval: int = 30):
+        """
+        Args:
+            path: 缓存文件路径（所有进程共用）
+            refresh_margin: 距离过期多少秒时开始后台续期
+            expiry_margin: 剩余有效期不足该秒数的凭证视为已过期，不再返回给调用方
+            check_interval: 后台线程检查间隔（秒）
+        """
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self.check_interval = check_interval
+
+        self.entries: Dict[str, Dict] = {}
+        self.loaded_mtime = None
+        self.memory_lock = threading.Lock()
+        self.refresh_locks: Dict[str, threading.Lock] = {}
+
+        self.fetchers: Dict[str, FetchFn] = {}
+        self.refresher_thread = None
+
+    def _read_file(self) -> Dict[str, Dict]:
+        """读取缓存文件，文件变化时才重新解析"""
+        try:
+            stat = os.stat(self.path)
+            # 原子替换会生成新inode，配合mtime判断文件是否变化
+            mtime = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return self.entries
+
+        with self.memory_lock:
+            if mtime == self.loaded_mtime:
+                return self.entries
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取凭证缓存失败 {self.path}: {e}")
+            return self.entries
+
+        with self.memory_lock:
+            self.entries = entries
+            self.loaded_mtime = mtime
+        return entries
+
+    def _is_valid(self, entry: Optional[Dict], margin: int = 0) -> bool:
+        return bool(entry and entry.get('value') and time.time() < entry.get('expiresAt', 0) - margin)
+
+    def peek(self, name: str) -> Optional[str]:
+        """只读缓存，不触发刷新；没有有效值（剩余有效期不足 expiry_margin）时返回None"""
+        entry = self._read_file().get(name)
+        return entry['value'] if self._is_valid(entry, self.expiry_margin) else None
+
+    def get(self, name: str, fetch_fn: FetchFn) -> Optional[str]:
+        """
+        获取凭证，缓存中没有有效值时同步刷新（单飞）
+
+        正常情况下后台线程会提前续期，这里只在冷启动或续期连续失败时才会请求上游
+        """
+        value = self.peek(name)
+        if value:
+            return value
+        return self.refresh(name, fetch_fn, margin=self.expiry_margin)
+
+    def refresh(self, name: str, fetch_fn: FetchFn, margin: Optional[int] = None) -> Optional[str]:
+        """
+        刷新凭证（单飞）：拿到锁后再次检查，其他线程/进程已刷新过则直接复用
+
+        Args:
+            margin: 剩余有效期大于该值时认为无需刷新，默认使用 refresh_margin
+        """
+        if margin is None:
+            margin = self.refresh_margin
+
+        with self.memory_lock:
+            refresh_lock = self.refresh_locks.setdefault(name, threading.Lock())
+
+        # 每个凭证单独一把文件锁，jsapi_ticket刷新时可以嵌套刷新access_token
+        with refresh_lock, file_lock(self._lock_path(name)):
+            entry = self._read_file().get(name)
+            if self._is_valid(entry, margin):
+                return entry['value']
+
+            fetched = fetch_fn()
+            if not fetched:
+                # 刷新失败时继续使用还有足够有效期的旧值
+                return entry['value'] if self._is_valid(entry, self.expiry_margin) else None
+
+            value, expires_in = fetched
+            self._write_entry(name, {
+                'value': value,
+                'expiresAt': time.time() + expires_in,
+                'updatedAt': time.time(),
+                'pid': os.getpid()
+            })
+
+            logger.info(f"凭证已刷新: {name}")
+            return value
+
+    def _lock_path(self, name: str) -> Path:
+        return self.path.with_name(f"{self.path.name}.{_UNSAFE_NAME_CHARS.sub('_', name)}.lock")
+
+    def _write_entry(self, name: str, entry: Dict):
+        """在写锁内重新读取文件后合并写入，避免覆盖其他进程刚写入的凭证"""
+        with file_lock(self.lock_path):
+            with self.memory_lock:
+                self.loaded_mtime = None
+            entries = dict(self._read_file())
+            entries[name] = entry
+
+            try:
+                atomic_write_json(self.path, entries)
+            except Exception as e:
+                logger.error(f"写入凭证缓存失败 {self.path}: {e}")
+
+            with self.memory_lock:
+                self.entries = entries
+                self.loaded_mtime = None
+
+    def register(self, name: str, fetch_fn: FetchFn):
+        """登记需要后台续期的凭证（按登记顺序刷新，依赖项应先登记）"""
+        self.fetchers[name] = fetch_fn
+
+    def start_background_refresh(self):
+        """启动后台续期线程（每个进程一个，跨进程由文件锁保证只刷新一次）"""
+        if self.refresher_thread and self.refresher_thread.is_alive():
+            return
+
+        self.refresher_thread = threading.Thread(
+            target=self._refresh_loop, name='token-refresher', daemon=True
+        )
+        self.refresher_thread.start()
+        logger.info("凭证后台续期线程已启动")
+
+    def _refresh_loop(self):
+        while True:
+            for name, fetch_fn in list(self.fetchers.items()):
+                try:
+                    entry = self._read_file().get(name)
+                    if not self._is_valid(entry, self.refresh_margin):
+                        self.refresh(name, fetch_fn)
+                except Exception as e:
+                    logger.error(f"后台续期凭证失败 {name}: {e}")
+            time.sleep(self.check_interval)
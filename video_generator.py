@@ -6,16 +6,37 @@ LivePortrait视频生成器
 2. 对通过检测的图片生成视频
 3. 使用sound/qiezi.wav作为音频
 4. 输出到videos文件夹
+5. --pipeline 流水线模式：并行上传检测、限流提交、统一轮询、完成即下载
+6. --async 异步模式：单个事件循环驱动所有任务（见 dashscope_async.py），适合大批量
+7. --matrix 矩阵批量模式：图片 × 音频 × 参数预设 展开为一批任务（见 batch_manifest.py）
+
+用法:
+    python video_generator.py                          # 逐张处理
+    python video_generator.py --pipeline               # 流水线模式
+    python video_generator.py --pipeline --concurrency 6
+    python video_generator.py --async --base-url http://127.0.0.1:8089   # 配合本地桩服务
+    python video_generator.py --matrix                 # 所有图片 × sound/下所有音频 × 所有预设
+    python video_generator.py --matrix batch.json --async
 """
 
 import os
 import time
+import argparse
+import threading
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import logging
 from oss_uploader import OSSUploader
+from task_poller import TaskPoller
+from detect_cache import DetectCache
+from downloader import download_file
+import batch_manifest
+import job_journal
+import http_client
 import config
 
 # 加载环境变量
@@ -29,7 +50,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class LivePortraitVideoGenerator:
-    def __init__(self):
+    def __init__(self, use_journal: bool = True, use_detect_cache: bool = True):
+        """
+        Args:
+            use_journal: 是否启用任务日志（中断后重新运行时从断点继续）
+            use_detect_cache: 是否复用缓存的图片质量检测结论
+        """
         self.api_key = os.getenv('ALIYUN_API_KEY')
         if not self.api_key:
             raise ValueError("请在.env文件中设置ALIYUN_API_KEY")
@@ -55,6 +81,20 @@ class LivePortraitVideoGenerator:
         # 支持的图片格式
         self.supported_image_formats = config.SUPPORTED_IMAGE_FORMATS
 
+        # 任务日志：记录每个任务的阶段，避免重复上传、检测和付费渲染
+        self.journal = job_journal.JobJournal() if use_journal else None
+
+        # 质量检测结果缓存：同一张图片不重复调用检测接口
+        self.detect_cache = DetectCache() if use_detect_cache else None
+
+        # 本次运行已上传的素材 {绝对路径: URL}，同一文件只上传一次
+        self.asset_urls: Dict[Path, str] = {}
+        self.asset_locks: Dict[Path, threading.RLock] = {}
+        self.asset_locks_guard = threading.Lock()
+
+        # 任务状态轮询器（按历史耗时自适应安排查询时间）
+        self.task_poller = TaskPoller(self.query_task_status)
+
         # 初始化OSS上传服务
         try:
             self.oss_uploader = OSSUploader()
@@ -98,25 +138,42 @@ class LivePortraitVideoGenerator:
             logger.error(f"上传文件失败: {e}")
             return None
     
+    def asset_lock(self, file_path: Path) -> threading.RLock:
+        """同一素材文件的锁"""
+        key = Path(file_path).resolve()
+        with self.asset_locks_guard:
+            return self.asset_locks.setdefault(key, threading.RLock())
+
+    def upload_asset(self, file_path: Path) -> Optional[str]:
+        """上传素材，本次运行中同一文件只上传一次（并发调用时等待第一次上传的结果）"""
+        key = Path(file_path).resolve()
+        with self.asset_lock(file_path):
+            url = self.asset_urls.get(key)
+            if url is None:
+                url = self.upload_file_to_oss(Path(file_path))
+                if url:
+                    self.asset_urls[key] = url
+            return url
+
     def detect_image_quality(self, image_url: str) -> Dict:
         """检测图片质量是否符合LivePortrait要求"""
         payload = {
-            "model": "liveportrait-detect",
+            "model": config.DETECT_MODEL,
             "input": {
                 "image_url": image_url
             }
         }
         
         try:
-            response = requests.post(self.detect_url, headers=self.headers, json=payload)
+            response = http_client.post(self.detect_url, headers=self.headers, json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"图片质量检测失败: {e}")
             return {"error": str(e)}
     
-    def submit_video_generation_task(self, image_url: str, audio_url: str) -> Dict:
-        """提交视频生成任务"""
+    def submit_video_generation_task(self, image_url: str, audio_url: str, parameters: Dict = None) -> Dict:
+        """提交视频生成任务（parameters 默认使用 config.VIDEO_GENERATION_PARAMS）"""
         headers = self.headers.copy()
         headers['X-DashScope-Async'] = 'enable'
         
@@ -126,11 +183,11 @@ class LivePortraitVideoGenerator:
                 "image_url": image_url,
                 "audio_url": audio_url
             },
-            "parameters": config.VIDEO_GENERATION_PARAMS
+            "parameters": parameters or config.VIDEO_GENERATION_PARAMS
         }
         
         try:
-            response = requests.post(self.video_synthesis_url, headers=headers, json=payload)
+            response = http_client.post(self.video_synthesis_url, headers=headers, json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -142,7 +199,7 @@ class LivePortraitVideoGenerator:
         url = f"{self.task_query_url}/{task_id}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = http_client.get(url, headers=self.headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -150,78 +207,107 @@ class LivePortraitVideoGenerator:
             return {"error": str(e)}
     
     def wait_for_task_completion(self, task_id: str, max_wait_time: int = None) -> Dict:
-        """等待任务完成"""
-        if max_wait_time is None:
-            max_wait_time = config.MAX_WAIT_TIME
-
-        start_time = time.time()
+        """等待任务完成（查询时间由 task_poller 按历史耗时自适应安排）"""
+        result = self.task_poller.wait(task_id, max_wait_time)
 
-        while time.time() - start_time < max_wait_time:
-            result = self.query_task_status(task_id)
-            
-            if "error" in result:
-                return result
-            
-            task_status = result.get("output", {}).get("task_status", "UNKNOWN")
+        task_status = result.get("output", {}).get("task_status")
+        if task_status:
             logger.info(f"任务 {task_id} 状态: {task_status}")
-            
-            if task_status == "SUCCEEDED":
-                return result
-            elif task_status == "FAILED":
-                return result
-            elif task_status in ["PENDING", "RUNNING"]:
-                time.sleep(config.QUERY_INTERVAL)  # 等待后再次查询
-            else:
-                logger.warning(f"未知任务状态: {task_status}")
-                time.sleep(config.QUERY_INTERVAL)
-        
-        return {"error": "任务超时"}
+        return result
     
     def download_video(self, video_url: str, output_path: Path) -> bool:
-        """下载生成的视频"""
-        try:
-            response = requests.get(video_url, stream=True)
-            response.raise_for_status()
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            logger.info(f"视频已下载到: {output_path}")
-            return True
-        except requests.exceptions.RequestException as e:
-            logger.error(f"视频下载失败: {e}")
+        """下载生成的视频（可续传，大文件分段并行，完成后校验）"""
+        result = download_file(video_url, output_path)
+        if not result['success']:
+            logger.error(f"视频下载失败: {result['error']}")
             return False
+
+        resumed = f", 续传 {result['resumed'] / 1024 / 1024:.1f}MB" if result['resumed'] else ""
+        logger.info(f"视频已下载到: {output_path} "
+                    f"({result['size'] / 1024 / 1024:.1f}MB, {result['seconds']:.1f}s, "
+                    f"{result['speed'] / 1024 / 1024:.2f}MB/s, {result['segments']} 段{resumed})")
+        return True
     
-    def process_single_image(self, image_path: Path, audio_url: str) -> bool:
-        """处理单个图片：检测质量并生成视频"""
-        logger.info(f"处理图片: {image_path}")
-        
-        # 上传图片到OSS获取URL
-        logger.info("上传图片到OSS...")
-        image_url = self.upload_file_to_oss(image_path)
+    def journal_update(self, job: Dict, stage: str, **fields):
+        """记录任务阶段（未启用任务日志时不做任何事）"""
+        if self.journal:
+            self.journal.update(job, stage, **fields)
+
+    def resume_job(self, job: Dict) -> Optional[str]:
+        """从任务日志恢复任务状态，返回可以继续的阶段（None表示从头执行）"""
+        if not self.journal:
+            return None
+
+        stage = self.journal.resume(job)
+        if stage:
+            logger.info(f"{job['name']}: 从任务日志恢复，阶段 {stage}")
+        return stage
+
+    def reject_job(self, job: Dict, message: str) -> bool:
+        """记录图片质量检测未通过，返回False"""
+        logger.warning(f"图片质量检测未通过 {job['name']}: {message}")
+        self.journal_update(job, job_journal.STAGE_REJECTED, detect_message=message)
+        return False
+
+    def prepare_job(self, job: Dict) -> bool:
+        """
+        上传图片并检测质量，通过时图片URL写入 job['image_url']
+
+        日志中已完成的步骤直接复用；检测结论已缓存时不调用检测接口，缓存为未通过时连上传也省掉。
+        同一图片的多个任务（矩阵批量模式）依次准备，后面的任务复用上传的URL和缓存的检测结论
+        """
+        with self.asset_lock(job['image']):
+            return self._prepare_job(job)
+
+    def _prepare_job(self, job: Dict) -> bool:
+        name = job['name']
+        image_url = job.get('image_url')
+        detected = job.get('resume_stage') == job_journal.STAGE_DETECTED
+
+        cached = None
+        if not detected and self.detect_cache:
+            cached = self.detect_cache.get(job['image'])
+            if cached and not cached['pass']:
+                return self.reject_job(job, cached['message'])
+
         if not image_url:
-            logger.error(f"无法上传图片到OSS: {image_path}")
-            return False
-        
-        # 检测图片质量
-        logger.info("检测图片质量...")
-        detect_result = self.detect_image_quality(image_url)
-        
-        if "error" in detect_result:
-            logger.error(f"图片质量检测失败: {detect_result['error']}")
-            return False
-        
-        if not detect_result.get("output", {}).get("pass", False):
-            message = detect_result.get("output", {}).get("message", "未知错误")
-            logger.warning(f"图片质量检测未通过: {message}")
-            return False
-        
-        logger.info("图片质量检测通过")
-        
-        # 提交视频生成任务
-        logger.info("提交视频生成任务...")
-        task_result = self.submit_video_generation_task(image_url, audio_url)
+            # 上传图片到OSS获取URL
+            logger.info(f"上传图片到OSS: {job['image'].name}")
+            image_url = self.upload_asset(job['image'])
+            if not image_url:
+                logger.error(f"无法上传图片到OSS: {job['image']}")
+                return False
+            job['image_url'] = image_url
+            self.journal_update(job, job_journal.STAGE_UPLOADED, image_url=image_url, uploaded_at=time.time())
+
+        if detected:
+            return True
+
+        if cached:
+            logger.info(f"图片质量检测通过（缓存）: {name}")
+        else:
+            # 检测图片质量
+            logger.info(f"检测图片质量: {name}")
+            detect_result = self.detect_image_quality(image_url)
+
+            if "error" in detect_result:
+                logger.error(f"图片质量检测失败: {detect_result['error']}")
+                return False
+
+            if self.detect_cache:
+                self.detect_cache.put(job['image'], detect_result)
+
+            if not detect_result.get("output", {}).get("pass", False):
+                return self.reject_job(job, detect_result.get("output", {}).get("message", "未知错误"))
+
+            logger.info(f"图片质量检测通过: {name}")
+        self.journal_update(job, job_journal.STAGE_DETECTED, detect_message=None)
+        return True
+
+    def submit_job(self, job: Dict, audio_url: str) -> bool:
+        """提交视频生成任务，任务ID写入 job['task_id']（任务自带 audio_url 时优先使用）"""
+        audio_url = job.get('audio_url') or audio_url
+        task_result = self.submit_video_generation_task(job['image_url'], audio_url, job['params'])
         
         if "error" in task_result:
             logger.error(f"视频生成任务提交失败: {task_result['error']}")
@@ -232,41 +318,249 @@ class LivePortraitVideoGenerator:
             logger.error("未获取到任务ID")
             return False
         
-        logger.info(f"任务已提交，任务ID: {task_id}")
-        
-        # 等待任务完成
-        logger.info("等待任务完成...")
-        final_result = self.wait_for_task_completion(task_id)
-        
+        logger.info(f"任务已提交 {job['name']}，任务ID: {task_id}")
+        job['task_id'] = task_id
+        job['submitted_at'] = time.time()
+        self.journal_update(job, job_journal.STAGE_SUBMITTED, task_id=task_id, submitted_at=job['submitted_at'])
+        return True
+
+    def finish_job(self, job: Dict, final_result: Dict) -> bool:
+        """
+        处理任务的最终结果：失败时记录原因，成功时下载视频
+
+        本地轮询超时（任务可能仍在渲染）时日志保持在submitted阶段，下次运行继续查询同一个任务，
+        只有DashScope返回 FAILED/CANCELED 才记为failed
+        """
         if "error" in final_result:
-            logger.error(f"任务执行失败: {final_result['error']}")
+            logger.error(f"任务等待超时 {job['name']}: {final_result['error']}（已保留任务ID，下次运行继续查询）")
             return False
         
-        task_status = final_result.get("output", {}).get("task_status")
-        if task_status != "SUCCEEDED":
-            logger.error(f"任务失败，状态: {task_status}")
+        output = final_result.get("output", {})
+        if output.get("task_status") != "SUCCEEDED":
+            message = output.get("message", output.get("task_status"))
+            logger.error(f"任务失败 {job['name']}: {message}")
+            self.journal_update(job, job_journal.STAGE_FAILED, error=message)
             return False
         
-        # 下载视频
-        video_url = final_result.get("output", {}).get("results", {}).get("video_url")
+        video_url = output.get("results", {}).get("video_url")
         if not video_url:
             logger.error("未获取到视频URL")
+            self.journal_update(job, job_journal.STAGE_FAILED, error="未获取到视频URL")
             return False
-        
-        # 生成输出文件名
-        output_filename = f"{image_path.stem}_generated.mp4"
-        output_path = self.videos_dir / output_filename
-        
+
+        self.journal_update(job, job_journal.STAGE_SUCCEEDED, video_url=video_url, finished_at=time.time())
+        return self.download_job(job, video_url)
+
+    def download_job(self, job: Dict, video_url: str) -> bool:
+        """下载视频；失败时日志保持在succeeded阶段，下次运行只重试下载"""
         logger.info(f"下载视频: {video_url}")
-        success = self.download_video(video_url, output_path)
+        success = self.download_video(video_url, job['output'])
         
         if success:
-            logger.info(f"视频生成成功: {output_path}")
+            logger.info(f"视频生成成功: {job['output']}")
+            self.journal_update(job, job_journal.STAGE_DOWNLOADED)
         
         return success
+
+    def build_job(self, image_path: Path) -> Dict:
+        """为一张图片构建生成任务描述"""
+        return {
+            'name': image_path.stem,
+            'image': image_path,
+            'audio': self.sound_file,
+            'output': self.videos_dir / f"{image_path.stem}_generated.mp4",
+            'params': None
+        }
+
+    def build_matrix_jobs(self, manifest: Dict) -> List[Dict]:
+        """把矩阵清单（batch_manifest.load_manifest()）展开为 图片 × 音频 × 预设 的任务列表"""
+        output_dir = manifest['output_dir']
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        jobs = []
+        for image_path in manifest['images']:
+            for audio_path in manifest['audio']:
+                for preset, params in manifest['presets'].items():
+                    jobs.append({
+                        'name': f"{image_path.stem}/{audio_path.stem}/{preset}",
+                        'image': image_path,
+                        'audio': audio_path,
+                        'preset': preset,
+                        'output': output_dir / batch_manifest.output_name(image_path, audio_path, preset),
+                        'params': params
+                    })
+        return jobs
+
+    def process_job(self, job: Dict, audio_url: str) -> bool:
+        """处理单个任务：检测质量并生成视频（按任务日志跳过已完成的步骤）"""
+        logger.info(f"处理图片: {job['image']}")
+
+        stage = job['resume_stage'] = self.resume_job(job)
+        if stage == job_journal.STAGE_DOWNLOADED:
+            logger.info(f"视频已存在，跳过: {job['output']}")
+            return True
+        if stage == job_journal.STAGE_REJECTED:
+            logger.warning(f"图片质量检测未通过（已记录）{job['name']}: {job.get('detect_message')}")
+            return False
+        if stage == job_journal.STAGE_SUCCEEDED:
+            return self.download_job(job, job['video_url'])
+
+        if stage != job_journal.STAGE_SUBMITTED:
+            if not self.prepare_job(job):
+                return False
+            
+            # 提交视频生成任务
+            logger.info("提交视频生成任务...")
+            if not self.submit_job(job, audio_url):
+                return False
+        
+        # 等待任务完成
+        logger.info("等待任务完成...")
+        self.task_poller.add(job['task_id'], submitted_at=job.get('submitted_at'))
+        final_result = self.wait_for_task_completion(job['task_id'])
+        return self.finish_job(job, final_result)
+
+    def process_single_image(self, image_path: Path, audio_url: str) -> bool:
+        """处理单个图片：检测质量并生成视频"""
+        return self.process_job(self.build_job(image_path), audio_url)
+
+    def run_jobs_pipelined(self, jobs: List[Dict], audio_url: str, max_concurrency: int = None) -> int:
+        """
+        流水线模式执行一批生成任务
+
+        0. 按任务日志恢复：已下载的跳过，已成功的直接下载，已提交的继续轮询
+        1. 并行上传并检测其余图片
+        2. 按并发上限提交任务，有任务结束就补提交下一个
+        3. 每轮统一查询所有在途任务的状态（DashScope没有批量查询接口，逐个查询）
+        4. 任务成功后立即交给下载线程池，不阻塞轮询
+
+        Args:
+            jobs: build_job() 生成的任务列表
+            audio_url: 音频URL
+            max_concurrency: 同时在途的任务数上限，默认 config.VIDEO_PIPELINE_CONCURRENCY
+
+        Returns:
+            成功生成的视频数
+        """
+        max_concurrency = max_concurrency or config.VIDEO_PIPELINE_CONCURRENCY
+        poller = self.task_poller
+        downloads = []
+        skipped = 0
+
+        with ThreadPoolExecutor(max_workers=config.VIDEO_PIPELINE_DOWNLOAD_WORKERS,
+                                thread_name_prefix='video-download') as download_pool:
+            # 阶段0：按任务日志恢复
+            to_prepare = []
+            for job in jobs:
+                stage = job['resume_stage'] = self.resume_job(job)
+                if stage == job_journal.STAGE_DOWNLOADED:
+                    skipped += 1
+                elif stage == job_journal.STAGE_SUCCEEDED:
+                    downloads.append(download_pool.submit(self.download_job, job, job['video_url']))
+                elif stage == job_journal.STAGE_SUBMITTED:
+                    poller.add(job['task_id'], context=job, submitted_at=job['submitted_at'])
+                elif stage != job_journal.STAGE_REJECTED:
+                    to_prepare.append(job)
+
+            if skipped or downloads or len(poller):
+                logger.info(f"任务日志: 已完成 {skipped} 个，待下载 {len(downloads)} 个，继续轮询 {len(poller)} 个")
+
+            # 阶段1：并行上传 + 质量检测
+            with ThreadPoolExecutor(max_workers=config.VIDEO_PIPELINE_PREPARE_WORKERS,
+                                    thread_name_prefix='video-prepare') as prepare_pool:
+                prepared = list(prepare_pool.map(self.prepare_job, to_prepare))
+
+            ready = deque(job for job, ok in zip(to_prepare, prepared) if ok)
+            logger.info(f"{len(ready)}/{len(to_prepare)} 张图片通过检测，并发上限 {max_concurrency}")
+
+            # 阶段2：限流提交 + 统一轮询 + 完成即下载
+            while ready or len(poller):
+                while ready and len(poller) < max_concurrency:
+                    job = ready.popleft()
+                    if self.submit_job(job, audio_url):
+                        poller.add(job['task_id'], context=job)
+
+                if not len(poller):
+                    continue
+
+                # 睡到最早一个任务该查询的时候，每轮只查询已到期的任务
+                time.sleep(poller.seconds_until_due())
+
+                for task_id, result, job in poller.poll_due():
+                    task_status = result.get("output", {}).get("task_status")
+
+                    if task_status == "SUCCEEDED":
+                        logger.info(f"任务 {task_id} ({job['name']}) 已完成，开始下载")
+                        downloads.append(download_pool.submit(self.finish_job, job, result))
+                    else:
+                        self.finish_job(job, result)
+
+                    logger.info(f"在途任务 {len(poller)} 个，待提交 {len(ready)} 个，已开始下载 {len(downloads)} 个")
+
+        stats = poller.stats()
+        logger.info(f"状态查询 {stats['queries']} 次（平均每个任务 {stats['queriesPerTask']} 次），"
+                    f"完成到发现平均延迟 {stats['avgDetectDelay']}s")
+        return skipped + sum(1 for future in downloads if future.result())
     
-    def run(self):
-        """运行主程序"""
+    def run_jobs_async(self, jobs: List[Dict], audio_url: str, max_concurrency: int = None,
+                       base_url: str = None) -> int:
+        """用异步客户端执行一批生成任务，返回成功数"""
+        # 延迟导入：只有异步模式才需要aiohttp
+        import asyncio
+        from dashscope_async import generate_videos
+
+        return asyncio.run(generate_videos(
+            jobs, audio_url, self.api_key, self.upload_asset,
+            base_url=base_url, max_in_flight=max_concurrency, journal=self.journal,
+            detect_cache=self.detect_cache
+        ))
+
+    def execute_jobs(self, jobs: List[Dict], audio_url: Optional[str], pipeline: bool = False,
+                     max_concurrency: int = None, use_async: bool = False, base_url: str = None) -> int:
+        """按模式执行一批任务，返回成功生成的视频数"""
+        try:
+            if use_async:
+                return self.run_jobs_async(jobs, audio_url, max_concurrency, base_url)
+            if pipeline:
+                return self.run_jobs_pipelined(jobs, audio_url, max_concurrency)
+
+            # 逐个处理
+            success_count = 0
+            for job in jobs:
+                try:
+                    if self.process_job(job, audio_url):
+                        success_count += 1
+                    logger.info("-" * 50)
+                except Exception as e:
+                    logger.error(f"处理图片 {job['image']} 时发生错误: {e}")
+            return success_count
+        finally:
+            if self.detect_cache:
+                self.detect_cache.save()
+
+    def log_run_summary(self, success_count: int, total: int, start_time: float):
+        """输出本次运行的结果和缓存、连接复用统计"""
+        if self.detect_cache:
+            cache_stats = self.detect_cache.stats()
+            logger.info(f"质量检测缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次")
+
+        logger.info(f"任务完成！成功生成 {success_count}/{total} 个视频，"
+                    f"总耗时 {time.time() - start_time:.1f}s")
+
+        http_stats = http_client.get_connection_stats()
+        logger.info(f"HTTP连接复用率: {http_stats['reuseRate']:.1%} "
+                    f"({http_stats['requests']} 次请求, {http_stats['connections']} 个新连接)")
+
+    def run(self, pipeline: bool = False, max_concurrency: int = None, use_async: bool = False,
+            base_url: str = None):
+        """运行主程序
+
+        Args:
+            pipeline: 是否使用流水线模式
+            max_concurrency: 流水线/异步模式下同时在途的任务数上限
+            use_async: 是否使用异步客户端
+            base_url: 异步模式下的DashScope服务地址（如本地桩服务）
+        """
         logger.info("开始LivePortrait视频生成任务")
         
         # 检查音频文件
@@ -276,7 +570,7 @@ class LivePortraitVideoGenerator:
         
         # 上传音频文件到OSS获取URL
         logger.info("上传音频文件到OSS...")
-        audio_url = self.upload_file_to_oss(self.sound_file)
+        audio_url = self.upload_asset(self.sound_file)
         if not audio_url:
             logger.error("无法上传音频文件到OSS")
             return
@@ -289,28 +583,82 @@ class LivePortraitVideoGenerator:
         
         logger.info(f"找到 {len(image_files)} 个图片文件")
         
-        # 处理每个图片
-        success_count = 0
-        for image_path in image_files:
-            try:
-                if self.process_single_image(image_path, audio_url):
-                    success_count += 1
-                logger.info("-" * 50)
-            except Exception as e:
-                logger.error(f"处理图片 {image_path} 时发生错误: {e}")
-        
-        logger.info(f"任务完成！成功生成 {success_count}/{len(image_files)} 个视频")
+        start_time = time.time()
+        jobs = [self.build_job(image_path) for image_path in image_files]
+        success_count = self.execute_jobs(jobs, audio_url, pipeline, max_concurrency, use_async, base_url)
+        self.log_run_summary(success_count, len(jobs), start_time)
+
+    def run_matrix(self, manifest_path: str = None, max_concurrency: int = None, use_async: bool = False,
+                   base_url: str = None):
+        """矩阵批量模式：图片 × 音频 × 参数预设，所有组合经同一个限流调度器执行
+
+        Args:
+            manifest_path: 清单JSON文件（格式见 batch_manifest.py），None 表示所有图片 × 所有音频 × 所有预设
+            max_concurrency: 同时在途的任务数上限
+            use_async: 是否使用异步客户端（否则使用流水线模式）
+            base_url: 异步模式下的DashScope服务地址（如本地桩服务）
+        """
+        manifest = batch_manifest.load_manifest(manifest_path)
+        logger.info(f"矩阵批量任务: {len(manifest['images'])} 张图片 × {len(manifest['audio'])} 个音频 × "
+                    f"{len(manifest['presets'])} 个预设 ({', '.join(manifest['presets'])})")
+
+        jobs = self.build_matrix_jobs(manifest)
+        if not jobs:
+            logger.warning("清单展开后没有任务，请检查图片、音频和预设")
+            return
+
+        # 每个音频只上传一次，所有使用它的任务共享URL（图片在准备阶段按同样方式去重）
+        for audio_path in manifest['audio']:
+            audio_url = self.upload_asset(audio_path)
+            if not audio_url:
+                logger.error(f"无法上传音频文件到OSS: {audio_path}")
+                return
+            for job in jobs:
+                if job['audio'] == audio_path:
+                    job['audio_url'] = audio_url
+
+        start_time = time.time()
+        success_count = self.execute_jobs(jobs, None, pipeline=True, max_concurrency=max_concurrency,
+                                          use_async=use_async, base_url=base_url)
+        self.log_run_summary(success_count, len(jobs), start_time)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LivePortrait 视频生成器")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="流水线模式：并行上传检测，所有任务同时在DashScope上渲染")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help=f"同时在途的任务数（流水线默认 {config.VIDEO_PIPELINE_CONCURRENCY}，"
+                             f"异步默认 {config.DASHSCOPE_ASYNC_MAX_IN_FLIGHT}）")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="异步模式：aiohttp单事件循环驱动所有任务")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="不使用任务日志，所有图片从头处理")
+    parser.add_argument('--no-detect-cache', action='store_true',
+                        help="不使用缓存的质量检测结论，重新调用检测接口")
+    parser.add_argument('--matrix', nargs='?', const='', default=None, metavar='MANIFEST',
+                        help="矩阵批量模式：图片 × 音频 × 参数预设；可指定清单JSON（格式见 batch_manifest.py）")
+    parser.add_argument('--base-url', default=None,
+                        help="异步模式下的DashScope服务地址，如本地桩服务 http://127.0.0.1:8089")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
         print("=" * 60)
         print("LivePortrait 视频生成器")
         print("=" * 60)
         print("正在初始化...")
 
-        generator = LivePortraitVideoGenerator()
-        generator.run()
+        generator = LivePortraitVideoGenerator(use_journal=not args.no_journal,
+                                               use_detect_cache=not args.no_detect_cache)
+        if args.matrix is not None:
+            generator.run_matrix(args.matrix or None, max_concurrency=args.concurrency,
+                                 use_async=args.use_async, base_url=args.base_url)
+        else:
+            generator.run(pipeline=args.pipeline, max_concurrency=args.concurrency,
+                          use_async=args.use_async, base_url=args.base_url)
 
         print("=" * 60)
         print("程序执行完成！")
@@ -5,15 +5,29 @@
 1. 将images目录下的二维码图片合成到videos目录下对应的视频中
 2. 二维码显示在视频右下角
 3. 支持自定义二维码大小、位置和透明度
+4. 支持 --workers N 多进程批量合成
+5. 默认通过ffmpeg管道编码为H.264并保留原音轨，ffmpeg不可用时回退到OpenCV
+6. QR_COMPOSE_MODE = "filter" 时直接用ffmpeg overlay滤镜合成，失败时回退到逐帧合成
+
+用法:
+    python video_qr_composer.py                 # 逐个合成
+    python video_qr_composer.py --workers 8     # 8个进程并行合成
+    python video_qr_composer.py -w 8 -y         # 跳过确认直接开始
 """
 
 import os
+import time
+import queue
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import cv2
 import numpy as np
 from pathlib import Path
 from PIL import Image, ImageDraw
 import logging
 import config
+from ffmpeg_utils import FFmpegPipeWriter, find_ffmpeg, build_qr_overlay_command, run_ffmpeg
 
 # 配置日志
 logging.basicConfig(
@@ -22,6 +36,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 多进程模式下汇总进度的输出间隔（秒）
+PROGRESS_REPORT_INTERVAL = 2.0
+
+
+class QROverlay:
+    """预编译的二维码叠加层
+
+    每个二维码图片只构建一次：预先算好 预乘alpha的BGR 和 反alpha（uint16），
+    逐帧混合时只做整数乘加和移位，全部写入预分配的缓冲区，不产生临时数组
+    """
+
+    def __init__(self, qr_image, margin):
+        self.margin = margin
+        self.height, self.width = qr_image.shape[:2]
+        self.has_alpha = qr_image.ndim == 3 and qr_image.shape[2] == 4
+
+        if self.has_alpha:
+            alpha = qr_image[:, :, 3:4].astype(np.uint16)
+            # 预乘: qr_bgr * alpha，最大 255*255，uint16 足够
+            self.premultiplied = qr_image[:, :, :3].astype(np.uint16) * alpha
+            self.inverse_alpha = np.ascontiguousarray(
+                np.broadcast_to(255 - alpha, (self.height, self.width, 3))
+            )
+            self.buffer = np.empty((self.height, self.width, 3), dtype=np.uint16)
+            self.scratch = np.empty_like(self.buffer)
+        else:
+            self.bgr = np.ascontiguousarray(qr_image[:, :, :3])
+
+        self.frame_shape = None
+        self.region = None
+
+    def _prepare(self, frame_shape):
+        """按帧尺寸计算叠加位置（右下角）并裁剪好对应视图，帧尺寸不变时只算一次"""
+        frame_height, frame_width = frame_shape[:2]
+
+        # 确保位置不会超出边界
+        x_offset = max(0, frame_width - self.width - self.margin)
+        y_offset = max(0, frame_height - self.height - self.margin)
+        h = min(self.height, frame_height - y_offset)
+        w = min(self.width, frame_width - x_offset)
+
+        self.frame_shape = frame_shape
+        self.region = (slice(y_offset, y_offset + h), slice(x_offset, x_offset + w))
+
+        if self.has_alpha:
+            self.view_premultiplied = self.premultiplied[:h, :w]
+            self.view_inverse_alpha = self.inverse_alpha[:h, :w]
+            self.view_buffer = self.buffer[:h, :w]
+            self.view_scratch = self.scratch[:h, :w]
+        else:
+            self.view_bgr = self.bgr[:h, :w]
+
+    def apply(self, frame):
+        """原地把二维码混合到帧上"""
+        if frame.shape != self.frame_shape:
+            self._prepare(frame.shape)
+
+        roi = frame[self.region]
+
+        if not self.has_alpha:
+            roi[:] = self.view_bgr
+            return frame
+
+        buf = self.view_buffer
+        tmp = self.view_scratch
+
+        # buf = roi * (255 - alpha) + qr_bgr * alpha，范围 [0, 65025]
+        np.multiply(roi, self.view_inverse_alpha, out=buf)
+        np.add(buf, self.view_premultiplied, out=buf)
+
+        # 整数近似 round(buf / 255) = (x + 128 + ((x + 128) >> 8)) >> 8
+        np.add(buf, 128, out=buf)
+        np.right_shift(buf, 8, out=tmp)
+        np.add(buf, tmp, out=buf)
+        np.right_shift(buf, 8, out=buf)
+
+        np.copyto(roi, buf, casting='unsafe')
+        return frame
+
+
 class VideoQRComposer:
     def __init__(self):
         self.images_dir = Path("images")
@@ -33,6 +127,9 @@ class VideoQRComposer:
         self.margin = config.QR_MARGIN
         self.opacity = config.QR_OPACITY
 
+        # 最近一次合成失败的原因，供批量模式汇总
+        self.last_error = None
+
         # 确保输出目录存在
         self.output_dir.mkdir(exist_ok=True)
         
@@ -93,76 +190,140 @@ class VideoQRComposer:
             logger.error(f"调整二维码大小失败: {e}")
             return None
     
+    def build_overlay(self, qr_image):
+        """为调整好大小的二维码构建预编译叠加层"""
+        return QROverlay(qr_image, self.margin)
+
     def overlay_qr_on_frame(self, frame, qr_image):
-        """在视频帧上叠加二维码"""
+        """在视频帧上叠加二维码
+
+        Args:
+            frame: 视频帧（原地修改）
+            qr_image: QROverlay，或调整好大小的二维码图片（每次调用都会重新构建叠加层，仅用于单帧）
+        """
         try:
-            frame_height, frame_width = frame.shape[:2]
-            qr_height, qr_width = qr_image.shape[:2]
-            
-            # 计算二维码在右下角的位置
-            x_offset = frame_width - qr_width - self.margin
-            y_offset = frame_height - qr_height - self.margin
-            
-            # 确保位置不会超出边界
-            x_offset = max(0, x_offset)
-            y_offset = max(0, y_offset)
-            
-            # 获取要覆盖的区域
-            roi = frame[y_offset:y_offset + qr_height, x_offset:x_offset + qr_width]
-            
-            if qr_image.shape[2] == 4:  # 如果二维码有alpha通道
-                # 分离BGR和alpha通道
-                qr_bgr = qr_image[:, :, :3]
-                qr_alpha = qr_image[:, :, 3] / 255.0
-                
-                # 应用alpha混合
-                for c in range(3):
-                    roi[:, :, c] = (qr_alpha * qr_bgr[:, :, c] + 
-                                   (1 - qr_alpha) * roi[:, :, c])
-            else:
-                # 直接覆盖（如果没有alpha通道）
-                roi[:] = qr_image
-            
-            return frame
+            overlay = qr_image if isinstance(qr_image, QROverlay) else self.build_overlay(qr_image)
+            return overlay.apply(frame)
             
         except Exception as e:
             logger.error(f"叠加二维码失败: {e}")
             return frame
     
-    def compose_video_with_qr(self, video_path, qr_path, output_path):
-        """将二维码合成到视频中"""
+    def open_writer(self, output_path, fps, frame_size, audio_source=None):
+        """按 config.VIDEO_ENCODER 创建视频写入器
+
+        ffmpeg: H.264 + 复制源音轨 + faststart；ffmpeg不可用时回退到 OpenCV mp4v（无音频）
+        """
+        if config.VIDEO_ENCODER == 'ffmpeg':
+            if find_ffmpeg():
+                return FFmpegPipeWriter(output_path, fps, frame_size, audio_source=audio_source)
+            logger.warning(f"未找到ffmpeg ({config.FFMPEG_BIN})，回退到OpenCV编码（mp4v，无音频）")
+
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return cv2.VideoWriter(str(output_path), fourcc, fps, frame_size)
+
+    def _fail(self, message):
+        """记录失败原因并返回False"""
+        self.last_error = message
+        logger.error(message)
+        return False
+
+    def can_use_filter(self):
+        """当前参数能否用ffmpeg overlay滤镜直接合成
+
+        静态二维码（大小、边距、透明度）都能用滤镜表达；
+        编码后端为opencv、模式为frames或没有ffmpeg时走逐帧合成
+        """
+        return (
+            config.QR_COMPOSE_MODE == 'filter'
+            and config.VIDEO_ENCODER == 'ffmpeg'
+            and find_ffmpeg() is not None
+        )
+
+    def compose_video_with_qr(self, video_path, qr_path, output_path, progress_callback=None):
+        """将二维码合成到视频中
+
+        优先使用ffmpeg overlay滤镜，不可用或失败时回退到逐帧合成
+
+        Args:
+            progress_callback: 可选，定期调用 progress_callback(已处理帧数, 总帧数)；
+                               提供时不再输出逐帧进度日志，由调用方汇总
+        """
+        self.last_error = None
+
+        if self.can_use_filter():
+            if self.compose_with_filter(video_path, qr_path, output_path, progress_callback):
+                return True
+            logger.warning(f"ffmpeg滤镜合成失败，回退到逐帧合成: {video_path.name}")
+            self.last_error = None
+
+        return self.compose_frames(video_path, qr_path, output_path, progress_callback)
+
+    def compose_with_filter(self, video_path, qr_path, output_path, progress_callback=None):
+        """用ffmpeg overlay滤镜合成：解码、叠加、编码全部在ffmpeg内完成，内存占用恒定"""
+        logger.info(f"开始处理（ffmpeg滤镜）: {video_path.name}")
+
+        # 只读取帧数用于进度显示
+        cap = cv2.VideoCapture(str(video_path))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        cap.release()
+
+        command = build_qr_overlay_command(
+            video_path, qr_path, output_path,
+            qr_size=self.qr_size, margin=self.margin, opacity=self.opacity
+        )
+        if command is None:
+            return self._fail(f"未找到ffmpeg: {config.FFMPEG_BIN}")
+
+        last_logged = [0]
+
+        def on_progress(frame_count):
+            if progress_callback:
+                progress_callback(frame_count, max(total_frames, frame_count))
+            elif total_frames and frame_count - last_logged[0] >= 30:
+                last_logged[0] = frame_count
+                progress = min(frame_count / total_frames, 1.0) * 100
+                logger.info(f"处理进度: {progress:.1f}% ({frame_count}/{total_frames})")
+
+        if not run_ffmpeg(command, on_progress):
+            return self._fail(f"ffmpeg滤镜合成失败: {video_path}")
+
+        logger.info(f"✓ 视频合成完成: {output_path}")
+        return True
+
+    def compose_frames(self, video_path, qr_path, output_path, progress_callback=None):
+        """逐帧解码、在Python中叠加二维码后重新编码"""
         try:
-            logger.info(f"开始处理: {video_path.name}")
+            logger.info(f"开始处理（逐帧）: {video_path.name}")
             
             # 打开视频文件
             cap = cv2.VideoCapture(str(video_path))
             if not cap.isOpened():
-                logger.error(f"无法打开视频文件: {video_path}")
-                return False
+                return self._fail(f"无法打开视频文件: {video_path}")
             
             # 获取视频属性
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             
-            logger.info(f"视频信息: {width}x{height}, {fps}fps, {total_frames}帧")
+            logger.info(f"视频信息: {width}x{height}, {fps:.2f}fps, {total_frames}帧")
             
             # 调整二维码大小
             qr_image = self.resize_qr_code(qr_path, self.qr_size)
             if qr_image is None:
-                logger.error(f"无法处理二维码图片: {qr_path}")
                 cap.release()
-                return False
+                return self._fail(f"无法处理二维码图片: {qr_path}")
+
+            # 每个二维码只构建一次叠加层，逐帧复用
+            overlay = self.build_overlay(qr_image)
             
-            # 设置视频编码器
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+            # 设置视频编码器（源视频同时作为音轨来源）
+            out = self.open_writer(output_path, fps, (width, height), audio_source=video_path)
             
             if not out.isOpened():
-                logger.error(f"无法创建输出视频: {output_path}")
                 cap.release()
-                return False
+                return self._fail(f"无法创建输出视频: {output_path}")
             
             # 处理每一帧
             frame_count = 0
@@ -172,29 +333,154 @@ class VideoQRComposer:
                     break
                 
                 # 在帧上叠加二维码
-                frame_with_qr = self.overlay_qr_on_frame(frame, qr_image)
+                frame_with_qr = self.overlay_qr_on_frame(frame, overlay)
                 
                 # 写入输出视频
                 out.write(frame_with_qr)
                 
                 frame_count += 1
                 if frame_count % 30 == 0:  # 每30帧显示一次进度
-                    progress = (frame_count / total_frames) * 100
-                    logger.info(f"处理进度: {progress:.1f}% ({frame_count}/{total_frames})")
+                    if progress_callback:
+                        progress_callback(frame_count, total_frames)
+                    else:
+                        progress = (frame_count / total_frames) * 100
+                        logger.info(f"处理进度: {progress:.1f}% ({frame_count}/{total_frames})")
             
-            # 释放资源
+            # 释放资源（FFmpegPipeWriter.release() 返回False表示编码失败；cv2返回None）
             cap.release()
-            out.release()
+            if out.release() is False:
+                return self._fail(f"视频编码失败: {output_path}")
+
+            if progress_callback:
+                progress_callback(frame_count, max(total_frames, frame_count))
             
             logger.info(f"✓ 视频合成完成: {output_path}")
             return True
             
         except Exception as e:
-            logger.error(f"视频合成失败: {e}")
-            return False
-    
-    def run(self):
-        """运行主程序"""
+            return self._fail(f"视频合成失败: {e}")
+
+    def compose_pair(self, pair, progress_callback=None):
+        """合成一个配对，返回结果记录（用于最终汇总）"""
+        start_time = time.time()
+        try:
+            success = self.compose_video_with_qr(pair['video'], pair['qr'], pair['output'], progress_callback)
+            error = None if success else (self.last_error or "合成失败")
+        except Exception as e:
+            success = False
+            error = str(e)
+
+        return {
+            'number': pair['number'],
+            'video': pair['video'].name,
+            'output': str(pair['output']),
+            'success': success,
+            'error': error,
+            'elapsed': time.time() - start_time
+        }
+
+    def _run_sequential(self, pairs):
+        """在当前进程中逐个合成"""
+        results = []
+        for pair in pairs:
+            logger.info(f"处理配对 {pair['number']}: {pair['video'].name} + {pair['qr'].name}")
+
+            result = self.compose_pair(pair)
+            results.append(result)
+
+            if result['success']:
+                logger.info(f"✓ 配对 {pair['number']} 处理完成")
+            else:
+                logger.error(f"✗ 配对 {pair['number']} 处理失败: {result['error']}")
+
+            logger.info("-" * 50)
+        return results
+
+    def _run_parallel(self, pairs, workers):
+        """用进程池并行合成，主进程汇总各进程上报的帧进度"""
+        results = []
+        # 配对编号 -> (已处理帧数, 总帧数)
+        progress = {}
+
+        with multiprocessing.Manager() as manager:
+            progress_queue = manager.Queue()
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = {
+                    executor.submit(_compose_pair_in_worker, pair, progress_queue): pair
+                    for pair in pairs
+                }
+                pending = set(futures)
+                last_report = time.time()
+
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    _drain_progress(progress_queue, progress)
+
+                    for future in done:
+                        pair = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            # 子进程异常退出等情况
+                            result = {
+                                'number': pair['number'],
+                                'video': pair['video'].name,
+                                'output': str(pair['output']),
+                                'success': False,
+                                'error': f"工作进程异常: {e}",
+                                'elapsed': 0.0
+                            }
+                        results.append(result)
+
+                        if result['success']:
+                            logger.info(f"✓ 配对 {result['number']} 处理完成，耗时 {result['elapsed']:.1f}s "
+                                        f"({len(results)}/{len(pairs)})")
+                        else:
+                            logger.error(f"✗ 配对 {result['number']} 处理失败: {result['error']} "
+                                         f"({len(results)}/{len(pairs)})")
+
+                    if pending and time.time() - last_report >= PROGRESS_REPORT_INTERVAL:
+                        finished = {r['number'] for r in results}
+                        self._log_overall_progress(progress, finished, len(pairs))
+                        last_report = time.time()
+
+        return results
+
+    def _log_overall_progress(self, progress, finished, total_pairs):
+        """输出所有进程的汇总进度
+
+        Args:
+            progress: 配对编号 -> (已处理帧数, 总帧数)
+            finished: 已结束（成功或失败）的配对编号集合
+        """
+        frames_done = sum(done for done, _ in progress.values())
+        frames_total = sum(total for _, total in progress.values())
+        running = len(set(progress) - finished)
+        percent = (frames_done / frames_total * 100) if frames_total else 0.0
+        logger.info(f"总进度: 完成 {len(finished)}/{total_pairs} 个配对，进行中 {running} 个，"
+                    f"已开始配对的帧进度 {percent:.1f}% ({frames_done}/{frames_total})")
+
+    def _log_summary(self, results, elapsed):
+        """输出批量合成汇总"""
+        success_count = sum(1 for r in results if r['success'])
+        failures = [r for r in results if not r['success']]
+        busy_time = sum(r['elapsed'] for r in results)
+
+        logger.info("=" * 50)
+        logger.info(f"任务完成！成功处理 {success_count}/{len(results)} 个视频，总耗时 {elapsed:.1f}s")
+        if elapsed > 0 and busy_time > 0:
+            logger.info(f"累计合成耗时 {busy_time:.1f}s，并行加速比 {busy_time / elapsed:.2f}x")
+
+        for failure in sorted(failures, key=lambda r: r['number']):
+            logger.error(f"  ✗ 配对 {failure['number']} ({failure['video']}): {failure['error']}")
+        
+    def run(self, workers=1):
+        """运行主程序
+
+        Args:
+            workers: 并行合成的进程数，1 表示在当前进程中逐个处理
+        """
         logger.info("开始视频二维码合成任务")
         
         # 检查目录
@@ -212,26 +498,17 @@ class VideoQRComposer:
             logger.warning("没有找到可处理的视频和二维码配对")
             return False
         
-        logger.info(f"找到 {len(pairs)} 个配对需要处理")
-        
-        # 处理每个配对
-        success_count = 0
-        for pair in pairs:
-            try:
-                logger.info(f"处理配对 {pair['number']}: {pair['video'].name} + {pair['qr'].name}")
-                
-                if self.compose_video_with_qr(pair['video'], pair['qr'], pair['output']):
-                    success_count += 1
-                    logger.info(f"✓ 配对 {pair['number']} 处理完成")
-                else:
-                    logger.error(f"✗ 配对 {pair['number']} 处理失败")
-                
-                logger.info("-" * 50)
-                
-            except Exception as e:
-                logger.error(f"处理配对 {pair['number']} 时发生错误: {e}")
-        
-        logger.info(f"任务完成！成功处理 {success_count}/{len(pairs)} 个视频")
+        workers = max(1, min(workers, len(pairs)))
+        logger.info(f"找到 {len(pairs)} 个配对需要处理，并行进程数: {workers}")
+
+        start_time = time.time()
+        if workers > 1:
+            results = self._run_parallel(pairs, workers)
+        else:
+            results = self._run_sequential(pairs)
+
+        self._log_summary(results, time.time() - start_time)
+        success_count = sum(1 for r in results if r['success'])
         
         if success_count > 0:
             logger.info(f"合成的视频保存在: {self.output_dir.absolute()}")
@@ -239,8 +516,44 @@ class VideoQRComposer:
         return success_count > 0
 
 
+def _init_worker():
+    """工作进程初始化：关闭OpenCV内部线程，避免多进程之间争抢CPU"""
+    cv2.setNumThreads(1)
+
+
+def _compose_pair_in_worker(pair, progress_queue):
+    """在工作进程中合成一个配对，帧进度通过队列上报给主进程"""
+    composer = VideoQRComposer()
+    number = pair['number']
+
+    def report(frame_count, total_frames):
+        progress_queue.put((number, frame_count, total_frames))
+
+    return composer.compose_pair(pair, report)
+
+
+def _drain_progress(progress_queue, progress):
+    """取出队列中所有进度上报，更新到progress字典"""
+    while True:
+        try:
+            number, frame_count, total_frames = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        progress[number] = (frame_count, total_frames)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="视频二维码合成器")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help=f"并行合成的进程数（默认1，本机CPU核数 {os.cpu_count()}）")
+    parser.add_argument('-y', '--yes', action='store_true', help="跳过确认直接开始")
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
+    args = parse_args()
+
     print("=" * 60)
     print("视频二维码合成器")
     print("=" * 60)
@@ -268,15 +581,17 @@ def main():
         print(f"  大小: {composer.qr_size}x{composer.qr_size} 像素")
         print(f"  位置: 右下角，距离边缘 {composer.margin} 像素")
         print(f"  透明度: {composer.opacity * 100}%")
+        print(f"  并行进程数: {args.workers}")
         
-        print()
-        response = input("是否开始合成？(y/n): ")
-        if response.lower() != 'y':
-            print("操作已取消")
-            return
+        if not args.yes:
+            print()
+            response = input("是否开始合成？(y/n): ")
+            if response.lower() != 'y':
+                print("操作已取消")
+                return
         
         print()
-        success = composer.run()
+        success = composer.run(workers=args.workers)
         
         if success:
             print("=" * 60)
@@ -55,6 +55,11 @@ class FaceFusionApp {
     }
 
     createTemplateImage(template) {
+        // 有多尺寸缩略图时由浏览器按格式支持和屏幕像素比选择
+        if (template.thumbnails) {
+            return this.createPictureElement(template);
+        }
+
         // 优先使用本地缩略图，如果失败则使用OSS URL，最后使用占位符
         const localThumbnail = `/templates/template${template.id}.jpg`;
         const fallbackUrl = template.thumbnailUrl;
@@ -76,6 +81,22 @@ class FaceFusionApp {
         }
     }
 
+    createPictureElement(template) {
+        // <source> 按顺序匹配（AVIF、WebP，最后JPEG），img 的 srcset 给不支持 <picture> 的浏览器
+        const thumbnails = template.thumbnails;
+        const sources = thumbnails.sources
+            .filter(source => source.type !== 'image/jpeg')
+            .map(source => `<source type="${source.type}" srcset="${source.srcset}">`)
+            .join('');
+        const jpeg = thumbnails.sources.find(source => source.type === 'image/jpeg');
+        const placeholder = `<div class=&quot;template-placeholder&quot;>周繁漪<br>${template.name}</div>`;
+
+        return `<picture>${sources}<img class="template-image" src="${thumbnails.src}"` +
+            (jpeg ? ` srcset="${jpeg.srcset}"` : '') +
+            ` width="${thumbnails.width}" height="${thumbnails.height}" loading="lazy" decoding="async"` +
+            ` alt="${template.name}" onerror="this.closest('picture').outerHTML='${placeholder}'"></picture>`;
+    }
+
     hasLocalThumbnail(templateId) {
         // 检查本地是否存在缩略图文件
         // 这里简单返回true，假设本地缩略图都存在
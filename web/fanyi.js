@@ -46,12 +46,20 @@ class FanyiFusionApp {
         const thumbnailUrl = this.templateInfo.localThumbnail || this.templateInfo.thumbnailUrl;
 
         if (thumbnailUrl && thumbnailUrl.startsWith('/templates/')) {
-            // 使用本地缩略图
+            // 使用本地缩略图（有多倍率JPEG时按屏幕像素比选择）
+            const jpeg = this.templateInfo.thumbnails &&
+                this.templateInfo.thumbnails.sources.find(source => source.type === 'image/jpeg');
+            if (jpeg) {
+                previewImage.srcset = jpeg.srcset;
+            }
             previewImage.src = thumbnailUrl;
             previewImage.onerror = () => {
-                // 本地图片失败，尝试OSS
-                if (this.templateInfo.thumbnailUrl && !this.templateInfo.thumbnailUrl.includes('example.com')) {
-                    previewImage.src = this.templateInfo.thumbnailUrl;
+                previewImage.removeAttribute('srcset');
+                // 本地图片失败，尝试OSS原图（thumbnailUrl 可能也指向本地缩略图）
+                const fallbackUrl = this.templateInfo.templateUrl || this.templateInfo.thumbnailUrl;
+                if (fallbackUrl && fallbackUrl !== thumbnailUrl && !fallbackUrl.includes('example.com')) {
+                    previewImage.onerror = null;
+                    previewImage.src = fallbackUrl;
                 } else {
                     // 显示占位符
                     previewImage.style.display = 'none';
@@ -9,9 +9,10 @@ import time
 import uuid
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
@@ -19,6 +20,14 @@ from werkzeug.utils import secure_filename
 from oss_uploader import OSSUploader
 from face_fusion_sdk import create_face_fusion_sdk_client
 from wechat_sdk import create_wechat_sdk
+from fusion_jobs import FusionJobQueue, FINISHED_STATES, serialize_job
+from template_registry import TemplateRegistry, serialize_registration_job
+from fusion_cache import FusionResultCache, DigestReader, image_digest
+from image_preprocess import PreprocessStats, image_content_type, normalize_image
+import http_client
+import metrics
+from metrics import record_bytes, track_stage
+import config
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +38,25 @@ app = Flask(__name__)
 CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+@app.before_request
+def start_request_timer():
+    """按路由记录请求耗时和并发数"""
+    g.request_stage = track_stage(f"http:{request.endpoint or 'unknown'}").__enter__()
+
+@app.after_request
+def mark_request_failure(response):
+    """5xx响应计入错误"""
+    stage = g.get('request_stage')
+    if stage and response.status_code >= 500:
+        stage.fail(f"http_{response.status_code}")
+    return response
+
+@app.teardown_request
+def stop_request_timer(error=None):
+    stage = g.pop('request_stage', None)
+    if stage:
+        stage.__exit__(type(error) if error else None, error, None)
+
 # 文件上传配置
 UPLOAD_FOLDER = Path('web/uploads')
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
@@ -42,6 +70,55 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def store_user_image(data, filename):
+    """保存用户图片字节：先做预处理，有OSS时直接上传（不落本地磁盘），否则保存到本地上传目录
+
+    Returns:
+        (url, 是否本地存储, 预处理信息)，OSS上传失败时url为None
+    """
+    # 摘要基于原始字节计算，同一张照片无论预处理参数如何都能命中融合缓存
+    digest = image_digest(data)
+
+    record_bytes('user_upload', 'in', len(data))
+
+    preprocess_info = None
+    content_type = None
+    if config.UPLOAD_NORMALIZE_ENABLED:
+        with track_stage('image_preprocess') as stage:
+            data, preprocess_info = normalize_image(data)
+            if not preprocess_info['normalized']:
+                stage.fail('decode_failed')
+        if preprocess_info['normalized']:
+            filename = f"{os.path.splitext(filename)[0]}.jpg"
+            content_type = 'image/jpeg'
+
+    # 未预处理（关闭或解码失败）时上传的是原始字节，Content-Type 按实际内容判断
+    if content_type is None:
+        content_type = image_content_type(data, filename)
+
+    upload_start = time.perf_counter()
+
+    if oss_uploader:
+        url = oss_uploader.upload_bytes(data, f"face_fusion/user_images/{filename}",
+                                        content_type=content_type)
+        is_local = False
+    else:
+        # 如果没有OSS，保存到本地
+        local_path = UPLOAD_FOLDER / filename
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_bytes(data)
+        url = f"/uploads/{filename}"
+        is_local = True
+
+    if url:
+        fusion_cache.register_image(url, digest)
+        if preprocess_info:
+            upload_ms = (time.perf_counter() - upload_start) * 1000
+            preprocess_info['uploadMs'] = round(upload_ms, 1)
+            preprocess_stats.record(preprocess_info, upload_ms)
+
+    return url, is_local, preprocess_info
+
 def handle_wechat_upload(local_id):
     """处理微信localId上传"""
     try:
@@ -61,48 +138,34 @@ def handle_wechat_upload(local_id):
                 'message': '下载微信媒体文件失败'
             }), 500
 
-        # 2. 保存到临时文件
+        # 2. 直接上传到OSS（无OSS时保存到本地）
         timestamp = int(time.time())
-        temp_filename = f"wechat_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
-        temp_path = Path(UPLOAD_FOLDER) / temp_filename
-
-        # 确保上传目录存在
-        temp_path.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(temp_path, 'wb') as f:
-            f.write(media_data)
+        filename = f"wechat_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
+        url, is_local, preprocess_info = store_user_image(media_data, filename)
 
-        print(f"微信图片已保存到临时文件: {temp_path}")
-
-        # 3. 上传到OSS
-        if oss_uploader:
-            oss_url = oss_uploader.upload_file(temp_path, f"face_fusion/user_images/{temp_filename}")
-
-            # 删除临时文件
-            temp_path.unlink()
+        if not url:
+            return jsonify({
+                'success': False,
+                'message': 'OSS上传失败'
+            }), 500
 
-            if oss_url:
-                print(f"微信图片上传到OSS成功: {oss_url}")
-                return jsonify({
-                    'success': True,
-                    'url': oss_url,
-                    'message': '微信图片上传成功'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': 'OSS上传失败'
-                }), 500
-        else:
-            # 如果没有OSS，返回本地路径
-            local_url = f"/uploads/{temp_filename}"
-            print(f"微信图片保存到本地: {local_url}")
+        if is_local:
+            print(f"微信图片保存到本地: {url}")
             return jsonify({
                 'success': True,
-                'url': local_url,
+                'url': url,
+                'preprocess': preprocess_info,
                 'message': '微信图片上传成功（本地存储）'
             })
 
+        print(f"微信图片上传到OSS成功: {url}")
+        return jsonify({
+            'success': True,
+            'url': url,
+            'preprocess': preprocess_info,
+            'message': '微信图片上传成功'
+        })
+
     except Exception as e:
         print(f"微信上传处理失败: {e}")
         return jsonify({
@@ -110,6 +173,16 @@ def handle_wechat_upload(local_id):
             'message': f'微信上传处理失败: {str(e)}'
         }), 500
 
+# 上传预处理效果统计
+preprocess_stats = PreprocessStats()
+
+# 初始化人脸融合结果缓存
+fusion_cache = FusionResultCache(
+    max_entries=config.FUSION_CACHE_MAX_ENTRIES,
+    ttl=config.FUSION_CACHE_TTL,
+    disk_dir=config.FUSION_CACHE_DIR
+)
+
 # 初始化OSS上传器
 oss_uploader = None
 try:
@@ -246,11 +319,21 @@ def get_template(template_id):
             'message': f'获取模板失败: {str(e)}'
         }), 500
 
-@app.route('/api/register-templates', methods=['POST'])
-def register_templates():
-    """注册模板到阿里云人脸融合服务"""
+def set_templates_config(updated_config):
+    """模板注册写回配置后同步内存中的配置"""
     global templates_config
+    templates_config = updated_config
+
+# 初始化模板注册任务管理
+template_registry = TemplateRegistry(
+    lambda template_url: face_fusion_client.add_face_template(template_url),
+    TEMPLATES_CONFIG_FILE,
+    on_config_saved=set_templates_config
+)
 
+@app.route('/api/register-templates', methods=['POST'])
+def register_templates():
+    """注册模板到阿里云人脸融合服务 - 后台并发注册，立即返回任务ID"""
     try:
         if not face_fusion_client:
             return jsonify({
@@ -258,109 +341,19 @@ def register_templates():
                 'message': '人脸融合服务未初始化'
             }), 500
 
-        # 获取当前模板配置
-        templates = templates_config.get('templates', [])
-        if not templates:
+        if not templates_config.get('templates'):
             return jsonify({
                 'success': False,
                 'message': '没有找到模板配置'
             }), 400
 
-        registered_templates = []
-        success_count = 0
-        failed_count = 0
-
-        for template in templates:
-            template_id = template.get('id')
-            template_url = template.get('templateUrl')
-
-            # 跳过已经注册的模板
-            if template.get('aliyunTemplateId') and template.get('registrationStatus') == 'success':
-                print(f"模板 {template_id} 已经注册，跳过")
-                registered_templates.append({
-                    'id': template_id,
-                    'name': template.get('name'),
-                    'aliyunTemplateId': template.get('aliyunTemplateId'),
-                    'status': 'already_registered'
-                })
-                success_count += 1
-                continue
-
-            if not template_url:
-                print(f"模板 {template_id} 缺少templateUrl，跳过")
-                failed_count += 1
-                continue
-
-            print(f"开始注册模板 {template_id}: {template.get('name')}")
-
-            # 调用阿里云API注册模板
-            result = face_fusion_client.add_face_template(template_url)
-
-            if result.get('success'):
-                aliyun_template_id = result.get('data', {}).get('templateId')
-                request_id = result.get('data', {}).get('requestId')
-
-                # 更新模板配置
-                template['aliyunTemplateId'] = aliyun_template_id
-                template['registrationRequestId'] = request_id
-                template['registrationStatus'] = 'success'
-
-                registered_templates.append({
-                    'id': template_id,
-                    'name': template.get('name'),
-                    'aliyunTemplateId': aliyun_template_id,
-                    'status': 'success'
-                })
-                success_count += 1
-                print(f"✓ 模板 {template_id} 注册成功: {aliyun_template_id}")
-            else:
-                template['registrationStatus'] = 'failed'
-                template['registrationError'] = result.get('message', '未知错误')
-
-                registered_templates.append({
-                    'id': template_id,
-                    'name': template.get('name'),
-                    'status': 'failed',
-                    'error': result.get('message', '未知错误')
-                })
-                failed_count += 1
-                print(f"✗ 模板 {template_id} 注册失败: {result.get('message')}")
-
-        # 保存更新后的配置
-        try:
-            import json
-            updated_config = {
-                'templates': templates,
-                'total': len(templates),
-                'lastRegistration': {
-                    'timestamp': str(int(time.time())),
-                    'totalTemplates': len(templates),
-                    'successCount': success_count,
-                    'failedCount': failed_count
-                }
-            }
-
-            with open(TEMPLATES_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(updated_config, f, ensure_ascii=False, indent=2)
-
-            # 重新加载配置
-            templates_config = updated_config
-
-            print(f"✓ 配置已更新: 成功 {success_count}, 失败 {failed_count}")
-
-        except Exception as e:
-            print(f"保存配置失败: {e}")
+        job_id, created = template_registry.start(templates_config)
 
         return jsonify({
             'success': True,
-            'data': {
-                'totalTemplates': len(templates),
-                'successCount': success_count,
-                'failedCount': failed_count,
-                'registeredTemplates': registered_templates
-            },
-            'message': f'模板注册完成: 成功 {success_count}, 失败 {failed_count}'
-        })
+            'data': serialize_registration_job(template_registry.get(job_id)),
+            'message': '模板注册任务已提交' if created else '已有模板注册任务在进行中'
+        }), 202
 
     except Exception as e:
         print(f"模板注册失败: {e}")
@@ -369,6 +362,21 @@ def register_templates():
             'message': f'模板注册失败: {str(e)}'
         }), 500
 
+@app.route('/api/register-templates/<job_id>', methods=['GET'])
+def register_templates_status(job_id):
+    """查询模板注册任务进度"""
+    job = template_registry.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '任务不存在或已过期'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'data': serialize_registration_job(job)
+    })
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """文件上传接口 - 支持普通文件和微信localId"""
@@ -406,36 +414,44 @@ def upload_file():
         _, ext = os.path.splitext(filename)
         safe_filename = f"{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
 
-        # 保存文件
-        file_path = UPLOAD_FOLDER / safe_filename
-        file.save(file_path)
-
-        # 上传到OSS
-        if oss_uploader:
-            oss_url = oss_uploader.upload_file(file_path, f"face_fusion/user_images/{safe_filename}")
-
-            # 删除本地文件
-            file_path.unlink()
+        # 预处理需要完整解码图片，读入内存后处理再直接上传（不落本地磁盘）
+        if config.UPLOAD_NORMALIZE_ENABLED or not oss_uploader:
+            url, is_local, preprocess_info = store_user_image(file.read(), safe_filename)
 
-            if oss_url:
-                return jsonify({
-                    'success': True,
-                    'url': oss_url,
-                    'message': '文件上传成功'
-                })
-            else:
+            if not url:
                 return jsonify({
                     'success': False,
                     'message': 'OSS上传失败'
                 }), 500
-        else:
-            # 如果没有OSS，返回本地路径
+
             return jsonify({
                 'success': True,
-                'url': f'/uploads/{safe_filename}',
-                'message': '文件上传成功（本地存储）'
+                'url': url,
+                'preprocess': preprocess_info,
+                'message': '文件上传成功（本地存储）' if is_local else '文件上传成功'
             })
 
+        # 未启用预处理时：直接把请求流转给OSS
+        reader = DigestReader(file.stream)
+        oss_url = oss_uploader.upload_stream(
+            reader,
+            f"face_fusion/user_images/{safe_filename}",
+            content_type=file.mimetype or None
+        )
+
+        if oss_url:
+            fusion_cache.register_image(oss_url, reader.hexdigest())
+            return jsonify({
+                'success': True,
+                'url': oss_url,
+                'message': '文件上传成功'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': 'OSS上传失败'
+            }), 500
+
     except Exception as e:
         print(f"文件上传失败: {e}")
         return jsonify({
@@ -546,48 +562,34 @@ def wechat_download_image():
                 'message': '从微信服务器下载图片失败'
             }), 500
 
-        # 2. 保存到临时文件
+        # 2. 直接上传到OSS（无OSS时保存到本地）
         timestamp = int(time.time())
-        temp_filename = f"wechat_server_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
-        temp_path = Path(UPLOAD_FOLDER) / temp_filename
-
-        # 确保上传目录存在
-        temp_path.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(temp_path, 'wb') as f:
-            f.write(media_data)
+        filename = f"wechat_server_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
+        url, is_local, preprocess_info = store_user_image(media_data, filename)
 
-        print(f"微信图片已保存到临时文件: {temp_path}")
-
-        # 3. 上传到OSS
-        if oss_uploader:
-            oss_url = oss_uploader.upload_file(temp_path, f"face_fusion/user_images/{temp_filename}")
-
-            # 删除临时文件
-            temp_path.unlink()
+        if not url:
+            return jsonify({
+                'success': False,
+                'message': 'OSS上传失败'
+            }), 500
 
-            if oss_url:
-                print(f"微信图片上传到OSS成功: {oss_url}")
-                return jsonify({
-                    'success': True,
-                    'url': oss_url,
-                    'message': '微信图片处理成功'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': 'OSS上传失败'
-                }), 500
-        else:
-            # 如果没有OSS，返回本地路径
-            local_url = f"/uploads/{temp_filename}"
-            print(f"微信图片保存到本地: {local_url}")
+        if is_local:
+            print(f"微信图片保存到本地: {url}")
             return jsonify({
                 'success': True,
-                'url': local_url,
+                'url': url,
+                'preprocess': preprocess_info,
                 'message': '微信图片处理成功（本地存储）'
             })
 
+        print(f"微信图片上传到OSS成功: {url}")
+        return jsonify({
+            'success': True,
+            'url': url,
+            'preprocess': preprocess_info,
+            'message': '微信图片处理成功'
+        })
+
     except Exception as e:
         print(f"微信图片下载处理失败: {e}")
         return jsonify({
@@ -595,9 +597,79 @@ def wechat_download_image():
             'message': f'微信图片下载处理失败: {str(e)}'
         }), 500
 
+def resolve_aliyun_template_id(template_id):
+    """根据模板ID查找已注册的阿里云模板ID
+
+    Returns:
+        (aliyun_template_id, None) 或 (None, 错误响应)
+    """
+    templates = templates_config.get('templates', [])
+    template = next((t for t in templates if t['id'] == template_id), None)
+
+    if not template:
+        return None, (jsonify({
+            'success': False,
+            'message': '模板不存在'
+        }), 404)
+
+    # 使用预先注册的阿里云模板ID
+    aliyun_template_id = template.get('aliyunTemplateId')
+    if not aliyun_template_id:
+        return None, (jsonify({
+            'success': False,
+            'message': f'模板 {template_id} 未注册到阿里云'
+        }), 500)
+
+    return aliyun_template_id, None
+
+def fusion_failure_response(result):
+    """融合失败响应：上游被熔断或限流时返回503和Retry-After，其他情况返回500"""
+    result = result or {}
+    response = jsonify({
+        'success': False,
+        'message': result.get('message', '人脸融合失败')
+    })
+
+    retry_after = result.get('retryAfter')
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
+    return response, 500
+
+def run_face_fusion(user_image_url, aliyun_template_id):
+    """执行一次人脸融合（同步接口和异步任务共用），优先命中结果缓存"""
+    cached = fusion_cache.get(user_image_url, aliyun_template_id)
+    if cached:
+        print(f"人脸融合命中缓存: 模板ID={aliyun_template_id}")
+        data = dict(cached.get('data', {}), cached=True)
+        return dict(cached, data=data)
+
+    print(f"开始人脸融合: 用户图片={user_image_url}, 模板ID={aliyun_template_id}")
+
+    result = face_fusion_client.merge_face(
+        user_image_url=user_image_url,
+        template_id=aliyun_template_id
+    )
+    fusion_cache.put(user_image_url, aliyun_template_id, result)
+    return result
+
+# 初始化人脸融合任务队列
+fusion_jobs = FusionJobQueue(
+    run_face_fusion,
+    max_workers=config.FUSION_JOB_WORKERS,
+    max_pending=config.FUSION_JOB_MAX_PENDING,
+    job_ttl=config.FUSION_JOB_TTL
+)
+
+# 批量融合（一张照片 x 多个模板）共用的有界线程池
+fusion_batch_executor = ThreadPoolExecutor(
+    max_workers=config.FUSION_BATCH_WORKERS,
+    thread_name_prefix='fusion-batch'
+)
+
 @app.route('/api/face-fusion', methods=['POST'])
 def face_fusion():
-    """人脸融合API"""
+    """人脸融合API - 传入 async=true 时提交异步任务并立即返回任务ID"""
     try:
         if not face_fusion_client:
             return jsonify({
@@ -608,6 +680,7 @@ def face_fusion():
         data = request.get_json()
         user_image_url = data.get('userImageUrl')
         template_id = data.get('templateId')
+        async_mode = bool(data.get('async')) or request.args.get('mode') == 'async'
 
         if not user_image_url or not template_id:
             return jsonify({
@@ -616,30 +689,28 @@ def face_fusion():
             }), 400
 
         # 获取模板信息
-        templates = templates_config.get('templates', [])
-        template = next((t for t in templates if t['id'] == template_id), None)
+        aliyun_template_id, error_response = resolve_aliyun_template_id(template_id)
+        if error_response:
+            return error_response
 
-        if not template:
-            return jsonify({
-                'success': False,
-                'message': '模板不存在'
-            }), 404
+        if async_mode:
+            job_id = fusion_jobs.submit(user_image_url, aliyun_template_id, templateId=template_id)
+            if not job_id:
+                return jsonify({
+                    'success': False,
+                    'message': '服务繁忙，请稍后重试'
+                }), 503
 
-        # 使用预先注册的阿里云模板ID
-        aliyun_template_id = template.get('aliyunTemplateId')
-        if not aliyun_template_id:
             return jsonify({
-                'success': False,
-                'message': f'模板 {template_id} 未注册到阿里云'
-            }), 500
-
-        print(f"开始人脸融合: 用户图片={user_image_url}, 模板ID={aliyun_template_id}")
+                'success': True,
+                'jobId': job_id,
+                'statusUrl': f'/api/face-fusion/{job_id}',
+                'eventsUrl': f'/api/face-fusion/{job_id}/events',
+                'message': '人脸融合任务已提交'
+            }), 202
 
         # 调用人脸融合API
-        result = face_fusion_client.merge_face(
-            user_image_url=user_image_url,
-            template_id=aliyun_template_id
-        )
+        result = run_face_fusion(user_image_url, aliyun_template_id)
 
         if result and result.get('success'):
             return jsonify({
@@ -648,10 +719,7 @@ def face_fusion():
                 'message': '人脸融合成功'
             })
         else:
-            return jsonify({
-                'success': False,
-                'message': result.get('message', '人脸融合失败')
-            }), 500
+            return fusion_failure_response(result)
 
     except Exception as e:
         print(f"人脸融合失败: {e}")
@@ -660,6 +728,178 @@ def face_fusion():
             'message': f'人脸融合失败: {str(e)}'
         }), 500
 
+@app.route('/api/face-fusion/batch', methods=['POST'])
+def face_fusion_batch():
+    """批量人脸融合 - 同一张照片并发融合多个模板，每完成一个通过SSE推送一个结果"""
+    if not face_fusion_client:
+        return jsonify({
+            'success': False,
+            'message': '人脸融合服务未初始化'
+        }), 500
+
+    data = request.get_json() or {}
+    user_image_url = data.get('userImageUrl')
+    template_ids = data.get('templateIds')
+
+    if not user_image_url:
+        return jsonify({
+            'success': False,
+            'message': '缺少必要参数'
+        }), 400
+
+    if template_ids is not None and not (
+            isinstance(template_ids, list) and all(isinstance(t, str) for t in template_ids)):
+        return jsonify({
+            'success': False,
+            'message': 'templateIds必须是模板ID字符串数组'
+        }), 400
+
+    # 未指定模板时使用全部已注册模板
+    if not template_ids:
+        template_ids = [
+            t['id'] for t in templates_config.get('templates', [])
+            if t.get('aliyunTemplateId')
+        ]
+
+    targets = []
+    for template_id in dict.fromkeys(str(t) for t in template_ids):
+        aliyun_template_id, error_response = resolve_aliyun_template_id(template_id)
+        if error_response:
+            return error_response
+        targets.append((template_id, aliyun_template_id))
+
+    if not targets:
+        return jsonify({
+            'success': False,
+            'message': '没有可用的已注册模板'
+        }), 400
+
+    print(f"开始批量人脸融合: 用户图片={user_image_url}, 模板数={len(targets)}")
+
+    futures = {
+        fusion_batch_executor.submit(run_face_fusion, user_image_url, aliyun_template_id): template_id
+        for template_id, aliyun_template_id in targets
+    }
+
+    def generate():
+        success_count = 0
+        try:
+            for future in as_completed(futures):
+                template_id = futures[future]
+                try:
+                    result = future.result() or {}
+                except Exception as e:
+                    result = {'success': False, 'message': f'人脸融合失败: {str(e)}'}
+
+                event = {'templateId': template_id, 'success': bool(result.get('success'))}
+                if result.get('success'):
+                    success_count += 1
+                    event['data'] = result.get('data', {})
+                else:
+                    event['message'] = result.get('message', '人脸融合失败')
+                    if result.get('retryAfter'):
+                        event['retryAfter'] = result['retryAfter']
+
+                yield f"event: result\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+            summary = {'total': len(futures), 'successCount': success_count}
+            yield f"event: done\ndata: {json.dumps(summary)}\n\n"
+        finally:
+            # 客户端断开时取消尚未开始的融合
+            for future in futures:
+                future.cancel()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/face-fusion/health', methods=['GET'])
+def face_fusion_health():
+    """人脸融合上游保护状态：熔断器、并发限制、任务队列"""
+    if not face_fusion_client:
+        return jsonify({
+            'success': False,
+            'message': '人脸融合服务未初始化'
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'data': dict(
+            face_fusion_client.get_resilience_state(),
+            jobs=fusion_jobs.stats(),
+            cache=fusion_cache.stats()
+        )
+    })
+
+@app.route('/api/face-fusion/<job_id>', methods=['GET'])
+def face_fusion_job_status(job_id):
+    """查询人脸融合异步任务状态"""
+    job = fusion_jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '任务不存在或已过期'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'data': serialize_job(job)
+    })
+
+@app.route('/api/face-fusion/<job_id>/events', methods=['GET'])
+def face_fusion_job_events(job_id):
+    """
+    人脸融合任务SSE推送 - 状态每次变化推送一条事件，任务结束后关闭连接
+
+    每个连接占用一个Flask工作线程，只保持 FUSION_JOB_SSE_TIMEOUT 秒：任务还没结束时发送 reconnect 事件后关闭，
+    EventSource 按 retry 间隔自动重连（其他客户端应改用 GET /api/face-fusion/<job_id> 轮询）
+    """
+    job = fusion_jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '任务不存在或已过期'
+        }), 404
+
+    def generate():
+        current = job
+        deadline = time.time() + config.FUSION_JOB_SSE_TIMEOUT
+        payload = json.dumps(serialize_job(current), ensure_ascii=False)
+        yield f"retry: {config.FUSION_JOB_SSE_RETRY_MS}\nevent: {current['status']}\ndata: {payload}\n\n"
+
+        while current['status'] not in FINISHED_STATES:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                # 释放工作线程，客户端重连或改为轮询
+                payload = json.dumps({'statusUrl': f'/api/face-fusion/{job_id}'})
+                yield f"event: reconnect\ndata: {payload}\n\n"
+                return
+
+            latest = fusion_jobs.wait_for_change(job_id, current['version'], timeout=remaining)
+            if latest is None:
+                return
+
+            if latest['version'] == current['version']:
+                continue
+
+            current = latest
+            payload = json.dumps(serialize_job(current), ensure_ascii=False)
+            yield f"event: {current['status']}\ndata: {payload}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 
 
 @app.route('/api/wechat/save-image', methods=['POST'])
@@ -684,8 +924,7 @@ def wechat_save_image():
         print(f"开始处理图片保存到微信: {image_url}")
 
         # 1. 从OSS下载图片到服务器
-        import requests
-        response = requests.get(image_url, timeout=30)
+        response = http_client.get(image_url, timeout=30)
         if response.status_code != 200:
             return jsonify({
                 'success': False,
@@ -807,7 +1046,26 @@ def oss_status():
             'message': f'获取状态失败: {str(e)}'
         }), 500
 
-
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus文本格式的指标"""
+    return Response(metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/upload/stats')
+def upload_stats():
+    """查看上传预处理效果（节省的字节数、预处理与上传耗时）"""
+    return jsonify({
+        'success': True,
+        'data': preprocess_stats.snapshot()
+    })
+
+@app.route('/api/http/stats')
+def http_stats():
+    """查看共享HTTP连接池的连接复用情况"""
+    return jsonify({
+        'success': True,
+        'data': http_client.get_connection_stats()
+    })
 
 if __name__ == '__main__':
     print("🚀 启动周繁漪人脸融合服务器...")
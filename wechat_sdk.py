@@ -7,27 +7,59 @@ import hashlib
 import time
 import random
 import string
-import requests
 import json
 import logging
 
+import http_client
+from metrics import record_bytes, track_stage
+import config
+from token_store import TokenStore
+
 logger = logging.getLogger(__name__)
 
 class WechatSDK:
-    def __init__(self, appid, appsecret):
+    def __init__(self, appid, appsecret, token_store=None):
         self.appid = appid
         self.appsecret = appsecret
-        self.access_token = None
-        self.access_token_expires = 0
-        self.jsapi_ticket = None
-        self.jsapi_ticket_expires = 0
-        
+
+        # access_token 和 jsapi_ticket 缓存在跨进程共享的凭证文件中
+        if token_store is None:
+            token_store = TokenStore(
+                config.WECHAT_TOKEN_STORE_FILE,
+                refresh_margin=config.WECHAT_TOKEN_REFRESH_MARGIN,
+                expiry_margin=config.WECHAT_TOKEN_EXPIRY_MARGIN
+            )
+        self.token_store = token_store
+        self.access_token_key = f"{appid}:access_token"
+        self.jsapi_ticket_key = f"{appid}:jsapi_ticket"
+        self.refresher_pending = False
+
+        # 依赖顺序登记：先续期access_token，再续期jsapi_ticket
+        self.token_store.register(self.access_token_key, self._fetch_access_token)
+        self.token_store.register(self.jsapi_ticket_key, self._fetch_jsapi_ticket)
+
+    def start_token_refresher(self):
+        """
+        启动后台续期，请求路径上不再同步获取凭证
+
+        还没有拿到过access_token（如IP白名单未配置）时先不启动，否则后台线程会不停请求微信；
+        等请求路径上第一次获取成功后再启动
+        """
+        if self.token_store.peek(self.access_token_key):
+            self.refresher_pending = False
+            self.token_store.start_background_refresh()
+        else:
+            self.refresher_pending = True
+
     def get_access_token(self):
         """获取access_token"""
-        # 检查是否已有有效的access_token
-        if self.access_token and time.time() < self.access_token_expires:
-            return self.access_token
-            
+        access_token = self.token_store.get(self.access_token_key, self._fetch_access_token)
+        if access_token and self.refresher_pending:
+            self.start_token_refresher()
+        return access_token
+
+    def _fetch_access_token(self):
+        """从微信服务器获取access_token，返回 (access_token, 有效期秒数)"""
         try:
             url = f"https://api.weixin.qq.com/cgi-bin/token"
             params = {
@@ -36,15 +68,15 @@ class WechatSDK:
                 'secret': self.appsecret
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
+            with track_stage('wechat_token_fetch') as stage:
+                response = http_client.get(url, params=params, timeout=10)
+                data = response.json()
+                if 'access_token' not in data:
+                    stage.fail(f"errcode_{data.get('errcode')}")
             
             if 'access_token' in data:
-                self.access_token = data['access_token']
-                # access_token有效期7200秒，提前5分钟过期
-                self.access_token_expires = time.time() + data.get('expires_in', 7200) - 300
                 logger.info("微信access_token获取成功")
-                return self.access_token
+                return data['access_token'], data.get('expires_in', 7200)
             else:
                 logger.error(f"获取access_token失败: {data}")
                 return None
@@ -55,10 +87,10 @@ class WechatSDK:
     
     def get_jsapi_ticket(self):
         """获取jsapi_ticket"""
-        # 检查是否已有有效的jsapi_ticket
-        if self.jsapi_ticket and time.time() < self.jsapi_ticket_expires:
-            return self.jsapi_ticket
-            
+        return self.token_store.get(self.jsapi_ticket_key, self._fetch_jsapi_ticket)
+
+    def _fetch_jsapi_ticket(self):
+        """从微信服务器获取jsapi_ticket，返回 (jsapi_ticket, 有效期秒数)"""
         access_token = self.get_access_token()
         if not access_token:
             return None
@@ -70,15 +102,15 @@ class WechatSDK:
                 'type': 'jsapi'
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
+            with track_stage('wechat_ticket_fetch') as stage:
+                response = http_client.get(url, params=params, timeout=10)
+                data = response.json()
+                if data.get('errcode') != 0:
+                    stage.fail(f"errcode_{data.get('errcode')}")
             
             if data.get('errcode') == 0:
-                self.jsapi_ticket = data['ticket']
-                # jsapi_ticket有效期7200秒，提前5分钟过期
-                self.jsapi_ticket_expires = time.time() + data.get('expires_in', 7200) - 300
                 logger.info("微信jsapi_ticket获取成功")
-                return self.jsapi_ticket
+                return data['ticket'], data.get('expires_in', 7200)
             else:
                 logger.error(f"获取jsapi_ticket失败: {data}")
                 return None
@@ -137,7 +169,13 @@ class WechatSDK:
                 'media_id': media_id
             }
             
-            response = requests.get(url, params=params, timeout=30)
+            with track_stage('wechat_media_fetch') as stage:
+                response = http_client.get(url, params=params, timeout=30)
+                if not response.headers.get('content-type', '').startswith('image/'):
+                    stage.fail('not_image')
+                elif response.status_code != 200:
+                    stage.fail(f"status_{response.status_code}")
+            record_bytes('wechat_media_fetch', 'in', len(response.content))
             
             # 检查响应头，确保是图片文件
             content_type = response.headers.get('content-type', '')
@@ -179,7 +217,11 @@ class WechatSDK:
                     'media': (file_path.name, f, 'image/jpeg')
                 }
 
-                response = requests.post(url, files=files, timeout=30)
+                with track_stage('wechat_media_upload') as stage:
+                    response = http_client.post(url, files=files, timeout=30)
+                    if response.status_code != 200:
+                        stage.fail(f"status_{response.status_code}")
+                record_bytes('wechat_media_upload', 'out', file_path.stat().st_size)
 
             if response.status_code == 200:
                 result = response.json()
@@ -211,8 +253,9 @@ def create_wechat_sdk():
 
     try:
         sdk = WechatSDK(appid, appsecret)
-        # 测试获取access_token
+        # 测试获取access_token（多个worker共享凭证文件，只有第一个会真正请求微信）
         access_token = sdk.get_access_token()
+        sdk.start_token_refresher()  # 获取失败时推迟到第一次获取成功后再启动
         if access_token:
             logger.info("微信SDK初始化成功")
             return sdk